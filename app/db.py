@@ -1,12 +1,112 @@
+"""
+app/db.py — SQLAlchemy engine registry (shared by app and mcp_server).
+
+One deployment can serve several databases. Each is addressed by a
+database_id that travels with the request (ChatRequest.database_id) and
+the pipeline states (state.database_id):
+  - DATABASE_URL            → the "default" database (database_id None)
+  - DATABASES               → JSON object of extra ids: {"acme": "sqlite:///./acme.db"}
+  - DATABASE_URL_TEMPLATE   → any other id, e.g. "sqlite:///./tenants/{database_id}.db"
+                              (for SQLite, only ids whose file already exists —
+                              connecting would otherwise create an empty one)
+
+Every database gets its own engine (and so its own connection pool).
+Engines are created on first use, not at import, so importing the app
+never touches a database. At most ENGINE_MAX engines are kept; the least
+recently used one is disposed (its pool closed) to make room, and
+listeners registered with on_engine_evicted() drop their per-database
+caches too. app/startup.py opens the default pool eagerly when warming up.
+"""
+
 import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 
 load_dotenv()
 
 DB_URL = os.getenv('DATABASE_URL')
+DATABASES: dict[str, str] = json.loads(os.getenv("DATABASES", "{}"))
+DATABASE_URL_TEMPLATE = os.getenv("DATABASE_URL_TEMPLATE")
+ENGINE_MAX = int(os.getenv("ENGINE_MAX", "16"))
+
+DEFAULT_DATABASE_ID = "default"
+
+# Ids end up in file paths via DATABASE_URL_TEMPLATE — keep them boring
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_engines: OrderedDict = OrderedDict()
+_evict_listeners: list[Callable[[str], None]] = []
+_lock = threading.Lock()
+
+
+class UnknownDatabase(ValueError):
+    """database_id doesn't map to a configured database."""
+
+
+class DatabaseNotConfigured(UnknownDatabase):
+    """The default database was asked for but DATABASE_URL is not set."""
+
+
+def resolve_database_id(database_id: Optional[str]) -> str:
+    return database_id or DEFAULT_DATABASE_ID
+
+
+def database_url(database_id: Optional[str] = None) -> str:
+    """
+    The connection URL for a database id. Raises UnknownDatabase, or
+    DatabaseNotConfigured for the default id without DATABASE_URL.
+    """
+    database_id = resolve_database_id(database_id)
+    if database_id in DATABASES:
+        return DATABASES[database_id]
+    if database_id == DEFAULT_DATABASE_ID:
+        if not DB_URL:
+            raise DatabaseNotConfigured("DATABASE_URL not set in environment")
+        return DB_URL
+    if DATABASE_URL_TEMPLATE and _VALID_ID.match(database_id):
+        url = DATABASE_URL_TEMPLATE.format(database_id=database_id)
+        if _is_missing_sqlite_file(url):
+            raise UnknownDatabase(f"Unknown database: {database_id}")
+        return url
+    raise UnknownDatabase(f"Unknown database: {database_id}")
+
+
+def _is_missing_sqlite_file(url: str) -> bool:
+    """SQLite creates a missing database file on connect — so a random id would too."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return False
+    return not os.path.isfile(parsed.database)
+
+
+def on_engine_evicted(listener: Callable[[str], None]) -> None:
+    """Registers listener(database_id), called after an idle engine is disposed."""
+    _evict_listeners.append(listener)
+
+
+def get_engine(database_id: Optional[str] = None):
+    """Returns the engine for a database, creating it on first call."""
+    database_id = resolve_database_id(database_id)
+    with _lock:
+        engine = _engines.get(database_id)
+        if engine is not None:
+            _engines.move_to_end(database_id)
+            return engine
 
-if not DB_URL:
-    raise ValueError("DATABASE_URL not set in environment")
+        engine = _engines[database_id] = create_engine(database_url(database_id), echo=False)
+        evicted = []
+        while len(_engines) > ENGINE_MAX:
+            evicted.append(_engines.popitem(last=False))
 
-engine = create_engine(DB_URL, echo=False)
\ No newline at end of file
+    for evicted_id, evicted_engine in evicted:
+        # Checked-out connections finish normally; idle ones are closed now
+        evicted_engine.dispose()
+        for listener in _evict_listeners:
+            listener(evicted_id)
+    return engine
@@ -0,0 +1,115 @@
+"""
+app/deadline.py — Per-request time budgets and cancellation.
+
+/chat gives every request a Deadline (REQUEST_TIMEOUT_SECONDS) and cancels
+it early if the client disconnects. run_agent installs it for the request
+with use_deadline(); because it lives in a ContextVar it follows the work
+into asyncio tasks, asyncio.to_thread and LangGraph nodes without being
+passed around. The absolute deadline is also copied into the graph states
+(state.deadline) so each node can see its budget.
+
+What honours it:
+  - LLM calls get the remaining budget as their request timeout (llm_kwargs)
+  - SQLite statements are aborted through a progress handler (interrupt_sql)
+  - nodes check expired() before starting work, skip retries and return
+    whatever partial results they already have
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+
+DEADLINE_ERROR = "Deadline exceeded"
+
+# SQLite VM instructions between progress-handler checks
+_PROGRESS_INTERVAL = 10_000
+
+
+class Deadline:
+    """An absolute time budget (time.time() based) that can also be cancelled."""
+
+    def __init__(self, seconds: float):
+        self.at = time.time() + seconds
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> float:
+        return 0.0 if self.cancelled else max(self.at - time.time(), 0.0)
+
+    def expired(self) -> bool:
+        return self.cancelled or time.time() >= self.at
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def use_deadline(deadline: Optional[Deadline]):
+    """Makes deadline the current one for this context (and work started from it)."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def expired(at: Optional[float] = None) -> bool:
+    """True if the current request was cancelled / ran out, or `at` has passed."""
+    deadline = _current.get()
+    if deadline is not None and deadline.expired():
+        return True
+    return at is not None and time.time() >= at
+
+
+def remaining(at: Optional[float] = None) -> Optional[float]:
+    """Seconds left in the tighter of the current deadline and `at` (None = unbounded)."""
+    budgets = []
+    deadline = _current.get()
+    if deadline is not None:
+        budgets.append(deadline.remaining())
+    if at is not None:
+        budgets.append(max(at - time.time(), 0.0))
+    return min(budgets) if budgets else None
+
+
+def llm_kwargs(at: Optional[float] = None) -> dict:
+    """Extra invoke() kwargs that cap an LLM request at the remaining budget."""
+    left = remaining(at)
+    return {} if left is None else {"timeout": max(left, 0.1)}
+
+
+@contextmanager
+def interrupt_sql(conn, at: Optional[float] = None):
+    """
+    Aborts SQLite statements on conn (a SQLAlchemy Connection) once the
+    budget runs out — they fail with "interrupted". No-op for other drivers
+    or when there is no deadline.
+    """
+    dbapi_conn = conn.connection.dbapi_connection
+    if remaining(at) is None or not hasattr(dbapi_conn, "set_progress_handler"):
+        yield
+        return
+
+    dbapi_conn.set_progress_handler(lambda: 1 if expired(at) else 0, _PROGRESS_INTERVAL)
+    try:
+        yield
+    finally:
+        dbapi_conn.set_progress_handler(None, 0)
@@ -1,12 +1,161 @@
+"""
+app/llm.py — Groq LLM clients (shared by app and mcp_server).
+
+Two model tiers; every call site says which one it needs:
+  fast  — routing, decomposition, explanations, chart decisions, replies
+  large — SQL generation and insight synthesis, where quality matters
+
+Each tier has its own model and request timeout (LLM_FAST_MODEL,
+LLM_FAST_TIMEOUT, LLM_LARGE_MODEL, LLM_LARGE_TIMEOUT). Structured output on
+the fast tier escalates to the large tier when the small model's answer
+fails to parse or validate.
+
+Clients are created on first use, not at import: langchain_groq is the
+slowest import in the process, and the MCP server / autoscaled workers
+should not pay for it before they need it. app/startup.py builds them
+eagerly when warming up. Tests swap in local fakes with use_models().
+"""
+
 import os
+import threading
+from functools import lru_cache
+from typing import Literal
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile",  # or another Groq model
-    temperature=0,
-    api_key=GROQ_API_KEY
-)
\ No newline at end of file
+Tier = Literal["fast", "large"]
+
+MODEL_TIERS = {
+    "fast": {
+        "model": os.getenv("LLM_FAST_MODEL", "llama-3.1-8b-instant"),
+        "timeout": float(os.getenv("LLM_FAST_TIMEOUT", "15")),
+    },
+    "large": {
+        "model": os.getenv("LLM_LARGE_MODEL", "llama-3.3-70b-versatile"),
+        "timeout": float(os.getenv("LLM_LARGE_TIMEOUT", "60")),
+    },
+}
+
+# Fast-tier structured calls retried on the large tier (see _Escalating)
+llm_stats = {"escalations": 0}
+
+_clients: dict = {}
+_structured: dict = {}
+_lock = threading.Lock()
+
+
+def get_llm(tier: Tier = "large"):
+    """Returns the shared chat client for a tier, creating it on first call."""
+    client = _clients.get(tier)
+    if client is None:
+        with _lock:
+            client = _clients.get(tier)
+            if client is None:
+                from langchain_groq import ChatGroq
+
+                config = MODEL_TIERS[tier]
+                client = _clients[tier] = ChatGroq(
+                    model=config["model"],
+                    temperature=0,
+                    timeout=config["timeout"],
+                    api_key=GROQ_API_KEY
+                )
+    return client
+
+
+@lru_cache(maxsize=1)
+def _escalation_errors() -> tuple:
+    """Errors that mean "the model's answer was malformed", not "the call failed"."""
+    from pydantic import ValidationError
+    from langchain_core.exceptions import OutputParserException
+
+    errors = [ValidationError, OutputParserException]
+    try:
+        # Groq rejects tool calls that don't match the schema (tool_use_failed)
+        from groq import BadRequestError
+        errors.append(BadRequestError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+class _Escalating:
+    """
+    Structured-output runnable that retries on the large tier when the
+    fast tier's answer is malformed. Other errors (timeouts, auth) are
+    raised as-is — a bigger model wouldn't fix them.
+    """
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def invoke(self, messages, *args, **kwargs):
+        try:
+            return self.primary.invoke(messages, *args, **kwargs)
+        except _escalation_errors():
+            _count_escalation()
+            return self.fallback.invoke(messages, *args, **kwargs)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        try:
+            return await self.primary.ainvoke(messages, *args, **kwargs)
+        except _escalation_errors():
+            _count_escalation()
+            return await self.fallback.ainvoke(messages, *args, **kwargs)
+
+
+def _count_escalation() -> None:
+    with _lock:
+        llm_stats["escalations"] += 1
+
+
+def get_structured_llm(output_model, tier: Tier = "large"):
+    """
+    Returns llm.with_structured_output(output_model) for a tier, built once
+    per (model, tier). Building it converts the Pydantic model into a tool
+    schema — not something to redo on every call in a hot path.
+
+    Fast-tier runnables fall back to the large tier on malformed output.
+    """
+    key = (output_model, tier)
+    runnable = _structured.get(key)
+    if runnable is None:
+        runnable = get_llm(tier).with_structured_output(output_model)
+        if tier != "large":
+            runnable = _Escalating(runnable, get_structured_llm(output_model, "large"))
+        with _lock:
+            runnable = _structured.setdefault(key, runnable)
+    return runnable
+
+
+def invoke_parsed(messages, parse, tier: Tier = "fast", **kwargs):
+    """
+    Plain-text call whose content is turned into a value by parse(content).
+    If parse raises ValueError (e.g. bad JSON) on the fast tier, the call
+    is repeated once on the large tier. kwargs go to invoke().
+    """
+    response = get_llm(tier).invoke(messages, **kwargs)
+    try:
+        return parse(response.content.strip())
+    except ValueError:
+        if tier == "large":
+            raise
+        _count_escalation()
+        return invoke_parsed(messages, parse, "large", **kwargs)
+
+
+def use_models(**clients) -> None:
+    """
+    Replaces tier clients, e.g. use_models(fast=FakeLLM(), large=FakeLLM()),
+    for tests and local runs without an API key. use_models() with no
+    arguments goes back to the configured Groq models.
+    """
+    with _lock:
+        if clients:
+            _clients.update(clients)
+        else:
+            _clients.clear()
+        _structured.clear()
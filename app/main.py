@@ -1,13 +1,32 @@
-from fastapi import FastAPI, HTTPException
+import json
+import asyncio
+from contextlib import asynccontextmanager, closing
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, Any
-from app.mcp_client import run_agent
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional, Any, Literal, Iterator
+from app.mcp_client import run_agent, iter_batch_replies
+from mcp_server.pipelines.batch.runner import MAX_BATCH_QUESTIONS
+from mcp_server.shared.nodes import is_safe_query
+from mcp_server.shared.results import result_store
+from mcp_server.shared.export import open_export, MEDIA_TYPES
+from app.sessions import session_store
+from app.startup import warm_up, WARM_START
+from app.deadline import Deadline, REQUEST_TIMEOUT_SECONDS
+from app.speculation import speculation_stats
+from app.llm import llm_stats
+from app.db import database_url, resolve_database_id, UnknownDatabase, DatabaseNotConfigured
+from mcp_server.shared.answers import answer_store
+from mcp_server.pipelines.query.repair import repair_stats
+from mcp_server.pipelines.deep_analysis.checkpoints import analysis_checkpoints
 
 
 class ChatRequest(BaseModel):
     message: str
-    history: Optional[list[dict]] = []
+    session_id: Optional[str] = None      # server-side history; preferred over `history`
+    history: Optional[list[dict]] = []    # only used to seed a new session
+    database_id: Optional[str] = None     # which database (see app/db.py); None = default
 
 
 class ChatResponse(BaseModel):
@@ -15,9 +34,79 @@ class ChatResponse(BaseModel):
     tool_used: Optional[str] = None
     sql_query: Optional[str] = None
     chart_data: Optional[Any] = None   # frontend renders this if present
+    session_id: Optional[str] = None   # send back on the next request
+    result_id: Optional[str] = None    # pass to /export for the full rows
+    partial: bool = False              # time budget ran out — answer is incomplete
 
 
-app = FastAPI(title="AI SQL Assistant")
+class ExportRequest(BaseModel):
+    sql: Optional[str] = None          # a generated SQL statement, or…
+    result_id: Optional[str] = None    # …a result_id from a /chat response
+    format: Literal["csv", "ndjson"] = "csv"
+    database_id: Optional[str] = None  # with sql; a result_id carries its own
+
+
+class BatchRequest(BaseModel):
+    questions: list[str] = Field(min_length=1, max_length=MAX_BATCH_QUESTIONS)
+    database_id: Optional[str] = None
+
+
+# How often /chat checks whether the client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+async def run_until_disconnected(http_request: Request, task: asyncio.Task, deadline: Deadline):
+    """
+    Awaits task, but cancels it — and its deadline, which stops LLM calls,
+    graph nodes and SQL running in worker threads — if the client goes away.
+    """
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await http_request.is_disconnected():
+            deadline.cancel()
+            task.cancel()
+            raise HTTPException(status_code=499, detail="Client disconnected")
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that closes its iterator as soon as the response
+    ends — a client disconnect included — rather than whenever the abandoned
+    generator is garbage-collected (it may hold a DB connection).
+    """
+
+    def __init__(self, content: Iterator[str], **kwargs):
+        super().__init__(content, **kwargs)
+        self._content = content
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._content.close()
+
+
+def check_database(database_id: Optional[str]) -> None:
+    """404 unless database_id maps to a configured database (503 if the default isn't set up)."""
+    try:
+        database_url(database_id)
+    except DatabaseNotConfigured as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except UnknownDatabase as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build clients, graphs and caches before serving (incl. /health)
+    if WARM_START:
+        await asyncio.to_thread(warm_up)
+    yield
+
+
+app = FastAPI(title="AI SQL Assistant", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,19 +122,110 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "speculation": speculation_stats(),
+        "llm": dict(llm_stats),
+        "answer_store": dict(answer_store.stats) if answer_store else None,
+        "repair": repair_stats(),
+        "deep_analysis_checkpoints": dict(analysis_checkpoints.stats) if analysis_checkpoints else None,
+    }
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
-    try:
-        result = await run_agent(
-            user_message=request.message,
-            chat_history=request.history,
+async def chat(request: ChatRequest, http_request: Request) -> ChatResponse:
+    check_database(request.database_id)
+    # One turn at a time per session; the next request waits for this one to be saved
+    async with session_store.turn_lock(request.session_id):
+        session = session_store.get_or_create(
+            request.session_id, seed_history=request.history, database_id=request.database_id
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        if (request.database_id is not None
+                and resolve_database_id(request.database_id) != resolve_database_id(session.database_id)):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Session {session.session_id} belongs to database "
+                       f"{resolve_database_id(session.database_id)}",
+            )
+        deadline = Deadline(REQUEST_TIMEOUT_SECONDS)
+
+        task = asyncio.create_task(run_agent(
+            user_message=request.message,
+            session=session,
+            deadline=deadline,
+        ))
+        try:
+            result = await run_until_disconnected(http_request, task, deadline)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        session_store.save(session)
 
     return ChatResponse(
         reply=result["reply"],
         tool_used=result["tool_used"],
         sql_query=result["sql_query"],
         chart_data=result.get("chart_data"),
-    )
\ No newline at end of file
+        session_id=session.session_id,
+        result_id=result.get("result_id"),
+        partial=result.get("partial", False),
+    )
+
+
+@app.post("/chat/batch")
+def chat_batch(request: BatchRequest) -> StreamingResponse:
+    """
+    Streams one JSON line per question as each completes (NDJSON).
+    Each line carries "index" — its position in the request.
+    """
+    check_database(request.database_id)
+
+    def stream():
+        # Closed when the client disconnects — stops the batch's pending questions
+        with closing(iter_batch_replies(request.questions, request.database_id)) as replies:
+            for reply in replies:
+                yield json.dumps(reply, default=str) + "\n"
+
+    return ClosingStreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/export")
+def export(request: ExportRequest) -> StreamingResponse:
+    """
+    Streams every row of a query as CSV or NDJSON (chunked transfer).
+    The SQL is re-validated here — /export never runs anything but a SELECT.
+    """
+    if request.result_id:
+        stored = result_store.get(request.result_id)
+        if stored is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired result_id")
+        sql, database_id = stored["sql"], stored["database_id"]
+    elif request.sql:
+        sql, database_id = request.sql, request.database_id
+        check_database(database_id)
+    else:
+        raise HTTPException(status_code=400, detail="Provide sql or result_id")
+
+    if not is_safe_query(sql):
+        raise HTTPException(status_code=400, detail="Query is not safe to execute (must be a pure SELECT statement).")
+
+    try:
+        chunks = open_export(sql, request.format, database_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"SQL execution error: {str(e)}")
+
+    extension = "csv" if request.format == "csv" else "ndjson"
+    return ClosingStreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[request.format],
+        headers={"Content-Disposition": f'attachment; filename="export.{extension}"'},
+    )
+
+
+@app.delete("/chat/sessions/{session_id}")
+def end_session(session_id: str):
+    session_store.delete(session_id)
+    return {"status": "ok"}
@@ -9,20 +9,43 @@ Flow:
   1. classify_intent()  → which tool to call (or none)?
   2. call tool function directly from database_tools.py
   3. form_reply()       → turn raw result into a conversational response
+
+Step 1 runs concurrently with speculative SQL generation (app/speculation.py):
+if the intent is query_database, step 2 starts from the already-generated SQL.
+
+Before step 1, follow-ups that only reshape the previous result ("sort that
+by revenue", "top 3") are answered locally from the session's cached frame.
+
+With a Deadline (see app/deadline.py) every step runs against the request's
+time budget: once it is spent, LLM steps are skipped and whatever the tool
+produced so far is returned as-is (partial=True).
+
+With a ChatSession (see app/sessions.py), history, the rolling summary and
+the previous SQL come from the server-side session instead of the request.
 """
 
 import json
-from app.llm import llm
+import asyncio
+from contextlib import closing
+from app.llm import get_llm, get_structured_llm
 from pydantic import BaseModel
 from typing import Literal, Optional
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from app.sessions import record_turn, compact_history, SESSION_MAX_ROWS
+from app.speculation import start_speculation, resolve
+from app.deadline import Deadline, use_deadline, expired, llm_kwargs
+from pydantic_models.chatSession import ChatSession
+from pydantic_models.agentState import AgentState
 
 # Import tool logic directly — no HTTP calls needed
 from mcp_server.tools.database_tools import (
     run_query_database,
     run_deep_analysis,
     run_describe_data,
+    run_reshape_result,
+    run_batch,
 )
+from mcp_server.pipelines.reshape.frame import Frame
 
 class IntentClassification(BaseModel):
     tool: Literal["query_database", "deep_analysis", "describe_data", "none"]
@@ -42,13 +65,19 @@ When in doubt between query_database and deep_analysis:
 - Multiple angles or comparisons in one question → deep_analysis"""
 
 
-async def classify_intent(user_message: str, chat_history: list[dict]) -> str:
-    structured_llm = llm.with_structured_output(IntentClassification)
+async def classify_intent(
+    user_message: str,
+    chat_history: list[dict],
+    summary: Optional[str] = None,
+) -> str:
+    structured_llm = get_structured_llm(IntentClassification, tier="fast")
 
     history_text = ""
+    if summary:
+        history_text = f"\nEarlier conversation (summary): {summary}\n"
     if chat_history:
         recent = chat_history[-4:]
-        history_text = "\nRecent conversation:\n" + "\n".join(
+        history_text += "\nRecent conversation:\n" + "\n".join(
             f"{m['role'].upper()}: {m['content']}" for m in recent
         ) + "\n"
 
@@ -58,19 +87,32 @@ async def classify_intent(user_message: str, chat_history: list[dict]) -> str:
     ]
 
     try:
-        result = structured_llm.invoke(messages)
+        result = await structured_llm.ainvoke(messages, **llm_kwargs())
         return result.tool
     except Exception:
         return "query_database"
 
-def call_tool(tool_name: str, question: str) -> dict:
-    """Calls the right tool function and returns a standardized result dict."""
+def call_tool(
+    tool_name: str,
+    question: str,
+    previous_sql: Optional[str] = None,
+    prepared: Optional[AgentState] = None,
+    database_id: Optional[str] = None,
+    analysis_id: Optional[str] = None,
+) -> dict:
+    """
+    Calls the right tool function and returns a standardized result dict.
+    prepared: a speculatively generated query state (query_database only).
+    analysis_id: the session's last deep analysis — resumed if the same
+    question is asked again (deep_analysis only).
+    """
     if tool_name == "query_database":
-        return run_query_database(question)
+        return run_query_database(question, previous_sql=previous_sql, prepared_state=prepared,
+                                  database_id=database_id)
     elif tool_name == "deep_analysis":
-        return run_deep_analysis(question)
+        return run_deep_analysis(question, database_id=database_id, analysis_id=analysis_id)
     elif tool_name == "describe_data":
-        return run_describe_data()
+        return run_describe_data(database_id)
     else:
         return {"success": False, "error": f"Unknown tool: {tool_name}"}
 
@@ -84,6 +126,9 @@ def format_tool_result(tool_name: str, result: dict) -> str:
         parts = []
         if result.get("explanation"):
             parts.append(result["explanation"])
+        elif result.get("result"):
+            # No explanation (e.g. out of time) — show the rows themselves
+            parts.append(f"Results: {result['result'][:2000]}")
         if result.get("sql_query"):
             parts.append(f"SQL used:\n```sql\n{result['sql_query']}\n```")
         return "\n\n".join(parts)
@@ -116,17 +161,66 @@ def format_tool_result(tool_name: str, result: dict) -> str:
 
     return str(result)
 
-async def form_reply(
-    user_message: str,
-    tool_result_text: str,
-    chat_history: list[dict],
-) -> str:
+def extract_sql(tool_name: str, result: dict) -> Optional[str]:
+    """The SQL behind a tool result, for response metadata."""
+    if tool_name == "query_database" and result.get("sql_query"):
+        return result["sql_query"]
+    elif tool_name == "deep_analysis" and result.get("queries"):
+        return "\n---\n".join(
+            q for q in result["queries"] if q and not q.startswith("ERROR")
+        )
+    return None
+
+def iter_batch_replies(questions: list[str], database_id: Optional[str] = None):
+    """
+    Answers many questions at once (see pipelines/batch/). Yields one reply
+    dict per question as it completes. Replies are the tool's own
+    explanation — no per-question form_reply call.
+    """
+    with closing(run_batch(questions, database_id=database_id)) as items:
+        for item in items:
+            tool_name = item["tool"]
+            if not item.get("success"):
+                reply = f"Could not answer: {item.get('error', 'Unknown error')}"
+            elif tool_name == "query_database":
+                reply = item.get("explanation") or ""
+            elif tool_name == "deep_analysis":
+                reply = item.get("insights") or ""
+            else:
+                reply = format_tool_result(tool_name, item)
+
+            yield {
+                "index": item["index"],
+                "question": item["question"],
+                "reply": reply,
+                "tool_used": tool_name if tool_name != "none" else None,
+                "sql_query": extract_sql(tool_name, item),
+                "chart_data": item.get("chart_data"),
+                "success": bool(item.get("success")),
+            }
+
+def build_history_messages(chat_history: list[dict], summary: Optional[str] = None) -> list:
+    """Turns the last few turns (plus any rolling summary) into LangChain messages."""
     history_messages = []
+    if summary:
+        history_messages.append(SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
     for msg in chat_history[-6:]:
         if msg["role"] == "user":
             history_messages.append(HumanMessage(content=msg["content"]))
         elif msg["role"] == "assistant":
             history_messages.append(AIMessage(content=msg["content"]))
+    return history_messages
+
+async def form_reply(
+    user_message: str,
+    tool_result_text: str,
+    chat_history: list[dict],
+    summary: Optional[str] = None,
+) -> str:
+    if expired():
+        return tool_result_text
+
+    history_messages = build_history_messages(chat_history, summary)
 
     messages = [
         SystemMessage(content="""You are a helpful data assistant.
@@ -138,50 +232,97 @@ Be concise and focus on what the data means."""),
     ]
 
     try:
-        response = await llm.ainvoke(messages)
+        response = await get_llm("fast").ainvoke(messages, **llm_kwargs())
         return response.content.strip()
     except Exception:
         return tool_result_text
 
-async def run_agent(user_message: str, chat_history: list[dict] = None) -> dict:
-    chat_history = chat_history or []
-
-    # Step 1: classify
-    tool_name = await classify_intent(user_message, chat_history)
+async def run_agent(
+    user_message: str,
+    chat_history: list[dict] = None,
+    session: Optional[ChatSession] = None,
+    deadline: Optional[Deadline] = None,
+    database_id: Optional[str] = None,
+) -> dict:
+    """
+    Answers one message. With a session, history/summary/last SQL (and the
+    database) come from the session and the session is updated in place
+    (the caller saves it). Without one, database_id picks the database.
+    With a deadline, all work (LLM calls, graphs, SQL) is bounded by it.
+    """
+    with use_deadline(deadline):
+        return await _run_agent(user_message, chat_history, session, database_id)
+
+
+async def _run_agent(
+    user_message: str,
+    chat_history: Optional[list[dict]],
+    session: Optional[ChatSession],
+    database_id: Optional[str],
+) -> dict:
+    if session is not None:
+        chat_history = session.history
+        summary = session.summary
+        previous_sql = session.last_sql
+        database_id = session.database_id
+    else:
+        chat_history = chat_history or []
+        summary = None
+        previous_sql = None
+
+    # Step 0: cheap local path — reshape the previous result, no LLM or DB
+    if session is not None and session.last_frame:
+        reshaped = run_reshape_result(user_message, session.last_frame)
+        if reshaped["applicable"]:
+            if reshaped["frame"] is not None:
+                session.last_frame = reshaped["frame"]
+            record_turn(session, user_message, reshaped["text"])
+            await compact_history(session)
+            return {
+                "reply": reshaped["text"],
+                "tool_used": "reshape_result",
+                "sql_query": None,   # nothing ran; last_sql stays the base for follow-ups
+                "chart_data": None,
+                "partial": False,
+            }
+
+    # Step 1: classify — while SQL for the likely query_database case is generated
+    speculation = await start_speculation(user_message, previous_sql, database_id)
+    tool_name = await classify_intent(user_message, chat_history, summary)
+    prepared = await resolve(speculation, tool_name)
 
     tool_used = None
     sql_query = None
     chart_data = None
+    raw_result = None
 
     if tool_name == "none":
         # Direct conversational reply
-        history_messages = []
-        for msg in chat_history[-6:]:
-            if msg["role"] == "user":
-                history_messages.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                history_messages.append(AIMessage(content=msg["content"]))
+        history_messages = build_history_messages(chat_history, summary)
 
         messages = [
             SystemMessage(content="You are a helpful data assistant. Answer conversationally. For data questions, let the user know you can query the database."),
             *history_messages,
             HumanMessage(content=user_message),
         ]
-        response = await llm.ainvoke(messages)
-        reply = response.content.strip()
+        try:
+            response = await get_llm("fast").ainvoke(messages, **llm_kwargs())
+            reply = response.content.strip()
+        except Exception:
+            if not expired():
+                raise
+            reply = "Sorry, that took too long. Please try again."
 
     else:
         # Step 2: call tool directly
         tool_used = tool_name
-        raw_result = call_tool(tool_name, user_message)
+        raw_result = await asyncio.to_thread(
+            call_tool, tool_name, user_message, previous_sql, prepared, database_id,
+            session.last_analysis_id if session is not None else None,
+        )
 
         # Extract SQL for the response metadata
-        if tool_name == "query_database" and raw_result.get("sql_query"):
-            sql_query = raw_result["sql_query"]
-        elif tool_name == "deep_analysis" and raw_result.get("queries"):
-            sql_query = "\n---\n".join(
-                q for q in raw_result["queries"] if q and not q.startswith("ERROR")
-            )
+        sql_query = extract_sql(tool_name, raw_result)
 
         # Extract chart data if present
         if tool_name == "deep_analysis" and raw_result.get("chart_data"):
@@ -191,11 +332,28 @@ async def run_agent(user_message: str, chat_history: list[dict] = None) -> dict:
         tool_result_text = format_tool_result(tool_name, raw_result)
 
         # Step 3: form natural reply
-        reply = await form_reply(user_message, tool_result_text, chat_history)
+        reply = await form_reply(user_message, tool_result_text, chat_history, summary)
+
+    if session is not None:
+        record_turn(session, user_message, reply)
+        if tool_used == "deep_analysis":
+            # Kept even when it failed — asking again resumes where it stopped
+            session.last_analysis_id = raw_result.get("analysis_id")
+        if tool_used in ("query_database", "deep_analysis") and raw_result.get("success"):
+            session.last_tool = tool_used
+            session.last_sql = sql_query
+            session.last_result = raw_result.get("result")
+            session.last_frame = None
+            rows = raw_result.get("rows")
+            if rows is not None and len(rows) <= SESSION_MAX_ROWS:
+                session.last_frame = Frame.from_rows(raw_result["columns"], rows).columns
+        await compact_history(session)
 
     return {
         "reply": reply,
         "tool_used": tool_used,
         "sql_query": sql_query,
         "chart_data": chart_data,
-    }
\ No newline at end of file
+        "result_id": raw_result.get("result_id") if raw_result else None,
+        "partial": bool(raw_result and raw_result.get("timed_out")),
+    }
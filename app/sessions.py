@@ -0,0 +1,211 @@
+"""
+app/sessions.py — Server-side conversation sessions for /chat.
+
+Sessions live in an in-memory LRU (bounded by SESSION_MAX, expired after
+SESSION_TTL_SECONDS of inactivity). Set SESSION_DB_PATH to also persist
+them to a local SQLite file so they survive restarts and LRU eviction.
+
+Turns of one session are serialised (turn_lock): two concurrent requests
+on the same session_id would otherwise interleave their history and
+last_* fields, and the last save would drop the other turn.
+
+Long conversations are compacted: once history grows past
+MAX_HISTORY_MESSAGES, the oldest turns are folded into a rolling summary
+and only the most recent KEEP_RECENT_MESSAGES are kept verbatim.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+from langchain_core.messages import SystemMessage, HumanMessage
+from app.llm import get_llm
+from app.deadline import expired, llm_kwargs
+from pydantic_models.chatSession import ChatSession
+
+load_dotenv()
+
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH")   # unset → memory only
+SESSION_MAX_ROWS = int(os.getenv("SESSION_MAX_ROWS", "10000"))  # larger results aren't cached
+
+MAX_HISTORY_MESSAGES = 12
+KEEP_RECENT_MESSAGES = 6
+
+
+class SessionStore:
+    """Thread-safe LRU of ChatSessions with TTL and optional SQLite backing."""
+
+    def __init__(self, max_sessions: int, ttl_seconds: int, db_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._sessions: OrderedDict[str, ChatSession] = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per session with a turn in progress, dropped once none holds it
+        self._turn_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                    " session_id TEXT PRIMARY KEY,"
+                    " data       TEXT NOT NULL,"
+                    " updated_at REAL NOT NULL)"
+                )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection for one operation: committed on success, always closed."""
+        with closing(sqlite3.connect(self.db_path)) as conn, conn:
+            yield conn
+
+    def turn_lock(self, session_id: Optional[str]) -> asyncio.Lock:
+        """
+        The lock to hold for a whole turn (load → run → save) of session_id.
+        A request without a session_id starts a new session — nothing to wait for.
+        """
+        if not session_id:
+            return asyncio.Lock()
+        with self._lock:
+            lock = self._turn_locks.get(session_id)
+            if lock is None:
+                lock = asyncio.Lock()
+                self._turn_locks[session_id] = lock
+            return lock
+
+    def _is_expired(self, session: ChatSession, now: float) -> bool:
+        return now - session.updated_at > self.ttl_seconds
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """Returns the live session, or None if it is unknown or expired."""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if self._is_expired(session, now):
+                    del self._sessions[session_id]
+                    session = None
+                else:
+                    self._sessions.move_to_end(session_id)
+                    return session
+
+        if session is None and self.db_path:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT data FROM chat_sessions WHERE session_id = ?",
+                    (session_id,),
+                ).fetchone()
+            if row:
+                session = ChatSession.model_validate_json(row[0])
+                if self._is_expired(session, now):
+                    self.delete(session_id)
+                    return None
+                self._remember(session)
+
+        return session
+
+    def get_or_create(
+        self,
+        session_id: Optional[str] = None,
+        seed_history: Optional[list[dict]] = None,
+        database_id: Optional[str] = None,
+    ) -> ChatSession:
+        """
+        Looks up session_id, or starts a new session. A new session is seeded
+        with seed_history so clients still sending full history keep working,
+        and is bound to database_id.
+        """
+        if session_id:
+            session = self.get(session_id)
+            if session is not None:
+                return session
+
+        session = ChatSession(
+            session_id=session_id or uuid.uuid4().hex,
+            database_id=database_id,
+            history=list(seed_history or []),
+            updated_at=time.time(),
+        )
+        self._remember(session)
+        return session
+
+    def save(self, session: ChatSession) -> None:
+        session.updated_at = time.time()
+        self._remember(session)
+
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO chat_sessions (session_id, data, updated_at) "
+                    "VALUES (?, ?, ?)",
+                    (session.session_id, session.model_dump_json(), session.updated_at),
+                )
+                conn.execute(
+                    "DELETE FROM chat_sessions WHERE updated_at < ?",
+                    (session.updated_at - self.ttl_seconds,),
+                )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+
+    def _remember(self, session: ChatSession) -> None:
+        """Inserts/refreshes a session in the LRU and evicts past the bound."""
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+
+session_store = SessionStore(SESSION_MAX, SESSION_TTL_SECONDS, SESSION_DB_PATH)
+
+
+def record_turn(session: ChatSession, user_message: str, reply: str) -> None:
+    session.history.append({"role": "user", "content": user_message})
+    session.history.append({"role": "assistant", "content": reply})
+
+
+async def compact_history(session: ChatSession) -> None:
+    """
+    Folds the oldest turns into session.summary once history is too long.
+    Keeps prompts (and stored sessions) bounded on long conversations.
+    """
+    if len(session.history) <= MAX_HISTORY_MESSAGES:
+        return
+
+    old_turns = session.history[:-KEEP_RECENT_MESSAGES]
+    session.history = session.history[-KEEP_RECENT_MESSAGES:]
+
+    transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in old_turns)
+    previous = f"Summary so far:\n{session.summary}\n\n" if session.summary else ""
+
+    messages = [
+        SystemMessage(content="""Summarize this conversation between a user and a data assistant.
+Keep the questions asked, key numbers and findings, and any filters or time ranges in play.
+Be brief — a few sentences at most."""),
+        HumanMessage(content=f"{previous}New turns:\n{transcript}"),
+    ]
+
+    try:
+        if expired():
+            raise TimeoutError("no time left to summarize")
+        response = await get_llm("fast").ainvoke(messages, **llm_kwargs())
+        session.summary = response.content.strip()
+    except Exception:
+        # Summary failure is non-fatal — keep a truncated transcript instead
+        session.summary = (previous + transcript)[-2000:]
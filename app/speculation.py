@@ -0,0 +1,99 @@
+"""
+app/speculation.py — Speculative SQL generation while the intent is classified.
+
+Most messages end up as query_database, whose first LLM call (sql_generator)
+doesn't depend on the classification at all. So run_agent starts schema
+loading + SQL generation at the same time as classify_intent:
+
+  - intent is query_database → the prepared state (schema + SQL) is handed
+    to the query graph, which starts at execute_query        (a hit)
+  - any other intent         → the speculative task is cancelled and counted
+    as a wasted call, whether its LLM call had finished or was still in
+    flight (a request dropped mid-generation is still billed)
+
+SPECULATIVE_SQL=0 turns this off (classify first, then generate).
+"""
+
+import os
+import asyncio
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+from pydantic_models.agentState import AgentState
+from mcp_server.shared.answers import answer_store
+
+load_dotenv()
+
+SPECULATIVE_SQL = os.getenv("SPECULATIVE_SQL", "1") == "1"
+
+_stats = {"started": 0, "hits": 0, "failed": 0, "cancelled": 0, "wasted_calls": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def speculation_stats() -> dict:
+    """Counters since startup, plus hit_rate = hits / started."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["hit_rate"] = round(stats["hits"] / stats["started"], 4) if stats["started"] else None
+    return stats
+
+
+async def _prepare(question: str, previous_sql: Optional[str],
+                   database_id: Optional[str]) -> AgentState:
+    # Imported here so app.mcp_client stays cheap to import (see app/startup.py)
+    from mcp_server.shared.nodes import get_schema
+    from mcp_server.pipelines.query.nodes import sql_generator_async
+
+    state = AgentState(question=question, previous_sql=previous_sql, database_id=database_id)
+    state = await asyncio.to_thread(get_schema, state)
+    return await sql_generator_async(state)
+
+
+async def start_speculation(question: str, previous_sql: Optional[str] = None,
+                            database_id: Optional[str] = None) -> Optional[asyncio.Task]:
+    """Starts generating SQL for question in the background (None if disabled)."""
+    if not SPECULATIVE_SQL:
+        return None
+    if previous_sql is None and answer_store is not None and await asyncio.to_thread(
+        answer_store.has, question, database_id
+    ):
+        return None  # run_query_database will answer from the store
+    _count("started")
+    return asyncio.create_task(_prepare(question, previous_sql, database_id))
+
+
+async def resolve(task: Optional[asyncio.Task], tool_name: str) -> Optional[AgentState]:
+    """
+    Settles a speculative task once the intent is known.
+    Returns the prepared state for query_database (None if generation
+    failed — the graph then starts from scratch); cancels it otherwise.
+    """
+    if task is None:
+        return None
+
+    if tool_name != "query_database":
+        if task.done():
+            task.exception()  # retrieve it so asyncio doesn't log it
+            _count("wasted_calls")
+        else:
+            task.cancel()
+            _count("cancelled")
+            _count("wasted_calls")
+        return None
+
+    try:
+        state = await task
+    except Exception:
+        state = None
+
+    if state is None or state.error or not state.sql_query:
+        _count("failed")
+        return None
+
+    _count("hits")
+    return state
@@ -0,0 +1,64 @@
+"""
+app/startup.py — Explicit warm-up for the API and MCP server processes.
+
+Nothing heavy happens at import time: the LLM client, the DB engine and the
+LangGraph graphs are all created on first use. warm_up() does that work up
+front instead, so the first real request doesn't pay for it. It runs from
+the FastAPI lifespan hook (and before the MCP server starts) when
+WARM_START=1 — the process only starts answering /health once it's done.
+
+WARM_LLM_PING=1 additionally sends one tiny completion so the HTTPS
+connection to the LLM provider is open before traffic arrives.
+"""
+
+import os
+import time
+import logging
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WARM_START = os.getenv("WARM_START", "1") == "1"
+WARM_LLM_PING = os.getenv("WARM_LLM_PING", "0") == "1"
+
+# Step name → seconds taken, from the last warm_up() call
+warm_up_timings: dict[str, float] = {}
+
+
+def warm_up(ping_llm: bool = WARM_LLM_PING) -> dict[str, float]:
+    """
+    Builds clients, graphs and caches. Each step is timed and failures are
+    recorded instead of raised — a cold path still works on first use.
+    """
+    from app.db import get_engine
+    from app.llm import get_llm, MODEL_TIERS
+    from mcp_server.shared.nodes import load_schema
+    from mcp_server.tools.database_tools import get_query_graph, get_deep_analysis_graph
+
+    def open_db_pool():
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    steps = [
+        ("db_pool", open_db_pool),
+        ("schema_cache", load_schema),
+        ("llm_clients", lambda: [get_llm(tier) for tier in MODEL_TIERS]),
+        ("query_graph", get_query_graph),
+        ("deep_analysis_graph", get_deep_analysis_graph),
+    ]
+    if ping_llm:
+        steps.append(("llm_ping", lambda: get_llm("fast").invoke("ping")))
+
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+            warm_up_timings[name] = round(time.perf_counter() - started, 4)
+        except Exception as e:
+            warm_up_timings[name] = -1.0
+            logger.warning("warm_up: %s failed: %s", name, e)
+
+    return dict(warm_up_timings)
@@ -0,0 +1,110 @@
+"""
+pipelines/batch/nodes.py — Steps for answering many questions in one request.
+
+Reporting jobs send dozens of questions at once. Instead of running the
+full classify → query graph per question, a batch:
+  - classifies every question in ONE LLM call        (classify_batch)
+  - reads the schema once and shares it               (runner.py)
+  - generates SQL per question with the query nodes   (sql_generator)
+  - executes each distinct SQL statement only once    (SharedExecutor)
+
+Wiring (thread pool, streaming order) lives in runner.py.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Literal
+from pydantic import BaseModel
+from sqlalchemy import text
+from langchain_core.messages import SystemMessage, HumanMessage
+from app.llm import get_structured_llm
+from app.db import get_engine
+from mcp_server.shared.nodes import is_safe_query
+
+
+class IntentBatch(BaseModel):
+    tools: list[Literal["query_database", "deep_analysis", "describe_data", "none"]]
+
+
+BATCH_CLASSIFICATION_PROMPT = """You are a routing assistant. For EACH numbered question, decide which tool to use.
+Tools:
+- query_database: simple data questions answerable with ONE SQL query
+  (totals, counts, top N, filters, averages, single metric lookups)
+- deep_analysis: complex questions needing MULTIPLE queries and synthesized insights
+  (multi-dimensional, correlations, trends across different areas, "why" questions)
+- describe_data: asks what data exists, what tables there are, what can be asked
+- none: greetings, general conversation, anything not data-related
+Return one tool per question, in the same order as the questions."""
+
+
+def classify_batch(questions: list[str]) -> list[str]:
+    """
+    One structured LLM call for the whole batch.
+    Falls back to query_database for every question if the call fails or
+    returns the wrong number of answers — same default as classify_intent.
+    """
+    structured_llm = get_structured_llm(IntentBatch, tier="fast")
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+
+    messages = [
+        SystemMessage(content=BATCH_CLASSIFICATION_PROMPT),
+        HumanMessage(content=numbered),
+    ]
+
+    try:
+        result = structured_llm.invoke(messages)
+        if len(result.tools) == len(questions):
+            return list(result.tools)
+    except Exception:
+        pass
+
+    return ["query_database"] * len(questions)
+
+
+def normalize_sql(sql: str) -> str:
+    """Key used to spot identical statements — whitespace and trailing ';' ignored."""
+    return " ".join(sql.split()).rstrip(";").strip()
+
+
+class SharedExecutor:
+    """
+    Executes each distinct SQL statement once per batch.
+
+    The first worker to ask for a statement runs it on a pooled connection;
+    workers asking for the same statement meanwhile wait on the same Future.
+    Returns (result_string, columns, rows) or raises the execution error.
+    """
+
+    def __init__(self, database_id: str | None = None):
+        self.database_id = database_id
+        self._futures: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.deduplicated = 0
+
+    def run(self, sql: str) -> tuple[str, list[str], list[tuple]]:
+        key = normalize_sql(sql)
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+                self.executed += 1
+            else:
+                self.deduplicated += 1
+
+        if owner:
+            try:
+                future.set_result(self._execute(sql))
+            except Exception as e:
+                future.set_exception(e)
+
+        return future.result()
+
+    def _execute(self, sql: str) -> tuple[str, list[str], list[tuple]]:
+        if not is_safe_query(sql):
+            raise ValueError("Query is not safe to execute (must be a pure SELECT statement).")
+        with get_engine(self.database_id).connect() as conn:
+            result = conn.execute(text(sql))
+            rows = result.fetchall()
+            return str(rows), list(result.keys()), [tuple(row) for row in rows]
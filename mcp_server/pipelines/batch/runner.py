@@ -0,0 +1,110 @@
+"""
+pipelines/batch/runner.py — Wiring for the batch pipeline.
+
+Flow:
+  classify_batch (one LLM call) → get_schema (once)
+    → per question, on a bounded thread pool:
+        query_database:  sql_generator → SharedExecutor.run → explain_results
+                         (falls back to the full query graph, with retries, on error)
+        deep_analysis:   full deep_analysis graph
+        describe_data:   run_describe_data()
+        none:            no answer
+    → results yielded as each question completes (not in input order)
+
+No SQL or prompts here. Scheduling only.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator
+from pydantic_models.agentState import AgentState
+from mcp_server.shared.nodes import get_schema
+from mcp_server.pipelines.query.nodes import sql_generator, explain_results
+from mcp_server.pipelines.batch.nodes import classify_batch, SharedExecutor
+
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+MAX_BATCH_QUESTIONS = 100
+
+
+def _answer_query(question: str, schema_state: AgentState, executor: SharedExecutor) -> dict:
+    from mcp_server.tools.database_tools import run_query_database
+
+    state = sql_generator(AgentState(
+        question=question,
+        database_id=schema_state.database_id,
+        schema_ref=schema_state.schema_ref,
+    ))
+    if state.error is None:
+        try:
+            state.result, state.columns, state.rows = executor.run(state.sql_query)
+        except Exception as e:
+            state.error = f"SQL execution error: {str(e)}"
+
+    if state.error is not None:
+        # Let the regular graph handle it — it retries with the error as context
+        return run_query_database(question, database_id=schema_state.database_id)
+
+    state = explain_results(state)
+    return {
+        "success": state.error is None,
+        "error": state.error,
+        "sql_query": state.sql_query,
+        "explanation": state.natural_language_output,
+        "result": state.result,
+        "columns": state.columns,
+        "rows": state.rows,
+        "attempts": 1,
+    }
+
+
+def _answer(index: int, question: str, tool: str, schema_state: AgentState,
+            executor: SharedExecutor) -> dict:
+    from mcp_server.tools.database_tools import run_deep_analysis, run_describe_data
+
+    try:
+        if tool == "query_database":
+            result = _answer_query(question, schema_state, executor)
+        elif tool == "deep_analysis":
+            result = run_deep_analysis(question, database_id=schema_state.database_id)
+        elif tool == "describe_data":
+            result = run_describe_data(database_id=schema_state.database_id)
+        else:
+            result = {"success": False, "error": "Not a data question."}
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+
+    return {"index": index, "question": question, "tool": tool, **result}
+
+
+def iter_batch_results(
+    questions: list[str],
+    max_workers: int = BATCH_MAX_WORKERS,
+    database_id: str | None = None,
+) -> Iterator[dict]:
+    """
+    Yields one result dict per question as soon as it is ready.
+    Each dict has "index" (position in `questions`), "question", "tool",
+    plus the same keys the matching run_<tool>() bridge function returns.
+    Closing the generator early cancels the questions not yet started.
+    """
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        raise ValueError(f"A batch can hold at most {MAX_BATCH_QUESTIONS} questions.")
+
+    tools = classify_batch(questions)
+    schema_state = get_schema(AgentState(question="", database_id=database_id))
+    executor = SharedExecutor(database_id)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    futures = [
+        pool.submit(_answer, i, question, tool, schema_state, executor)
+        for i, (question, tool) in enumerate(zip(questions, tools))
+    ]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Closed early (e.g. the client left the NDJSON stream): drop the
+        # questions not started yet rather than answering them for nobody
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
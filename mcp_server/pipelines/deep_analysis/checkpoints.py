@@ -0,0 +1,240 @@
+"""
+pipelines/deep_analysis/checkpoints.py — Resumable deep analyses.
+
+With DEEP_ANALYSIS_CHECKPOINT_PATH set, the deep_analysis graph is compiled
+with a LangGraph SQLite checkpointer: the state after every node is saved
+under the analysis' thread (thread_id = analysis_id, returned to callers).
+That makes two cheap re-runs possible:
+
+  retry   — same question again (e.g. after a timeout or an LLM error):
+            resume_point() finds the first node whose output is missing or
+            failed and the graph is re-run from the checkpoint before it.
+            Sub-queries that already succeeded are reused, not re-run.
+  refine  — a follow-up on a finished analysis ("focus on the north
+            region"): the new question replaces the old one in the latest
+            checkpoint, as if generate_and_execute_all had just run, so
+            only synthesize_insights and build_chart_data run again.
+
+Retention is bounded: analyses idle for DEEP_ANALYSIS_CHECKPOINT_MAX_AGE_SECONDS,
+and the oldest beyond DEEP_ANALYSIS_CHECKPOINT_MAX_THREADS, are deleted
+whenever a new analysis starts.
+
+Unset DEEP_ANALYSIS_CHECKPOINT_PATH → no checkpointer, every run starts over.
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from dataclasses import fields
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+from pydantic_models.analysisState import AnalysisState
+from mcp_server.shared.answers import question_key
+
+load_dotenv()
+
+DEEP_ANALYSIS_CHECKPOINT_PATH = os.getenv("DEEP_ANALYSIS_CHECKPOINT_PATH")   # unset → disabled
+DEEP_ANALYSIS_CHECKPOINT_MAX_THREADS = int(os.getenv("DEEP_ANALYSIS_CHECKPOINT_MAX_THREADS", "500"))
+DEEP_ANALYSIS_CHECKPOINT_MAX_AGE_SECONDS = int(
+    os.getenv("DEEP_ANALYSIS_CHECKPOINT_MAX_AGE_SECONDS", "86400")
+)
+
+# Graph nodes in order, each with "its output needs redoing" for a final state
+NODE_ORDER = [
+    ("get_schema",               lambda s: not s.schema_ref),
+    ("decompose_question",       lambda s: not s.sub_questions),
+    ("generate_and_execute_all", lambda s: len(s.results) != len(s.sub_questions)
+                                           or any(r is None or r.startswith("ERROR") for r in s.results)),
+    ("synthesize_insights",      lambda s: not s.insights or s.timed_out),
+]
+
+
+def _as_state(values: dict) -> AnalysisState:
+    """
+    A checkpoint's values as an AnalysisState. They also hold the channels of
+    shared nodes typed with AgentState (get_schema) — those are left out.
+    """
+    return AnalysisState(**{f.name: values[f.name] for f in fields(AnalysisState) if f.name in values})
+
+
+def resume_point(state: AnalysisState) -> Optional[str]:
+    """The first node whose output is missing or failed, or None if the analysis is complete."""
+    for node, needs_rerun in NODE_ORDER:
+        if needs_rerun(state):
+            return node
+    return None
+
+
+class AnalysisCheckpoints:
+    """
+    A SqliteSaver (what the graph checkpoints into) plus an index of
+    analyses — question, database, last use — that drives retention.
+    """
+
+    def __init__(self, db_path: str):
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+        self.db_path = db_path
+        self.stats = {"started": 0, "retried": 0, "refined": 0, "reused": 0, "pruned": 0}
+        self._lock = threading.Lock()
+
+        # One connection shared across worker threads; SqliteSaver serialises access
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        # The state itself is the only non-builtin type that gets checkpointed
+        serde = JsonPlusSerializer(
+            allowed_msgpack_modules=[("pydantic_models.analysisState", "AnalysisState")]
+        )
+        self.saver = SqliteSaver(conn, serde=serde)
+        self.saver.setup()
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " analysis_id TEXT PRIMARY KEY,"
+                " database_id TEXT,"
+                " question    TEXT NOT NULL,"
+                " created_at  REAL NOT NULL,"
+                " used_at     REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as conn, conn:
+            yield conn
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, analysis_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                "SELECT * FROM analyses WHERE analysis_id = ?", (analysis_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        if time.time() - row["used_at"] > DEEP_ANALYSIS_CHECKPOINT_MAX_AGE_SECONDS:
+            return None
+        return dict(row)
+
+    def start(self, question: str, database_id: Optional[str]) -> str:
+        """Registers a new analysis and returns its id (the graph's thread_id)."""
+        analysis_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO analyses (analysis_id, database_id, question, created_at, used_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (analysis_id, database_id, question, now, now),
+            )
+        self.count("started")
+        self.prune()
+        return analysis_id
+
+    def touch(self, analysis_id: str, question: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE analyses SET question = ?, used_at = ? WHERE analysis_id = ?",
+                (question, time.time(), analysis_id),
+            )
+
+    def prune(self) -> int:
+        """Deletes expired analyses and the oldest beyond the cap. Returns how many."""
+        cutoff = time.time() - DEEP_ANALYSIS_CHECKPOINT_MAX_AGE_SECONDS
+        with self._connect() as conn:
+            expired_ids = [row[0] for row in conn.execute(
+                "SELECT analysis_id FROM analyses WHERE used_at < ?", (cutoff,)
+            )]
+            excess_ids = [row[0] for row in conn.execute(
+                "SELECT analysis_id FROM analyses WHERE used_at >= ?"
+                " ORDER BY used_at DESC LIMIT -1 OFFSET ?",
+                (cutoff, DEEP_ANALYSIS_CHECKPOINT_MAX_THREADS),
+            )]
+
+        doomed = expired_ids + excess_ids
+        for analysis_id in doomed:
+            self.saver.delete_thread(analysis_id)
+        if doomed:
+            with self._connect() as conn:
+                conn.executemany(
+                    "DELETE FROM analyses WHERE analysis_id = ?", [(a,) for a in doomed]
+                )
+            with self._lock:
+                self.stats["pruned"] += len(doomed)
+        return len(doomed)
+
+
+analysis_checkpoints = (
+    AnalysisCheckpoints(DEEP_ANALYSIS_CHECKPOINT_PATH) if DEEP_ANALYSIS_CHECKPOINT_PATH else None
+)
+
+
+def get_checkpointer():
+    """The saver to compile the graph with, or None when checkpointing is off."""
+    return analysis_checkpoints.saver if analysis_checkpoints else None
+
+
+def run_analysis(graph, state: AnalysisState, analysis_id: Optional[str] = None,
+                 refine: bool = False) -> tuple[dict, Optional[str]]:
+    """
+    Runs the deep_analysis graph for state: from scratch, or — given the
+    analysis_id of an earlier run on the same database — as a retry (same
+    question) or, with refine=True, a refinement (different question).
+    Returns (final state values, analysis_id; None when checkpointing is off).
+    """
+    store = analysis_checkpoints
+    if store is None:
+        return graph.invoke(state), None
+
+    def start_over() -> tuple[dict, str]:
+        new_id = store.start(state.question, state.database_id)
+        return graph.invoke(state, {"configurable": {"thread_id": new_id}}), new_id
+
+    entry = store.get(analysis_id) if analysis_id else None
+    if entry is None or entry["database_id"] != state.database_id:
+        return start_over()
+
+    config = {"configurable": {"thread_id": analysis_id}}
+    latest = graph.get_state(config)
+    if not latest.values:
+        return start_over()
+    previous = _as_state(latest.values)
+    # The old run's budget and failures don't carry over
+    fresh = {"deadline": state.deadline, "timed_out": False, "error": None}
+    same_question = question_key(previous.question) == question_key(state.question)
+    node = latest.next[0] if latest.next else resume_point(previous)
+
+    if same_question and node is None:
+        store.count("reused")
+        store.touch(analysis_id, state.question)
+        return latest.values, analysis_id
+
+    if same_question:
+        # Back to the checkpoint taken just before the first node that failed
+        before = next((s for s in graph.get_state_history(config) if s.next == (node,)), None)
+        if before is None:
+            return start_over()
+        if node == "generate_and_execute_all":
+            # That checkpoint predates the sub-queries; hand over the ones that
+            # already ran so generate_and_execute_all re-runs only the failures
+            fresh.update(queries=previous.queries, results=previous.results)
+        config = graph.update_state(before.config, fresh)
+        store.count("retried")
+    elif refine and node in (None, "synthesize_insights"):
+        # Keep the sub-queries and their results; only re-synthesize
+        config = graph.update_state(
+            latest.config,
+            {**fresh, "question": state.question, "insights": None, "chart_data": None},
+            as_node="generate_and_execute_all",
+        )
+        store.count("refined")
+    else:
+        return start_over()
+
+    store.touch(analysis_id, state.question)
+    return graph.invoke(None, config), analysis_id
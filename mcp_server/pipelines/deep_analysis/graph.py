@@ -7,6 +7,9 @@ Flow:
 
 No logic here. Sequence only.
 Uses its own AnalysisState (not AgentState) since the data shape is different.
+
+Compiled with a checkpointer when DEEP_ANALYSIS_CHECKPOINT_PATH is set —
+invoke it through checkpoints.run_analysis(), which supplies the thread.
 """
 
 from langgraph.graph import StateGraph, END
@@ -18,6 +21,7 @@ from mcp_server.pipelines.deep_analysis.nodes import (
     synthesize_insights,
     build_chart_data,
 )
+from mcp_server.pipelines.deep_analysis.checkpoints import get_checkpointer
 
 builder = StateGraph(AnalysisState)
 
@@ -34,4 +38,4 @@ builder.add_edge("generate_and_execute_all", "synthesize_insights")
 builder.add_edge("synthesize_insights",      "build_chart_data")
 builder.add_edge("build_chart_data",         END)
 
-graph = builder.compile()
\ No newline at end of file
+graph = builder.compile(checkpointer=get_checkpointer())
\ No newline at end of file
@@ -10,14 +10,29 @@ Each node is defined with its full docstring and return signature
 so the graph wiring is clear before implementation begins.
 """
 
-from app.llm import llm
-from app.db import engine
+import os
+import json
+from app.llm import get_llm, get_structured_llm, invoke_parsed
+from app.deadline import expired, llm_kwargs, interrupt_sql, DEADLINE_ERROR
+from app.db import get_engine
 from sqlalchemy import text
 from langchain_core.messages import SystemMessage, HumanMessage
 from pydantic_models.analysisState import AnalysisState
-from mcp_server.shared.nodes import is_safe_query
+from mcp_server.shared.nodes import is_safe_query, schema_for
+from mcp_server.shared.prompts import render_prompt, DECOMPOSE_PROMPT, SUB_QUERY_PROMPT
+from mcp_server.pipelines.deep_analysis.optimizer import plan_merges, execute_merged
+from mcp_server.pipelines.query.repair import clean_sql, classify_error, deterministic_fix
 
 MAX_ATTEMPTS = 3
+MERGE_SUBQUERIES = os.getenv("DEEP_ANALYSIS_MERGE_SUBQUERIES", "1") == "1"
+
+def _parse_json(content: str):
+    """json.loads, tolerating a markdown code fence around the payload."""
+    if content.startswith("```"):
+        content = content.split("```")[1]
+        if content.startswith("json"):
+            content = content[4:]
+    return json.loads(content.strip())
 
 def decompose_question(state: AnalysisState) -> AnalysisState:
     """
@@ -35,12 +50,12 @@ def decompose_question(state: AnalysisState) -> AnalysisState:
            "What products are most purchased by the fastest-growing segment?"
          ]
     """
-    system_prompt = f"""You are an expert data analyst. Break the following complex question 
-    into 2-4 focused sub-questions that can each be answered with a single SQL query.
-    Database Schema:
-    {state.db_schema}
-    Return a JSON array of sub-question strings. Nothing else.
-    Example: ["sub-question 1", "sub-question 2", "sub-question 3"]"""
+    if expired(state.deadline):
+        state.error = f"{DEADLINE_ERROR} before the question was decomposed."
+        state.timed_out = True
+        return state
+
+    system_prompt = render_prompt(DECOMPOSE_PROMPT, schema_for(state)[1])
 
     messages = [
         SystemMessage(content=system_prompt),
@@ -48,15 +63,10 @@ def decompose_question(state: AnalysisState) -> AnalysisState:
     ]
 
     try:
-        import json
-        response = llm.invoke(messages)
-        content = response.content.strip()
-        # Strip markdown code fences if present
-        if content.startswith("```"):
-            content = content.split("```")[1]
-            if content.startswith("json"):
-                content = content[4:]
-        state.sub_questions = json.loads(content.strip())
+        # Small model first; unparseable output is retried on the large one
+        state.sub_questions = invoke_parsed(
+            messages, _parse_json, tier="fast", **llm_kwargs(state.deadline)
+        )
         state.error = None
     except Exception as e:
         state.error = f"Failed to decompose question: {str(e)}"
@@ -66,32 +76,53 @@ def decompose_question(state: AnalysisState) -> AnalysisState:
 def generate_and_execute_all(state: AnalysisState) -> AnalysisState:
     """
     Loops through state.sub_questions.
-    For each sub-question: generates a SQL query, executes it safely,
-    stores the result.
+    For each sub-question: generates a SQL query. Then executes them all
+    safely, storing one result per query.
+
+    Sub-queries that share the same joined base are merged into one
+    statement and run once (see optimizer.py) unless MERGE_SUBQUERIES is off.
 
     Stores results in:
       state.queries  (list of SQL strings, one per sub-question)
       state.results  (list of result strings, one per sub-question)
 
+    A sub-query that fails gets one deterministic repair (query/repair.py).
     Failed sub-queries store an error string in results rather than
     halting the whole pipeline — partial results are still valuable.
+    The same goes for sub-questions left over when the deadline passes.
+
+    On a resumed run (see checkpoints.py) sub-queries that already
+    succeeded keep their SQL and result; only the failed ones run again.
     """
-    from pydantic_models.agentState import AgentState, SQLOutput
+    from pydantic_models.agentState import SQLOutput
 
     queries = []
     results = []
 
-    for sub_question in state.sub_questions:
-        # Reuse the same prompt structure as the query pipeline
-        system_prompt = f"""You are an expert SQL assistant. Generate a correct SQL query.
-        Database Schema:
-        {state.db_schema}
-        Rules:
-        - SQLite database
-        - Date columns are TEXT: use strftime('%Y', date_col) = '2023'
-        - Always alias aggregated columns
-        - Use JOINs based on foreign keys in the schema
-        - Return only the SQL query"""
+    reusable = {}
+    if len(state.queries) == len(state.results) == len(state.sub_questions):
+        reusable = {
+            i: (sql, result)
+            for i, (sql, result) in enumerate(zip(state.queries, state.results))
+            if result is not None and not result.startswith("ERROR")
+        }
+
+    # Same system prompt for every sub-question — rendered once, cached
+    structured_llm = get_structured_llm(SQLOutput, tier="large")
+    schema, schema_json = schema_for(state)
+    system_prompt = render_prompt(SUB_QUERY_PROMPT, schema_json)
+
+    for i, sub_question in enumerate(state.sub_questions):
+        if i in reusable:
+            queries.append(reusable[i][0])
+            results.append(reusable[i][1])
+            continue
+
+        if expired(state.deadline):
+            state.timed_out = True
+            queries.append("ERROR: Skipped")
+            results.append(f"ERROR: {DEADLINE_ERROR}")
+            continue
 
         messages = [
             SystemMessage(content=system_prompt),
@@ -99,29 +130,82 @@ def generate_and_execute_all(state: AnalysisState) -> AnalysisState:
         ]
 
         try:
-            structured_llm = llm.with_structured_output(SQLOutput)
-            response = structured_llm.invoke(messages)
-            sql = response.sql_query.strip()
-            queries.append(sql)
-
-            # Execute safely
-            if not is_safe_query(sql):
-                results.append("ERROR: Unsafe query generated")
-                continue
-
-            with engine.connect() as conn:
-                result = conn.execute(text(sql))
-                rows = result.fetchall()
-                results.append(str(rows))
-
+            response = structured_llm.invoke(messages, **llm_kwargs(state.deadline))
+            queries.append(clean_sql(response.sql_query))
+            results.append(None)   # filled in below
         except Exception as e:
             queries.append("ERROR: Could not generate query")
             results.append(f"ERROR: {str(e)}")
 
+    # Execute safely
+    runnable = []
+    for i, sql in enumerate(queries):
+        if results[i] is not None:
+            continue
+        if is_safe_query(sql):
+            runnable.append(i)
+        else:
+            results[i] = "ERROR: Unsafe query generated"
+
+    with get_engine(state.database_id).connect() as conn, interrupt_sql(conn, state.deadline):
+        merged = set()
+        groups = plan_merges([queries[i] for i in runnable]) if MERGE_SUBQUERIES else []
+
+        for group in groups:
+            indexes = [runnable[j] for j in group]
+            try:
+                rows_per_query = execute_merged(conn, [queries[i] for i in indexes])
+            except Exception:
+                conn.rollback()
+                if expired(state.deadline):
+                    break
+                continue   # run this group's queries one by one instead
+            for i, rows in zip(indexes, rows_per_query):
+                results[i] = str(rows)
+            merged.update(indexes)
+
+        for i in runnable:
+            if i in merged:
+                continue
+            if expired(state.deadline):
+                state.timed_out = True
+                results[i] = f"ERROR: {DEADLINE_ERROR}"
+                continue
+            try:
+                rows = conn.execute(text(queries[i])).fetchall()
+                results[i] = str(rows)
+            except Exception as e:
+                conn.rollback()
+                if expired(state.deadline):
+                    state.timed_out = True
+                    results[i] = f"ERROR: {DEADLINE_ERROR}"
+                    continue
+                results[i] = f"ERROR: {str(e)}"
+
+                # One deterministic repair (query/repair.py) — no LLM retry here
+                fixed = deterministic_fix(classify_error(str(e), queries[i]), queries[i],
+                                          str(e), schema)
+                if fixed != queries[i] and is_safe_query(fixed):
+                    try:
+                        results[i] = str(conn.execute(text(fixed)).fetchall())
+                        queries[i] = fixed
+                    except Exception:
+                        conn.rollback()
+
     state.queries = queries
     state.results = results
     return state
 
+def _partial_insights(state: AnalysisState, combined_context: str) -> AnalysisState:
+    """Deadline fallback for synthesize_insights: the sub-results as they are."""
+    state.timed_out = True
+    if state.results:
+        state.insights = f"Partial results (the analysis ran out of time):\n\n{combined_context}"
+        state.error = None
+    elif not state.error:
+        state.error = DEADLINE_ERROR
+    return state
+
 def synthesize_insights(state: AnalysisState) -> AnalysisState:
     """
     Calls the LLM with ALL sub-questions and their results together.
@@ -136,6 +220,10 @@ def synthesize_insights(state: AnalysisState) -> AnalysisState:
         context_parts.append(f"Sub-question {i}: {sub_q}\nResult: {result}")
     combined_context = "\n\n".join(context_parts)
 
+    # Out of time: hand back the raw sub-results instead of a narrative
+    if state.timed_out or expired(state.deadline):
+        return _partial_insights(state, combined_context)
+
     system_prompt = """You are a senior data analyst. You have the results of multiple 
     database queries that together answer a complex business question.
     Synthesize ALL the results into a single coherent analytical response:
@@ -151,10 +239,12 @@ def synthesize_insights(state: AnalysisState) -> AnalysisState:
     ]
 
     try:
-        response = llm.invoke(messages)
+        response = get_llm("large").invoke(messages, **llm_kwargs(state.deadline))
         state.insights = response.content.strip()
         state.error = None
     except Exception as e:
+        if expired(state.deadline):
+            return _partial_insights(state, combined_context)
         state.error = f"Failed to synthesize insights: {str(e)}"
 
     return state
@@ -177,6 +267,10 @@ def build_chart_data(state: AnalysisState) -> AnalysisState:
     }
     If no chart is appropriate, stores None.
     """
+    if state.timed_out or expired(state.deadline):
+        state.chart_data = None
+        return state
+
     context_parts = []
     for i, (sub_q, result) in enumerate(zip(state.sub_questions, state.results), 1):
         context_parts.append(f"Sub-question {i}: {sub_q}\nResult: {result}")
@@ -199,21 +293,13 @@ def build_chart_data(state: AnalysisState) -> AnalysisState:
         HumanMessage(content=combined_context),
     ]
 
-    try:
-        import json
-        response = llm.invoke(messages)
-        content = response.content.strip()
-
-        if content == "NO_CHART":
-            state.chart_data = None
-        else:
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            state.chart_data = json.loads(content.strip())
+    def parse_chart(content: str):
+        return None if content == "NO_CHART" else _parse_json(content)
 
-        state.error = None
+    try:
+        state.chart_data = invoke_parsed(
+            messages, parse_chart, tier="fast", **llm_kwargs(state.deadline)
+        )
     except Exception as e:
         # Chart failure is non-fatal — insights still get returned
         state.chart_data = None
@@ -0,0 +1,283 @@
+"""
+pipelines/deep_analysis/optimizer.py — Runs sub-queries that share a base as one statement.
+
+Sub-questions from decompose_question usually scan the same joined base
+(orders ⋈ order_items ⋈ products ...) with different groupings. Instead of
+running that join once per sub-query, compatible queries are merged:
+
+  WITH __base AS MATERIALIZED (
+      SELECT o.id AS o__id, oi.quantity AS oi__quantity, ...   -- columns any branch needs
+      FROM orders o JOIN order_items oi ON ...                 -- the shared FROM clause
+      WHERE ...                                                -- the shared WHERE clause
+  )
+  SELECT 0 AS __q, ROW_NUMBER() OVER () AS __n, *, NULL
+      FROM (SELECT ... FROM __base GROUP BY ...)
+  UNION ALL
+  SELECT 1 AS __q, ROW_NUMBER() OVER (ORDER BY revenue DESC) AS __n, *
+      FROM (SELECT ... AS revenue FROM __base GROUP BY ... ORDER BY revenue DESC LIMIT 5)
+
+The join runs once; every branch reads the materialized base. Only queries
+with the same FROM and the same WHERE are merged, and the WHERE goes into
+the base — so the filter (and its indexes) still applies before anything is
+materialized. UNION ALL doesn't keep each branch's ORDER BY, so output rows
+are split back per sub-query by __q and put back in order by __n, a row
+number over the branch's own ORDER BY; padding columns are dropped.
+(SQLite has no GROUPING SETS, hence one UNION ALL branch per sub-query.)
+
+Merging is deliberately conservative. A query only qualifies when it is a
+single flat SELECT (no CTEs, subqueries, compound operators, SELECT *, or
+double-quoted identifiers), every column reference is qualified with a
+table alias from its FROM clause, and its ORDER BY (if any) only names
+output aliases. Anything else runs on its own, exactly as before — and so
+does a merged group if the merged statement fails.
+"""
+
+import re
+from typing import Optional
+from sqlalchemy import text
+
+CLAUSE_KEYWORDS = ["FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT"]
+
+SQL_WORDS = {
+    "SELECT", "DISTINCT", "ALL", "AS", "AND", "OR", "NOT", "IN", "IS", "NULL", "LIKE",
+    "GLOB", "BETWEEN", "CASE", "WHEN", "THEN", "ELSE", "END", "ASC", "DESC", "NULLS",
+    "FIRST", "LAST", "CAST", "INTEGER", "INT", "REAL", "TEXT", "NUMERIC", "FLOAT",
+    "OVER", "PARTITION", "BY", "ROWS", "RANGE", "PRECEDING", "FOLLOWING", "CURRENT",
+    "ROW", "UNBOUNDED", "FILTER", "ESCAPE", "COLLATE", "NOCASE", "TRUE", "FALSE",
+    "OFFSET", "LIMIT",
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_QUALIFIED = re.compile(r"\b([A-Za-z_]\w*)\.([A-Za-z_]\w*)\b")
+_IDENTIFIER = re.compile(r"\b([A-Za-z_]\w*)\b(\s*\()?")
+_ORDER_TERM = re.compile(
+    r"([A-Za-z_]\w*)(?:\s+(?:ASC|DESC))?(?:\s+NULLS\s+(?:FIRST|LAST))?", re.IGNORECASE
+)
+_TABLE_REF = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?(?!(?:ON|USING|LEFT|RIGHT|INNER|OUTER|CROSS|JOIN|NATURAL)\b)([A-Za-z_]\w*))?",
+    re.IGNORECASE,
+)
+
+
+def _mask_strings(sql: str) -> str:
+    """Blanks out string literals (same length) so keywords inside them are ignored."""
+    return _STRING.sub(lambda m: "'" + " " * (len(m.group()) - 2) + "'", sql)
+
+
+def _clause_key(fragment: str) -> str:
+    """fragment with whitespace and case normalised, string literals kept as written."""
+    parts, last = [], 0
+    for match in _STRING.finditer(fragment):
+        parts.append(" ".join(fragment[last:match.start()].lower().split()))
+        parts.append(match.group())
+        last = match.end()
+    parts.append(" ".join(fragment[last:].lower().split()))
+    return " ".join(part for part in parts if part)
+
+
+def _top_level_positions(masked: str, keyword: str) -> list[int]:
+    """Positions where keyword appears outside parentheses."""
+    pattern = re.compile(r"\b" + keyword.replace(" ", r"\s+") + r"\b", re.IGNORECASE)
+    positions = []
+    for match in pattern.finditer(masked):
+        prefix = masked[:match.start()]
+        if prefix.count("(") == prefix.count(")"):
+            positions.append(match.start())
+    return positions
+
+
+def _split_top_level(masked: str, original: str, separator: str = ",") -> list[str]:
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(masked):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == separator and depth == 0:
+            parts.append(original[start:i].strip())
+            start = i + 1
+    parts.append(original[start:].strip())
+    return parts
+
+
+def parse_simple_select(sql: str) -> Optional[dict]:
+    """
+    Splits a flat SELECT into its clauses, or returns None if it doesn't qualify.
+    Returns {"select": str, "columns": int, "from": str, "tail": {clause: str},
+             "aliases": set[str]}.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    masked = _mask_strings(sql)
+    upper = masked.upper()
+
+    if not upper.startswith("SELECT") or '"' in masked or ";" in masked:
+        return None
+    if len(re.findall(r"\bSELECT\b", upper)) != 1:
+        return None
+    if re.search(r"\b(UNION|INTERSECT|EXCEPT|WITH|WINDOW)\b", upper):
+        return None
+
+    found = {}
+    for keyword in CLAUSE_KEYWORDS:
+        positions = _top_level_positions(masked, keyword)
+        if len(positions) > 1:
+            return None
+        if positions:
+            found[keyword] = positions[0]
+    if "FROM" not in found:
+        return None
+
+    ordered = sorted(found.items(), key=lambda item: item[1])
+    if [k for k, _ in ordered] != [k for k in CLAUSE_KEYWORDS if k in found]:
+        return None
+
+    clauses = {}
+    for i, (keyword, start) in enumerate(ordered):
+        end = ordered[i + 1][1] if i + 1 < len(ordered) else len(sql)
+        body_start = re.compile(keyword.replace(" ", r"\s+"), re.IGNORECASE).match(masked, start).end()
+        clauses[keyword] = sql[body_start:end].strip()
+
+    select_sql = sql[len("SELECT"):found["FROM"]].strip()
+    select_masked = masked[len("SELECT"):found["FROM"]].strip()
+    if re.match(r"DISTINCT\b", select_masked, re.IGNORECASE):
+        select_masked = select_masked[len("DISTINCT"):]
+    expressions = _split_top_level(select_masked, select_masked)
+    if any(e == "*" or e.endswith(".*") for e in expressions):
+        return None
+
+    aliases = set()
+    for table, alias in _TABLE_REF.findall("FROM " + clauses["FROM"]):
+        aliases.add(alias or table)
+
+    return {
+        "select": select_sql,
+        "columns": len(expressions),
+        "from": clauses["FROM"],
+        "tail": {k: v for k, v in clauses.items() if k != "FROM"},
+        "aliases": aliases,
+    }
+
+
+def _branch_columns(parsed: dict) -> Optional[set[tuple[str, str]]]:
+    """
+    Qualified (alias, column) pairs a query needs from the base, or None
+    if the query uses a column reference we can't attribute to an alias.
+    """
+    masked = _mask_strings(" ".join([parsed["select"], *parsed["tail"].values()]))
+
+    used = set()
+    for alias, column in _QUALIFIED.findall(masked):
+        if alias not in parsed["aliases"]:
+            return None
+        used.add((alias, column))
+
+    output_aliases = {
+        a.upper() for a in re.findall(r"\bAS\s+([A-Za-z_]\w*)", _mask_strings(parsed["select"]), re.IGNORECASE)
+    }
+    # Every bare identifier outside the FROM clause must be a keyword,
+    # a function name or an output alias — never an unqualified column.
+    rest = _QUALIFIED.sub(" ", masked)
+    for name, call in _IDENTIFIER.findall(rest):
+        if call or name.upper() in SQL_WORDS or name.upper() in output_aliases:
+            continue
+        return None
+
+    return used
+
+
+def _window_order(parsed: dict) -> Optional[str]:
+    """
+    The query's ORDER BY as it can be written over its output columns (""
+    without one), or None if a term isn't an output alias.
+    """
+    order_by = parsed["tail"].get("ORDER BY")
+    if order_by is None:
+        return ""
+    output_aliases = {
+        a.upper() for a in re.findall(r"\bAS\s+([A-Za-z_]\w*)", _mask_strings(parsed["select"]), re.IGNORECASE)
+    }
+    terms = _split_top_level(_mask_strings(order_by), order_by)
+    for term in terms:
+        match = _ORDER_TERM.fullmatch(term)
+        if match is None or match.group(1).upper() not in output_aliases:
+            return None
+    return ", ".join(terms)
+
+
+def _rewrite(fragment: str, aliases: set[str]) -> str:
+    """alias.column → alias__column, leaving string literals untouched."""
+    out, last = [], 0
+    masked = _mask_strings(fragment)
+    for match in _QUALIFIED.finditer(masked):
+        if match.group(1) in aliases:
+            out.append(fragment[last:match.start()])
+            out.append(f"{match.group(1)}__{match.group(2)}")
+            last = match.end()
+    out.append(fragment[last:])
+    return "".join(out)
+
+
+def plan_merges(queries: list[str]) -> list[list[int]]:
+    """
+    Groups indexes of queries that can run as one merged statement
+    (same FROM and WHERE clauses, all column references qualified, ORDER BY
+    on output aliases). Only groups of two or more are returned; every
+    other query runs on its own.
+    """
+    groups: dict[tuple[str, str], list[int]] = {}
+    for i, sql in enumerate(queries):
+        parsed = parse_simple_select(sql)
+        if parsed is None or _branch_columns(parsed) is None or _window_order(parsed) is None:
+            continue
+        key = (_clause_key(parsed["from"]), _clause_key(parsed["tail"].get("WHERE", "")))
+        groups.setdefault(key, []).append(i)
+    return [indexes for indexes in groups.values() if len(indexes) > 1]
+
+
+def build_merged_sql(queries: list[str]) -> tuple[str, list[int]]:
+    """
+    Builds the single WITH ... UNION ALL statement for a merge group.
+    Returns (sql, column_count_per_query).
+    """
+    parsed = [parse_simple_select(sql) for sql in queries]
+    base_from = parsed[0]["from"]
+    base_where = parsed[0]["tail"].get("WHERE")
+    aliases = parsed[0]["aliases"]
+
+    # The shared WHERE is applied in the base; branches keep the rest
+    tails = [{k: v for k, v in p["tail"].items() if k != "WHERE"} for p in parsed]
+    needed = set()
+    for p, tail in zip(parsed, tails):
+        needed |= _branch_columns({**p, "tail": tail})
+    # e.g. only COUNT(*): the base still needs a column to select
+    base_columns = ", ".join(f"{a}.{c} AS {a}__{c}" for a, c in sorted(needed)) or "1 AS __row"
+    base = f"SELECT {base_columns} FROM {base_from}"
+    if base_where:
+        base += f" WHERE {base_where}"
+
+    width = max(p["columns"] for p in parsed)
+    branches = []
+    for i, (p, tail) in enumerate(zip(parsed, tails)):
+        branch = f"SELECT {_rewrite(p['select'], aliases)} FROM __base"
+        for keyword, body in tail.items():
+            branch += f" {keyword} {_rewrite(body, aliases)}"
+        order = _window_order(p)
+        number = f"ROW_NUMBER() OVER (ORDER BY {order})" if order else "ROW_NUMBER() OVER ()"
+        padding = "".join(", NULL" for _ in range(width - p["columns"]))
+        branches.append(f"SELECT {i} AS __q, {number} AS __n, *{padding} FROM ({branch})")
+
+    sql = (
+        f"WITH __base AS MATERIALIZED ({base})\n"
+        + "\nUNION ALL\n".join(branches)
+    )
+    return sql, [p["columns"] for p in parsed]
+
+
+def execute_merged(conn, queries: list[str]) -> list[list[tuple]]:
+    """Runs a merge group once and splits the rows back per query (in order)."""
+    sql, widths = build_merged_sql(queries)
+    numbered: list[list[tuple[int, tuple]]] = [[] for _ in queries]
+    for row in conn.execute(text(sql)):
+        q = row[0]
+        numbered[q].append((row[1], tuple(row[2:2 + widths[q]])))
+    return [[row for _, row in sorted(rows, key=lambda item: item[0])] for rows in numbered]
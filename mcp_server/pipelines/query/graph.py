@@ -3,7 +3,14 @@ pipelines/query/graph.py — Wiring for the single-question query pipeline.
 
 Flow:
   get_schema → sql_generator → execute_query → explain_results
-                                    ↑ retry ↙
+  on failure:   execute_query → repair_sql → execute_query     (retry)
+  no SQL at all: execute_query → sql_generator                 (regenerate)
+
+repair_sql (repair.py) fixes the failed query deterministically when the
+error allows it, else with a small LLM prompt.
+
+A state that arrives with schema + SQL already filled in (speculative
+generation, see app/speculation.py) enters directly at execute_query.
 
 No logic here. Sequence and routing only.
 """
@@ -16,16 +23,25 @@ from mcp_server.pipelines.query.nodes import (
     execute_query,
     explain_results,
     route_after_execution,
+    route_entry,
 )
+from mcp_server.pipelines.query.repair import repair_sql
 
 builder = StateGraph(AgentState)
 
 builder.add_node("get_schema",      get_schema)
 builder.add_node("sql_generator",   sql_generator)
 builder.add_node("execute_query",   execute_query)
+builder.add_node("repair_sql",      repair_sql)
 builder.add_node("explain_results", explain_results)
 
-builder.set_entry_point("get_schema")
+builder.set_conditional_entry_point(
+    route_entry,
+    {
+        "fresh":    "get_schema",
+        "prepared": "execute_query",
+    }
+)
 builder.add_edge("get_schema",    "sql_generator")
 builder.add_edge("sql_generator", "execute_query")
 
@@ -33,11 +49,13 @@ builder.add_conditional_edges(
     "execute_query",
     route_after_execution,
     {
-        "retry":  "sql_generator",
-        "finish": "explain_results",
+        "retry":      "repair_sql",
+        "regenerate": "sql_generator",
+        "finish":     "explain_results",
     }
 )
 
+builder.add_edge("repair_sql",      "execute_query")
 builder.add_edge("explain_results", END)
 
 graph = builder.compile()
\ No newline at end of file
@@ -5,56 +5,76 @@ These nodes only make sense in the context of answering a single
 natural language question with a single SQL query.
 
 Shared nodes (get_schema, is_safe_query) live in shared/nodes.py.
+Failed queries are fixed by repair_sql (repair.py), not regenerated here.
 """
 
-from app.llm import llm
+from app.llm import get_llm, get_structured_llm
+from app.deadline import expired, llm_kwargs, interrupt_sql, DEADLINE_ERROR
 from sqlalchemy import text
-from app.db import engine
+from app.db import get_engine
 from langchain_core.messages import SystemMessage, HumanMessage
 from pydantic_models.agentState import AgentState, SQLOutput
-from mcp_server.shared.nodes import is_safe_query
+from mcp_server.shared.nodes import is_safe_query, schema_for
+from mcp_server.shared.prompts import render_prompt, SQL_GENERATOR_PROMPT
+from mcp_server.pipelines.query.repair import clean_sql, record_outcome
 
 MAX_ATTEMPTS = 3
 
+def sql_generator_messages(state: AgentState) -> list:
+    """
+    Messages for sql_generator. The system prompt depends only on the schema
+    (cached, byte-stable); the question and follow-up context go in the
+    human message.
+    """
+    follow_up_context = ""
+    if state.previous_sql:
+        follow_up_context = f"""
+The user's previous question in this conversation was answered with:
+{state.previous_sql}
+
+If the question is a follow-up (e.g. "and for 2024?"), adapt that query.
+"""
+    question = state.question
+    if follow_up_context:
+        question = f"{follow_up_context}\nQuestion: {state.question}"
+
+    return [
+        SystemMessage(content=render_prompt(SQL_GENERATOR_PROMPT, schema_for(state)[1])),
+        HumanMessage(content=question),
+    ]
+
 def sql_generator(state: AgentState) -> AgentState:
     """
     Calls the LLM with the schema + question → produces one SQL query.
-    On retries, includes the previous error so the LLM can self-correct.
+    For follow-ups, includes the conversation's previous SQL as a starting point.
     """
-    structured_llm = llm.with_structured_output(SQLOutput)
-
-    error_context = ""
-    if state.error and state.attempts > 0:
-        error_context = f"""
-The previous query failed with this error:
-{state.error}
+    if expired(state.deadline):
+        state.error = f"{DEADLINE_ERROR} before SQL was generated."
+        state.timed_out = True
+        return state
 
-Failed query:
-{state.sql_query}
+    structured_llm = get_structured_llm(SQLOutput, tier="large")
+    messages = sql_generator_messages(state)
 
-Fix the query based on the error above.
-"""
-    system_prompt = f"""You are an expert SQL assistant. Generate a correct SQL query for the given question.
-    Database Schema:
-    {state.db_schema}
-    Rules:
-    - Use only tables and columns from the schema above
-    - This is a SQLite database
-    - Date columns are TEXT in format 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM'
-    - For date filtering use strftime(): strftime('%Y', date_col) = '2023'
-    - Always alias aggregated columns: SUM(amount) AS total_revenue
-    - Use JOINs based on the foreign key relationships in the schema
-    - Return only the SQL query, no explanation
-    {error_context}"""
+    try:
+        response = structured_llm.invoke(messages, **llm_kwargs(state.deadline))
+        state.sql_query = clean_sql(response.sql_query)
+        state.error = None
+    except Exception as e:
+        state.error = str(e)
 
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=state.question),
-    ]
+    return state
 
+async def sql_generator_async(state: AgentState) -> AgentState:
+    """
+    Same as sql_generator, but awaits the LLM call so it can run alongside
+    other work — and be cancelled mid-flight (speculative generation).
+    """
     try:
-        response = structured_llm.invoke(messages)
-        state.sql_query = response.sql_query.strip()
+        response = await get_structured_llm(SQLOutput, tier="large").ainvoke(
+            sql_generator_messages(state), **llm_kwargs(state.deadline)
+        )
+        state.sql_query = clean_sql(response.sql_query)
         state.error = None
     except Exception as e:
         state.error = str(e)
@@ -64,31 +84,49 @@ Fix the query based on the error above.
 def execute_query(state: AgentState) -> AgentState:
     """
     Safely executes state.sql_query against the database.
-    Stores raw rows in state.result.
+    Stores raw rows in state.result (and state.columns / state.rows).
     Increments state.attempts on any failure.
+    The statement is interrupted if the request's deadline passes.
     """
+    if state.timed_out:
+        return state
+
     if not state.sql_query or not is_safe_query(state.sql_query):
         state.error = "Query is not safe to execute (must be a pure SELECT statement)."
         state.attempts += 1
+        record_outcome(state)
         return state
 
-    with engine.connect() as conn:
+    with get_engine(state.database_id).connect() as conn:
         try:
-            result = conn.execute(text(state.sql_query))
-            rows = result.fetchall()
+            with interrupt_sql(conn, state.deadline):
+                result = conn.execute(text(state.sql_query))
+                rows = result.fetchall()
             state.result = str(rows)
+            state.columns = list(result.keys())
+            state.rows = [tuple(row) for row in rows]
             state.error = None
         except Exception as e:
-            state.error = f"SQL execution error: {str(e)}"
+            if expired(state.deadline):
+                state.error = f"{DEADLINE_ERROR} while running SQL."
+                state.timed_out = True
+            else:
+                state.error = f"SQL execution error: {str(e)}"
             state.attempts += 1
 
+    record_outcome(state)
     return state
 
 def explain_results(state: AgentState) -> AgentState:
     """
     Calls the LLM with the raw SQL results → plain English explanation.
     Stored in state.natural_language_output.
+    Out of time → no explanation; the rows are still returned (partial result).
     """
+    if state.timed_out or expired(state.deadline):
+        state.timed_out = True
+        return state
+
     system_prompt = """You are a helpful data analyst. Explain the SQL results in plain English.
     - Directly answer what the data shows
     - Highlight key numbers, trends, or insights
@@ -102,15 +140,26 @@ def explain_results(state: AgentState) -> AgentState:
     ]
 
     try:
-        response = llm.invoke(messages)
+        response = get_llm("fast").invoke(messages, **llm_kwargs(state.deadline))
         state.natural_language_output = response.content.strip()
         state.error = None
     except Exception as e:
-        state.error = str(e)
+        if expired(state.deadline):
+            state.timed_out = True
+        else:
+            state.error = str(e)
 
     return state
 
 def route_after_execution(state: AgentState) -> str:
+    # No retries once the budget is gone
+    if state.timed_out or expired(state.deadline):
+        return "finish"
     if state.error and state.attempts < MAX_ATTEMPTS:
-        return "retry"
-    return "finish"
\ No newline at end of file
+        return "retry" if state.sql_query else "regenerate"
+    return "finish"
+
+def route_entry(state: AgentState) -> str:
+    if state.schema_ref and state.sql_query and not state.error:
+        return "prepared"
+    return "fresh"
@@ -0,0 +1,251 @@
+"""
+pipelines/query/repair.py — Fixing a query that failed to execute.
+
+When execute_query fails, the graph goes to repair_sql rather than back to
+sql_generator. repair_sql classifies the error, then:
+  1. applies a deterministic fix when the error class has one — no LLM call
+       unsafe            → strip code fences, "sql" labels, comments, trailing ;
+       limit             → T-SQL / ANSI row limits (TOP n, FETCH FIRST n ROWS)
+                           rewritten as SQLite's LIMIT n
+       ambiguous_column  → qualify the bare column with the first table in
+                           FROM / JOIN that has it
+  2. otherwise asks the LLM to fix the query with a minimal prompt: the
+     failing query, the error and the definitions of the tables it reads
+     (plus their foreign-key neighbours) — not the whole schema
+
+A fix that doesn't change the query (already applied, not applicable)
+falls through to the LLM. repair_stats() counts, per error class and
+method, the repairs tried and how many of them then ran (see /metrics).
+"""
+
+import re
+import threading
+from app.llm import get_structured_llm
+from app.deadline import expired, llm_kwargs, DEADLINE_ERROR
+from langchain_core.messages import SystemMessage, HumanMessage
+from pydantic_models.agentState import AgentState, SQLOutput
+from mcp_server.shared.answers import tables_read
+from mcp_server.shared.nodes import schema_for
+from mcp_server.shared.prompts import REPAIR_PROMPT
+
+ERROR_CLASSES = [
+    "unsafe", "limit", "ambiguous_column", "no_such_column", "no_such_table",
+    "no_such_function", "syntax", "multiple_statements", "other",
+]
+
+_SYNTAX_ERRORS = ("syntax error", "incomplete input", "unrecognized token")
+
+_FENCE = re.compile(r"^```[A-Za-z]*\s*|\s*```$")
+_LEADING_COMMENTS = re.compile(r"^(?:\s*--[^\n]*\n|\s*/\*.*?\*/)+", re.S)
+_SQL_LABEL = re.compile(r"^(?:sql|sqlite)\s*:?\s*\n", re.I)
+
+_TOP = re.compile(r"^(\s*SELECT\s+(?:DISTINCT\s+)?)TOP\s*\(?\s*(\d+)\s*\)?\s+", re.I)
+_FETCH = re.compile(
+    r"(?:\s+OFFSET\s+(\d+)\s+ROWS?)?\s+FETCH\s+(?:FIRST|NEXT)\s+(\d+)\s+ROWS?\s+ONLY\s*$", re.I
+)
+_HAS_LIMIT = re.compile(r"\bLIMIT\s+\d+", re.I)
+
+_NOT_AN_ALIAS = (
+    "ON|USING|WHERE|JOIN|INNER|LEFT|RIGHT|FULL|OUTER|CROSS|NATURAL|GROUP|ORDER|"
+    "LIMIT|HAVING|UNION|EXCEPT|INTERSECT|WINDOW"
+)
+_FROM_JOIN = re.compile(
+    r'\b(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?(?!(?:' + _NOT_AN_ALIAS + r')\b)(\w+))?', re.I
+)
+_AMBIGUOUS = re.compile(r"ambiguous column name:\s*\"?([\w.]+)", re.I)
+
+_stats = {name: {"deterministic": [0, 0], "llm": [0, 0]} for name in ERROR_CLASSES}
+_stats_lock = threading.Lock()
+
+
+def repair_stats() -> dict:
+    """{error class: {method: {"tried", "fixed"}}} since startup."""
+    with _stats_lock:
+        return {
+            name: {method: {"tried": tried, "fixed": fixed}
+                   for method, (tried, fixed) in methods.items()}
+            for name, methods in _stats.items()
+        }
+
+
+def _count(repair: str, index: int) -> None:
+    error_class, method = repair.split(":")
+    with _stats_lock:
+        _stats[error_class][method][index] += 1
+
+
+def record_outcome(state: AgentState) -> None:
+    """Called by execute_query: did the pending repair (if any) produce a query that ran?"""
+    if state.repair is None:
+        return
+    if state.error is None:
+        _count(state.repair, 1)
+    state.repair = None
+
+
+def classify_error(error: str, sql: str | None = None) -> str:
+    """Maps an execute_query error message to one of ERROR_CLASSES."""
+    lowered = error.lower()
+    if lowered.startswith("query is not safe"):
+        return "unsafe"
+    if "ambiguous column name" in lowered:
+        return "ambiguous_column"
+    if "no such column" in lowered:
+        return "no_such_column"
+    if "no such table" in lowered:
+        return "no_such_table"
+    if "no such function" in lowered:
+        return "no_such_function"
+    if "one statement at a time" in lowered:
+        return "multiple_statements"
+    if any(marker in lowered for marker in _SYNTAX_ERRORS):
+        if sql and (_TOP.search(sql) or _FETCH.search(clean_sql(sql))):
+            return "limit"
+        return "syntax"
+    return "other"
+
+
+def clean_sql(sql: str) -> str:
+    """Strips what LLMs wrap around a statement: code fences, labels, comments, trailing ;."""
+    sql = _FENCE.sub("", sql.strip())
+    sql = _SQL_LABEL.sub("", sql.strip())
+    sql = _LEADING_COMMENTS.sub("", sql)
+    return sql.strip().rstrip(";").strip()
+
+
+def fix_limit(sql: str) -> str:
+    """TOP n / [OFFSET m ROWS] FETCH FIRST n ROWS ONLY → LIMIT n [OFFSET m]."""
+    sql = clean_sql(sql)
+    if _HAS_LIMIT.search(sql):
+        return sql
+
+    top = _TOP.search(sql)
+    if top:
+        return _TOP.sub(r"\1", sql, count=1) + f" LIMIT {top.group(2)}"
+
+    fetch = _FETCH.search(sql)
+    if fetch:
+        offset, limit = fetch.groups()
+        return _FETCH.sub("", sql) + f" LIMIT {limit}" + (f" OFFSET {offset}" if offset else "")
+    return sql
+
+
+def _sources(sql: str) -> list[tuple[str, str]]:
+    """(table, name it's referenced by) for each FROM / JOIN, in order."""
+    return [(table, alias or table) for table, alias in _FROM_JOIN.findall(sql)]
+
+
+def fix_ambiguous_column(sql: str, error: str, schema: dict) -> str:
+    """Qualifies every bare use of the ambiguous column with the first source that has it."""
+    match = _AMBIGUOUS.search(error)
+    if not match:
+        return sql
+    column = match.group(1).split(".")[-1]
+
+    by_lower = {name.lower(): info for name, info in schema.items()}
+    owner = None
+    for table, reference in _sources(sql):
+        columns = by_lower.get(table.lower(), {}).get("columns", [])
+        if any(c["name"].lower() == column.lower() for c in columns):
+            owner = reference
+            break
+    if owner is None:
+        return sql
+
+    pattern = re.compile(r"'(?:[^']|'')*'|(?<![.\w\"])" + re.escape(column) + r"\b(?!\s*\()", re.I)
+
+    def qualify(m: re.Match) -> str:
+        if m.group(0).startswith("'"):
+            return m.group(0)
+        if re.search(r"\bAS\s*$", sql[:m.start()], re.I):
+            return m.group(0)      # an output alias, not a column reference
+        return f"{owner}.{m.group(0)}"
+
+    return pattern.sub(qualify, sql)
+
+
+def deterministic_fix(error_class: str, sql: str, error: str, schema: dict) -> str:
+    """The fixed query, or sql unchanged when the class has no (further) fix."""
+    if error_class in ("unsafe", "multiple_statements"):
+        return clean_sql(sql)
+    if error_class == "limit":
+        return fix_limit(sql)
+    if error_class == "ambiguous_column":
+        return fix_ambiguous_column(sql, error, schema)
+    return sql
+
+
+def _table_definition(name: str, info: dict) -> str:
+    references = {tuple(fk["column"]): fk["references"] for fk in info["foreign_keys"]}
+    columns = []
+    for col in info["columns"]:
+        ref = references.get((col["name"],))
+        if ref:
+            ref = re.sub(r"[\[\]']", "", ref)   # "users.['id']" → "users.id"
+        columns.append(f"{col['name']} {col['type']}" + (f" -> {ref}" if ref else ""))
+    return f"{name}({', '.join(columns)})"
+
+
+def relevant_tables(sql: str, schema: dict) -> list[str]:
+    """Tables the query reads plus the tables they reference by foreign key."""
+    tables = set(tables_read(sql, schema))
+    for table in list(tables):
+        for fk in schema[table]["foreign_keys"]:
+            referenced = fk["references"].split(".")[0]
+            if referenced in schema:
+                tables.add(referenced)
+    return sorted(tables)
+
+
+def repair_messages(state: AgentState, error_class: str, schema: dict) -> list:
+    """Only the failing query, the error and the tables involved — not the whole schema."""
+    tables = relevant_tables(state.sql_query or "", schema)
+    definitions = "\n".join(_table_definition(t, schema[t]) for t in tables)
+    others = ", ".join(sorted(t for t in schema if t not in tables))
+
+    content = (
+        f"Question: {state.question}\n\n"
+        f"Failing query:\n{state.sql_query}\n\n"
+        f"Error ({error_class}): {state.error}\n\n"
+        f"Tables involved:\n{definitions or '(none recognised)'}\n"
+    )
+    if others:
+        content += f"\nOther tables: {others}\n"
+    return [SystemMessage(content=REPAIR_PROMPT), HumanMessage(content=content)]
+
+
+def repair_sql(state: AgentState) -> AgentState:
+    """
+    Turns a failed state.sql_query into a new candidate for execute_query:
+    deterministically when possible, otherwise with one small LLM call.
+    """
+    if expired(state.deadline):
+        state.error = f"{DEADLINE_ERROR} before the query was repaired."
+        state.timed_out = True
+        return state
+
+    error_class = classify_error(state.error or "", state.sql_query)
+    try:
+        schema, _ = schema_for(state)
+    except Exception:
+        schema = {}
+
+    if state.sql_query:
+        fixed = deterministic_fix(error_class, state.sql_query, state.error or "", schema)
+        if fixed != state.sql_query:
+            state.sql_query = fixed
+            state.repair = f"{error_class}:deterministic"
+            _count(state.repair, 0)
+            return state
+
+    state.repair = f"{error_class}:llm"
+    _count(state.repair, 0)
+    try:
+        response = get_structured_llm(SQLOutput, tier="large").invoke(
+            repair_messages(state, error_class, schema), **llm_kwargs(state.deadline)
+        )
+        state.sql_query = clean_sql(response.sql_query)
+    except Exception as e:
+        # Keep the old query; execute_query fails again and counts the attempt
+        state.error = str(e)
+    return state
@@ -0,0 +1,89 @@
+"""
+pipelines/reshape/frame.py — A tiny columnar frame for the reshape pipeline.
+
+Holds a query result as {column_name: [values]} — the same shape stored on
+the ChatSession — and applies sort / filter / limit / aggregate one column at
+a time. Row operations compute an index list once, then gather every column
+with it, so no per-row dicts or tuples are built.
+
+Stdlib only on purpose: results held per conversation are small (capped
+rows) and the whole point is to answer in milliseconds without the DB.
+"""
+
+from typing import Any, Callable, Optional
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Frame:
+    def __init__(self, columns: dict[str, list]):
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, column_names: list[str], rows: list) -> "Frame":
+        """Transposes DB rows into columns. Duplicate names get a numeric suffix."""
+        names = []
+        for name in column_names:
+            unique, n = name, 2
+            while unique in names:
+                unique, n = f"{name}_{n}", n + 1
+            names.append(unique)
+        data = list(zip(*rows)) if rows else [()] * len(names)
+        return cls({name: list(values) for name, values in zip(names, data)})
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.columns)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), []))
+
+    def to_rows(self) -> list[tuple]:
+        return list(zip(*self.columns.values()))
+
+    def numeric_columns(self) -> list[str]:
+        return [
+            name for name, values in self.columns.items()
+            if any(_is_number(v) for v in values)
+            and all(v is None or _is_number(v) for v in values)
+        ]
+
+    def take(self, index: list[int]) -> "Frame":
+        return Frame({name: [values[i] for i in index] for name, values in self.columns.items()})
+
+    def sort(self, column: str, descending: bool = False) -> "Frame":
+        values = self.columns[column]
+        # None always sorts last, whichever the direction
+        present = [i for i, v in enumerate(values) if v is not None]
+        missing = [i for i, v in enumerate(values) if v is None]
+        present.sort(key=values.__getitem__, reverse=descending)
+        return self.take(present + missing)
+
+    def head(self, n: int) -> "Frame":
+        return Frame({name: values[:n] for name, values in self.columns.items()})
+
+    def tail(self, n: int) -> "Frame":
+        return Frame({name: values[-n:] if n else [] for name, values in self.columns.items()})
+
+    def filter(self, column: str, predicate: Callable[[Any], bool]) -> "Frame":
+        values = self.columns[column]
+        return self.take([i for i, v in enumerate(values) if v is not None and predicate(v)])
+
+    def aggregate(self, function: str, column: Optional[str] = None) -> Optional[float]:
+        """function is one of: count, sum, avg, min, max. count ignores column."""
+        if function == "count":
+            return len(self)
+        values = [v for v in self.columns[column] if _is_number(v)]
+        if not values:
+            return None
+        if function == "sum":
+            return sum(values)
+        if function == "avg":
+            return sum(values) / len(values)
+        if function == "min":
+            return min(values)
+        if function == "max":
+            return max(values)
+        raise ValueError(f"Unknown aggregate: {function}")
@@ -0,0 +1,277 @@
+"""
+pipelines/reshape/nodes.py — Answers follow-ups by reshaping the last result.
+
+"sort that by revenue", "just the top 3", "what's the average of those" only
+reshape rows we already fetched. These steps parse the request with a small
+phrase grammar, apply it to the conversation's cached Frame and render the
+answer — no LLM, no SQL, no DB access.
+
+Steps (plain functions, not a LangGraph graph — these turns must stay in
+the millisecond range):
+  parse_operations → apply_operations → render_result
+
+parse_operations doubles as the router: it returns None unless the WHOLE
+message is understood, so anything ambiguous falls back to the normal
+classify → tool path.
+"""
+
+import re
+from typing import Optional
+from mcp_server.pipelines.reshape.frame import Frame
+
+MAX_RENDERED_ROWS = 20
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+
+REFERENCE_WORDS = {"that", "those", "them", "these", "it", "this", "results", "result", "list", "rows"}
+
+FILLER_WORDS = REFERENCE_WORDS | {
+    "and", "then", "also", "please", "just", "only", "now", "can", "could", "you",
+    "what", "what's", "whats", "is", "are", "was", "the", "of", "show", "me", "give",
+    "a", "an", "ones", "there", "tell", "us", "by", "to", "i", "want", "see", "let's",
+}
+
+AGGREGATE_WORDS = {
+    "average": "avg", "avg": "avg", "mean": "avg",
+    "sum": "sum", "total": "sum",
+    "minimum": "min", "min": "min", "lowest": "min", "smallest": "min",
+    "maximum": "max", "max": "max", "highest": "max", "largest": "max",
+    "count": "count", "how many": "count",
+}
+
+COMPARATORS = {
+    "above": ">", "over": ">", "more than": ">", "greater than": ">", ">": ">",
+    "at least": ">=", ">=": ">=",
+    "below": "<", "under": "<", "less than": "<", "<": "<",
+    "at most": "<=", "<=": "<=",
+    "equal to": "=", "equals": "=", "=": "=",
+}
+
+_END = r"(?=$|[,.?!;]|\s+(?:and|then)\b)"
+_NUMBER = r"\d+|" + "|".join(NUMBER_WORDS)
+
+SORT_PATTERN = re.compile(
+    r"\b(?:sort|order|rank)(?:ed)?\s+(?:(?:that|those|them|it|these|this|the results?|the list)\s+)?"
+    r"by\s+(?:the\s+)?(?P<col>[\w ]+?)"
+    r"(?:\s+(?P<dir>asc(?:ending)?|desc(?:ending)?|high(?:est)? to low(?:est)?|low(?:est)? to high(?:est)?))?"
+    + _END
+)
+LIMIT_PATTERN = re.compile(
+    rf"\b(?P<which>top|first|bottom|last)\s+(?P<n>{_NUMBER})\b"
+    r"(?:\s+by\s+(?:the\s+)?(?P<col>[\w ]+?)" + _END + ")?"
+)
+AGGREGATE_PATTERN = re.compile(
+    r"\b(?P<fn>" + "|".join(sorted(AGGREGATE_WORDS, key=len, reverse=True)) + r")\b"
+    r"(?P<rest>[\w ]*?)" + _END
+)
+NUMERIC_FILTER_PATTERN = re.compile(
+    r"\b(?:with|where|having)\s+(?:the\s+)?(?P<col>[\w ]+?)\s+(?:is\s+|of\s+)?"
+    r"(?P<cmp>" + "|".join(re.escape(c) for c in sorted(COMPARATORS, key=len, reverse=True)) + r")\s+"
+    r"\$?(?P<val>-?[\d,]+(?:\.\d+)?)"
+)
+TEXT_FILTER_PATTERN = re.compile(
+    r"\b(?P<mode>only|exclude|excluding|without)\s+(?:the\s+)?(?P<val>[\w][\w \-&']*?)" + _END
+)
+
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"[\w'$]+", text.lower())
+
+
+def _match_column(phrase: str, names: list[str]) -> Optional[str]:
+    """Finds the column a phrase refers to ('revenue' → 'total_revenue')."""
+    words = [w.rstrip("s") for w in _words(phrase) if w not in FILLER_WORDS]
+    if not words:
+        return None
+    best, best_score = None, 0
+    for name in names:
+        tokens = {t.rstrip("s") for t in re.split(r"[_\s]+", name.lower()) if t}
+        if "".join(words) == name.lower().replace("_", ""):
+            return name
+        score = sum(1 for w in words if w in tokens)
+        if score == len(words) and score > best_score:
+            best, best_score = name, score
+    return best
+
+
+def _to_int(token: str) -> int:
+    return NUMBER_WORDS.get(token, None) or int(token)
+
+
+def parse_operations(question: str, frame: Frame) -> Optional[list[dict]]:
+    """
+    Turns a follow-up into a list of operations, or None if the message is
+    not purely a reshape of the previous result.
+
+    Operations:
+      {"op": "filter", "column": c, "cmp": ">", "value": 100}
+      {"op": "filter_text", "keep": bool, "value": "electronics"}
+      {"op": "sort", "column": c, "descending": bool}
+      {"op": "limit", "n": 3, "from_end": bool}
+      {"op": "aggregate", "function": "avg", "column": c | None}
+    """
+    text = question.lower().strip()
+    names = frame.names
+    numeric = frame.numeric_columns()
+    filters, sorts, limits, aggregates = [], [], [], []
+
+    def consume(match: re.Match) -> None:
+        nonlocal text
+        start, end = match.span()
+        text = text[:start] + " " * (end - start) + text[end:]
+
+    for match in list(NUMERIC_FILTER_PATTERN.finditer(text)):
+        column = _match_column(match["col"], names)
+        if column is None:
+            return None
+        value = float(match["val"].replace(",", ""))
+        filters.append({"op": "filter", "column": column, "cmp": COMPARATORS[match["cmp"]], "value": value})
+        consume(match)
+
+    for match in list(SORT_PATTERN.finditer(text)):
+        column = _match_column(match["col"], names)
+        if column is None:
+            return None
+        direction = match["dir"] or ""
+        if direction:
+            descending = direction.startswith(("desc", "high"))
+        else:
+            descending = column in numeric   # "sort by revenue" → biggest first
+        sorts.append({"op": "sort", "column": column, "descending": descending})
+        consume(match)
+
+    for match in list(LIMIT_PATTERN.finditer(text)):
+        from_end = match["which"] in ("bottom", "last")
+        if match["col"]:
+            column = _match_column(match["col"], names)
+            if column is None:
+                return None
+            # "bottom 3 by revenue" = the 3 smallest: ascending, missing values still last
+            sorts.append({"op": "sort", "column": column, "descending": not from_end})
+            from_end = False
+        limits.append({"op": "limit", "n": _to_int(match["n"]), "from_end": from_end})
+        consume(match)
+
+    for match in list(AGGREGATE_PATTERN.finditer(text)):
+        function = AGGREGATE_WORDS[match["fn"]]
+        rest = [w for w in _words(match["rest"]) if w not in FILLER_WORDS and w not in ("for", "in", "across")]
+        column = None
+        if function != "count":
+            if rest:
+                column = _match_column(" ".join(rest), names)
+            elif len(numeric) == 1:
+                column = numeric[0]   # "the average of those" is unambiguous only then
+            if column is None or column not in numeric:
+                return None
+        elif rest:
+            return None   # "how many orders" may mean a sum — let the LLM decide
+        aggregates.append({"op": "aggregate", "function": function, "column": column})
+        consume(match)
+
+    for match in list(TEXT_FILTER_PATTERN.finditer(text)):
+        value = match["val"].strip()
+        if value in FILLER_WORDS or not _has_text_value(frame, value):
+            continue
+        filters.append({"op": "filter_text", "keep": match["mode"] == "only", "value": value})
+        consume(match)
+
+    operations = filters + sorts + limits + aggregates
+    if not operations or len(aggregates) > 1:
+        return None
+
+    # Everything left must be filler or column names — otherwise the
+    # question asks for something new and needs the full pipeline.
+    column_tokens = {t.rstrip("s") for name in names for t in re.split(r"[_\s]+", name.lower())}
+    for word in _words(text):
+        if word not in FILLER_WORDS and word.rstrip("s") not in column_tokens:
+            return None
+
+    return operations
+
+
+def _has_text_value(frame: Frame, value: str) -> bool:
+    return any(
+        isinstance(v, str) and v.lower() == value
+        for values in frame.columns.values() for v in values
+    )
+
+
+def apply_operations(frame: Frame, operations: list[dict]) -> tuple[Frame, Optional[dict]]:
+    """
+    Applies operations in order: filters → sorts → limits → aggregate.
+    Returns the reshaped frame and, for aggregate questions, the value.
+    """
+    aggregate = None
+
+    for op in operations:
+        if op["op"] == "filter":
+            frame = frame.filter(op["column"], _comparison(op["cmp"], op["value"]))
+        elif op["op"] == "filter_text":
+            frame = _filter_text(frame, op["value"], op["keep"])
+        elif op["op"] == "sort":
+            frame = frame.sort(op["column"], op["descending"])
+        elif op["op"] == "limit":
+            frame = frame.tail(op["n"]) if op["from_end"] else frame.head(op["n"])
+        elif op["op"] == "aggregate":
+            aggregate = {
+                "function": op["function"],
+                "column": op["column"],
+                "value": frame.aggregate(op["function"], op["column"]),
+                "rows": len(frame),
+            }
+
+    return frame, aggregate
+
+
+def _comparison(cmp: str, value: float):
+    return {
+        ">": lambda v: v > value,
+        ">=": lambda v: v >= value,
+        "<": lambda v: v < value,
+        "<=": lambda v: v <= value,
+        "=": lambda v: v == value,
+    }[cmp]
+
+
+def _filter_text(frame: Frame, value: str, keep: bool) -> Frame:
+    hits = set()
+    for values in frame.columns.values():
+        hits.update(i for i, v in enumerate(values) if isinstance(v, str) and v.lower() == value)
+    return frame.take([i for i in range(len(frame)) if (i in hits) == keep])
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    return "" if value is None else str(value)
+
+
+def render_result(frame: Frame, aggregate: Optional[dict]) -> str:
+    """Plain-text answer: one sentence for aggregates, a markdown table otherwise."""
+    if aggregate is not None:
+        label = {"avg": "average", "sum": "total", "min": "minimum", "max": "maximum"}
+        if aggregate["function"] == "count":
+            return f"There are {aggregate['rows']:,} rows in that result."
+        column = aggregate["column"].replace("_", " ")
+        return (
+            f"The {label[aggregate['function']]} {column} across those "
+            f"{aggregate['rows']:,} rows is {_format_value(aggregate['value'])}."
+        )
+
+    if len(frame) == 0:
+        return "No rows match that."
+
+    lines = [
+        "| " + " | ".join(frame.names) + " |",
+        "|" + "---|" * len(frame.names),
+    ]
+    for row in frame.head(MAX_RENDERED_ROWS).to_rows():
+        lines.append("| " + " | ".join(_format_value(v) for v in row) + " |")
+    if len(frame) > MAX_RENDERED_ROWS:
+        lines.append(f"\n(showing {MAX_RENDERED_ROWS} of {len(frame):,} rows)")
+    return "\n".join(lines)
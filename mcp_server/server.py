@@ -1,21 +1,36 @@
 """
 server.py — MCP Server. Exposes tools to the LLM.
 
-Three tools:
+Four tools:
   query_database  — single question, single SQL answer
   deep_analysis   — complex question, multi-query, optional chart
   describe_data   — what data is available (replaces get_schema tool)
+  batch_query     — many questions at once, shared classification and execution
+
+Tools are async: the blocking pipelines run on a shared, bounded worker
+pool with a per-client concurrency limit (tools/pool.py). Each tool returns
+readable text plus structured content — rows, SQL, chart data — so clients
+never have to parse values back out of markdown.
 
 Tool DESCRIPTIONS are critical — the LLM reads them to decide which
 tool to call. Write them like instructions to a smart person.
 """
 
-from fastmcp import FastMCP
+import os
+import json
+from fastmcp import FastMCP, Context
+from fastmcp.exceptions import ToolError
+from fastmcp.tools import ToolResult
 from mcp_server.tools.database_tools import (
     run_query_database,
     run_deep_analysis,
     run_describe_data,
+    run_batch,
 )
+from mcp_server.tools.pool import tool_pool
+
+# Rows returned in structured content; the full result is behind result_id (/export)
+MCP_MAX_ROWS = int(os.getenv("MCP_MAX_ROWS", "1000"))
 
 mcp = FastMCP(
     name="SQL Assistant",
@@ -23,22 +38,105 @@ mcp = FastMCP(
 - For simple data questions → use query_database
 - For complex analytical questions needing multiple angles → use deep_analysis
 - For questions about what data exists → use describe_data
+- For many independent questions at once (e.g. a report) → use batch_query
 - For greetings and general conversation → reply directly, no tools needed"""
 )
 
+
+def client_key(ctx: Context) -> str:
+    """
+    Who the per-client concurrency limit applies to, most specific first:
+      - the client id the caller sent
+      - its MCP session (the mcp-session-id header of a stateful HTTP session)
+      - its address (stateless HTTP: every call would otherwise be a new client)
+    A stdio server has exactly one client, so there all calls share one key.
+    A call outside any request is refused rather than pooled with others.
+    """
+    request_context = ctx.request_context
+    if request_context is None:
+        raise ToolError("No client session: tools must be called within an MCP request")
+    if ctx.client_id:
+        return f"client:{ctx.client_id}"
+    request = request_context.request
+    if request is not None:
+        session_id = request.headers.get("mcp-session-id")
+        if session_id:
+            return f"session:{session_id}"
+        if request.client is not None:
+            return f"peer:{request.client.host}"
+    return "stdio"
+
+
+def jsonable(value):
+    """Rows can hold dates/decimals/bytes — make them plain JSON values."""
+    return json.loads(json.dumps(value, default=str))
+
+
+def query_payload(result: dict) -> dict:
+    rows = result.get("rows") or []
+    return {
+        "success": result["success"],
+        "error": result.get("error"),
+        "sql_query": result.get("sql_query"),
+        "explanation": result.get("explanation"),
+        "columns": result.get("columns"),
+        "rows": jsonable(rows[:MCP_MAX_ROWS]),
+        "row_count": len(rows),
+        "truncated": len(rows) > MCP_MAX_ROWS,
+        "result_id": result.get("result_id"),
+        "attempts": result.get("attempts", 0),
+        "partial": bool(result.get("timed_out")),
+    }
+
+
+def schema_lines(schema: dict) -> list[str]:
+    """The readable table-by-table description describe_data returns."""
+    lines = []
+    for table_name, info in schema.items():
+        col_names = [col["name"] for col in info["columns"]]
+        fk_refs = [fk["references"] for fk in info["foreign_keys"]]
+
+        lines.append(f"**{table_name.replace('_', ' ').title()}**")
+        lines.append(f"  Fields: {', '.join(col_names)}")
+
+        if fk_refs:
+            lines.append(f"  Linked to: {', '.join(fk_refs)}")
+
+        lines.append("")
+    return lines
+
+
+def analysis_payload(result: dict) -> dict:
+    return {
+        "success": result["success"],
+        "error": result.get("error"),
+        "insights": result.get("insights"),
+        "sub_questions": result.get("sub_questions") or [],
+        "queries": result.get("queries") or [],
+        "chart_data": result.get("chart_data"),
+        "analysis_id": result.get("analysis_id"),
+        "partial": bool(result.get("timed_out")),
+    }
+
+
 @mcp.tool()
-def query_database(question: str) -> str:
+async def query_database(question: str, ctx: Context, database_id: str | None = None) -> ToolResult:
     """
     Answer a single data question using the database.
     Use for straightforward questions about numbers, totals, counts,
     or simple comparisons — anything answerable with one SQL query.
     Examples: total sales, top customers, orders last month.
     Do NOT use for complex multi-angle analysis — use deep_analysis instead.
+    Leave database_id unset unless told which database to use.
     """
-    result = run_query_database(question)
+    result = await tool_pool.run(
+        client_key(ctx), lambda: run_query_database(question, database_id=database_id)
+    )
+    payload = query_payload(result)
 
     if not result["success"]:
-        return f"I couldn't answer that. Error: {result['error']}"
+        return ToolResult(content=f"I couldn't answer that. Error: {result['error']}",
+                          structured_content=payload)
 
     lines = []
     if result["explanation"]:
@@ -48,10 +146,11 @@ def query_database(question: str) -> str:
     if result["attempts"] > 1:
         lines.append(f"*(took {result['attempts']} attempts)*")
 
-    return "\n".join(lines)
+    return ToolResult(content="\n".join(lines), structured_content=payload)
 
 @mcp.tool()
-def deep_analysis(question: str) -> str:
+async def deep_analysis(question: str, ctx: Context, database_id: str | None = None,
+                        analysis_id: str | None = None) -> ToolResult:
     """
     Answer a complex analytical question that requires multiple queries
     and synthesized insights. Use when the question involves:
@@ -60,11 +159,20 @@ def deep_analysis(question: str) -> str:
     - Trend analysis with underlying breakdowns
     - Any question where one SQL query clearly won't be enough
     Returns insights in plain English, plus a chart if the data supports it.
+    Leave database_id unset unless told which database to use.
+    To retry a failed or partial analysis, or to ask a follow-up about its
+    findings without re-running its queries, pass the analysis_id it returned.
     """
-    result = run_deep_analysis(question)
+    result = await tool_pool.run(
+        client_key(ctx),
+        lambda: run_deep_analysis(question, database_id=database_id,
+                                  analysis_id=analysis_id, refine=analysis_id is not None),
+    )
+    payload = analysis_payload(result)
 
     if not result["success"]:
-        return f"Analysis failed. Error: {result['error']}"
+        return ToolResult(content=f"Analysis failed. Error: {result['error']}",
+                          structured_content=payload)
 
     lines = []
 
@@ -78,15 +186,14 @@ def deep_analysis(question: str) -> str:
             if sql and not sql.startswith("ERROR"):
                 lines.append(f"```sql\n{sql}\n```")
 
-    # chart_data is passed back for the frontend — included as JSON marker
+    # chart_data travels in structured_content — no JSON to re-parse from the text
     if result["chart_data"]:
-        import json
-        lines.append(f"\n**CHART_DATA:**\n```json\n{json.dumps(result['chart_data'])}\n```")
+        lines.append("\n*(chart data attached)*")
 
-    return "\n".join(lines)
+    return ToolResult(content="\n".join(lines), structured_content=payload)
 
 @mcp.tool()
-def describe_data() -> str:
+async def describe_data(ctx: Context, database_id: str | None = None) -> ToolResult:
     """
     Describe what data is available in the database and what kinds
     of questions can be answered. Use when the user asks:
@@ -95,37 +202,81 @@ def describe_data() -> str:
     - "what tables are there?"
     - "what information is available?"
     Returns a friendly, human-readable description (not raw schema).
+    Leave database_id unset unless told which database to use.
     """
-    result = run_describe_data()
+    result = await tool_pool.run(client_key(ctx), run_describe_data, database_id)
 
     if not result["success"]:
-        return f"Could not read database structure. Error: {result['error']}"
-
-    schema = result["schema"]
+        return ToolResult(content=f"Could not read database structure. Error: {result['error']}",
+                          structured_content=result)
 
     lines = [
-        "Here's what data I have access to:\n"
+        "Here's what data I have access to:\n",
+        *schema_lines(result["schema"]),
     ]
+    lines.append("You can ask me anything about this data — totals, trends, breakdowns, comparisons, and more.")
 
-    for table_name, info in schema.items():
-        col_names = [col["name"] for col in info["columns"]]
-        fk_refs = [fk["references"] for fk in info["foreign_keys"]]
+    return ToolResult(content="\n".join(lines), structured_content=result)
 
-        lines.append(f"**{table_name.replace('_', ' ').title()}**")
-        lines.append(f"  Fields: {', '.join(col_names)}")
 
-        if fk_refs:
-            lines.append(f"  Linked to: {', '.join(fk_refs)}")
+@mcp.tool()
+async def batch_query(questions: list[str], ctx: Context,
+                      database_id: str | None = None) -> ToolResult:
+    """
+    Answer many independent data questions in one call — e.g. every metric
+    for a report. Faster than calling query_database repeatedly: questions
+    are routed together, share the schema, and identical SQL runs once.
+    Each question is answered on its own; use deep_analysis instead when
+    the questions must be connected into one insight.
+    Leave database_id unset unless told which database to use.
+    """
+    try:
+        results = await tool_pool.run(
+            client_key(ctx), lambda: list(run_batch(questions, database_id=database_id))
+        )
+    except ValueError as e:
+        return ToolResult(content=f"Batch failed. Error: {e}",
+                          structured_content={"success": False, "error": str(e), "results": []})
+    results.sort(key=lambda r: r["index"])
 
-        lines.append("")
+    lines = []
+    items = []
+    for result in results:
+        lines.append(f"### {result['index'] + 1}. {result['question']}")
 
-    lines.append("You can ask me anything about this data — totals, trends, breakdowns, comparisons, and more.")
+        if not result.get("success"):
+            lines.append(f"Could not answer. Error: {result.get('error')}")
+        elif result["tool"] == "query_database":
+            lines.append(result["explanation"] or "")
+            if result["sql_query"]:
+                lines.append(f"```sql\n{result['sql_query']}\n```")
+        elif result["tool"] == "deep_analysis":
+            lines.append(result["insights"] or "")
+        elif result["tool"] == "describe_data":
+            lines.extend(schema_lines(result["schema"]))
 
-    return "\n".join(lines)
+        lines.append("")
 
+        if result["tool"] == "query_database":
+            item = query_payload(result)
+        elif result["tool"] == "deep_analysis":
+            item = analysis_payload(result)
+        elif result["tool"] == "describe_data" and result.get("success"):
+            item = {"success": True, "error": None, "schema": result["schema"]}
+        else:
+            item = {"success": bool(result.get("success")), "error": result.get("error")}
+        items.append({"index": result["index"], "question": result["question"],
+                      "tool": result["tool"], **item})
+
+    return ToolResult(content="\n".join(lines),
+                      structured_content={"success": True, "error": None, "results": items})
 
 # ---------------------------------------------------------------------------
 # Run
 # ---------------------------------------------------------------------------
 if __name__ == "__main__":
+    from app.startup import warm_up, WARM_START
+
+    if WARM_START:
+        warm_up()
     mcp.run(transport="sse", host="0.0.0.0", port=8001)
\ No newline at end of file
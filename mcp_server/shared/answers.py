@@ -0,0 +1,315 @@
+"""
+shared/answers.py — Persistent question → SQL → result store.
+
+Every successful standalone query_database answer (no follow-up context) is
+saved to a local SQLite side database (ANSWER_STORE_PATH) together with:
+  - the tables its SQL reads (parsed from the statement)
+  - a change marker per table: (MAX(rowid), COUNT(*)) at answer time
+
+When the same question comes back, the markers are re-read — one cheap
+statement for all tables involved:
+  - nothing changed       → the stored answer is returned as-is (no LLM, no query)
+  - a table changed       → the stored SQL is re-executed and the rows
+                            re-explained; SQL generation is skipped
+  - the stored SQL fails  → the entry is dropped and the full pipeline runs
+
+Appends and deletes move the markers; in-place UPDATEs don't, so entries
+are also refreshed once older than ANSWER_STORE_MAX_AGE_SECONDS. Views and
+WITHOUT ROWID tables have no rowid to mark, so answers reading them aren't
+stored.
+
+With ANSWER_STORE_BACKGROUND_REFRESH=1 a stale entry is served immediately
+and refreshed on a background thread (stale-while-revalidate).
+scripts/refresh_answers.py refreshes the most-asked stale entries ahead
+of time, e.g. from cron, so dashboard questions are always warm.
+
+Entries are per database (app/db.py): the same question asked of two
+databases is two entries.
+
+Unset ANSWER_STORE_PATH → no store, every question runs the pipeline.
+"""
+
+import os
+import re
+import logging
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+from sqlalchemy import text
+from app.db import get_engine, resolve_database_id
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ANSWER_STORE_PATH = os.getenv("ANSWER_STORE_PATH")   # unset → disabled
+ANSWER_STORE_MAX_AGE_SECONDS = int(os.getenv("ANSWER_STORE_MAX_AGE_SECONDS", "86400"))
+ANSWER_STORE_MAX_ROWS = int(os.getenv("ANSWER_STORE_MAX_ROWS", "10000"))  # larger results aren't stored
+ANSWER_STORE_BACKGROUND_REFRESH = os.getenv("ANSWER_STORE_BACKGROUND_REFRESH", "0") == "1"
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_IDENTIFIER = re.compile(r'"([^"]+)"|\b([A-Za-z_]\w*)\b')
+_WITHOUT_ROWID = re.compile(r"\bWITHOUT\s+ROWID\b", re.IGNORECASE)
+
+
+def question_key(question: str) -> str:
+    """Case- and whitespace-insensitive key for a question."""
+    return " ".join(question.lower().split()).rstrip("?. ")
+
+
+def tables_read(sql: str, known_tables) -> list[str]:
+    """
+    Tables referenced by sql, out of known_tables. Over-approximates (any
+    identifier that names a table counts) — a false positive only costs an
+    unneeded refresh, a miss would serve stale data.
+    """
+    by_lower = {t.lower(): t for t in known_tables}
+    found = set()
+    for quoted, bare in _IDENTIFIER.findall(_STRING.sub("''", sql)):
+        table = by_lower.get((quoted or bare).lower())
+        if table:
+            found.add(table)
+    return sorted(found)
+
+
+def unmarkable_read(conn, sql: str) -> list[str]:
+    """The views and WITHOUT ROWID tables sql reads — relations read_markers can't mark."""
+    relations = conn.execute(
+        text("SELECT name, type, sql FROM sqlite_master WHERE type IN ('table', 'view')")
+    ).fetchall()
+    unmarkable = [name for name, kind, ddl in relations
+                  if kind == "view" or _WITHOUT_ROWID.search(ddl or "")]
+    return tables_read(sql, unmarkable)
+
+
+def read_markers(conn, tables: list[str]) -> dict[str, list]:
+    """{table: [max_rowid, row_count]} for every table, in one statement."""
+    if not tables:
+        return {}
+    selects = ", ".join(
+        f'(SELECT MAX(rowid) FROM "{t}"), (SELECT COUNT(*) FROM "{t}")' for t in tables
+    )
+    row = conn.execute(text(f"SELECT {selects}")).fetchone()
+    return {t: [row[2 * i], row[2 * i + 1]] for i, t in enumerate(tables)}
+
+
+class AnswerStore:
+    """Thread-safe SQLite-backed answer store. One connection per operation."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.stats = {"fresh_hits": 0, "refreshed": 0, "background_refreshes": 0,
+                      "misses": 0, "dropped": 0}
+        self._lock = threading.Lock()
+        self._refreshing: set[tuple[str, str]] = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="answer-refresh")
+
+        with self._connect() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(answers)")]
+            if columns and "database_id" not in columns:
+                # Store from before per-database entries — it's a cache, start over
+                conn.execute("DROP TABLE answers")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " database_id  TEXT NOT NULL,"
+                " question_key TEXT NOT NULL,"
+                " question     TEXT NOT NULL,"
+                " sql_query    TEXT NOT NULL,"
+                " tables       TEXT NOT NULL,"
+                " markers      TEXT NOT NULL,"
+                " explanation  TEXT,"
+                " result       TEXT,"
+                " columns      TEXT,"
+                " rows         TEXT,"
+                " hits         INTEGER NOT NULL DEFAULT 0,"
+                " refreshed_at REAL NOT NULL,"
+                " PRIMARY KEY (database_id, question_key))"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.db_path)) as conn, conn:
+            yield conn
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, question: str, database_id: Optional[str] = None,
+            count_hit: bool = True) -> Optional[dict]:
+        """The stored entry for question (bumping its hit count), or None."""
+        key = (resolve_database_id(database_id), question_key(question))
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                "SELECT * FROM answers WHERE database_id = ? AND question_key = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            if count_hit:
+                conn.execute(
+                    "UPDATE answers SET hits = hits + 1 WHERE database_id = ? AND question_key = ?", key
+                )
+
+        entry = dict(row)
+        for field in ("tables", "markers", "columns", "rows"):
+            entry[field] = json.loads(entry[field]) if entry[field] is not None else None
+        return entry
+
+    def has(self, question: str, database_id: Optional[str] = None) -> bool:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM answers WHERE database_id = ? AND question_key = ?",
+                (resolve_database_id(database_id), question_key(question)),
+            ).fetchone() is not None
+
+    def save(self, question: str, sql_query: str, explanation: Optional[str],
+             result: Optional[str], columns: Optional[list], rows: Optional[list],
+             database_id: Optional[str] = None) -> None:
+        """
+        Stores a verified answer with the current markers of the tables it
+        reads — unless it reads a view or WITHOUT ROWID table, whose changes
+        no marker would show.
+        """
+        if rows is not None and len(rows) > ANSWER_STORE_MAX_ROWS:
+            return
+        from mcp_server.shared.nodes import load_schema
+
+        database_id = resolve_database_id(database_id)
+        schema, _ = load_schema(database_id)
+        tables = tables_read(sql_query, schema)
+        with get_engine(database_id).connect() as conn:
+            if unmarkable_read(conn, sql_query):
+                return
+            markers = read_markers(conn, tables)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO answers (database_id, question_key, question, sql_query, tables,"
+                " markers, explanation, result, columns, rows, refreshed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(database_id, question_key) DO UPDATE SET"
+                "  sql_query = excluded.sql_query, tables = excluded.tables,"
+                "  markers = excluded.markers, explanation = excluded.explanation,"
+                "  result = excluded.result, columns = excluded.columns,"
+                "  rows = excluded.rows, refreshed_at = excluded.refreshed_at",
+                (database_id, question_key(question), question, sql_query, json.dumps(tables),
+                 json.dumps(markers, default=str), explanation, result,
+                 json.dumps(columns), json.dumps(rows, default=str), time.time()),
+            )
+
+    def delete(self, question: str, database_id: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM answers WHERE database_id = ? AND question_key = ?",
+                (resolve_database_id(database_id), question_key(question)),
+            )
+
+    def is_stale(self, entry: dict) -> bool:
+        """True if any table the entry reads changed, or the entry is too old."""
+        if time.time() - entry["refreshed_at"] > ANSWER_STORE_MAX_AGE_SECONDS:
+            return True
+        with get_engine(entry["database_id"]).connect() as conn:
+            current = read_markers(conn, entry["tables"])
+        return json.loads(json.dumps(current, default=str)) != entry["markers"]
+
+    def refresh(self, entry: dict) -> Optional[dict]:
+        """
+        Re-executes the stored SQL and re-explains the rows — no SQL
+        generation. Returns the updated entry, or None (and drops the entry)
+        if the stored SQL no longer runs.
+        """
+        from pydantic_models.agentState import AgentState
+        from mcp_server.pipelines.query.nodes import execute_query, explain_results
+
+        state = execute_query(AgentState(
+            question=entry["question"],
+            database_id=entry["database_id"],
+            sql_query=entry["sql_query"],
+        ))
+        if state.error:
+            self.delete(entry["question"], entry["database_id"])
+            self._count("dropped")
+            return None
+
+        state = explain_results(state)
+        if state.error:
+            return None
+
+        rows = [list(row) for row in state.rows]
+        self.save(entry["question"], state.sql_query, state.natural_language_output,
+                  state.result, state.columns, rows, entry["database_id"])
+        return {**entry, "explanation": state.natural_language_output, "result": state.result,
+                "columns": state.columns, "rows": rows, "refreshed_at": time.time()}
+
+    def lookup(self, question: str, database_id: Optional[str] = None) -> Optional[dict]:
+        """
+        A current answer for question, or None (→ run the full pipeline).
+        Stale entries are refreshed inline, or — with background refresh —
+        served as-is while a refresh runs.
+        """
+        entry = self.get(question, database_id)
+        if entry is None:
+            self._count("misses")
+            return None
+        if not self.is_stale(entry):
+            self._count("fresh_hits")
+            return entry
+
+        if ANSWER_STORE_BACKGROUND_REFRESH:
+            self.refresh_in_background(entry)
+            return entry
+
+        refreshed = self.refresh(entry)
+        self._count("refreshed" if refreshed else "misses")
+        return refreshed
+
+    def refresh_in_background(self, entry: dict) -> None:
+        key = (entry["database_id"], question_key(entry["question"]))
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.stats["background_refreshes"] += 1
+
+        def run():
+            try:
+                self.refresh(entry)
+            except Exception as e:
+                logger.warning("answer store: refresh of %r failed: %s", entry["question"], e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(run)
+
+    def refresh_stale(self, limit: int = 50, database_id: Optional[str] = None) -> int:
+        """
+        Refreshes up to `limit` stale entries, most-asked first — of one
+        database, or of all of them when database_id is None. Returns how many.
+        """
+        with self._connect() as conn:
+            if database_id is None:
+                keys = conn.execute(
+                    "SELECT question, database_id FROM answers ORDER BY hits DESC LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                keys = conn.execute(
+                    "SELECT question, database_id FROM answers WHERE database_id = ?"
+                    " ORDER BY hits DESC LIMIT ?", (database_id, limit)
+                ).fetchall()
+
+        refreshed = 0
+        for question, database_id in keys:
+            entry = self.get(question, database_id, count_hit=False)
+            if entry and self.is_stale(entry) and self.refresh(entry):
+                refreshed += 1
+        return refreshed
+
+
+answer_store = AnswerStore(ANSWER_STORE_PATH) if ANSWER_STORE_PATH else None
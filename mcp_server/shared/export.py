@@ -0,0 +1,71 @@
+"""
+shared/export.py — Streams full query results as CSV or NDJSON.
+
+Rows are pulled from a streaming cursor EXPORT_CHUNK_ROWS at a time and
+encoded chunk by chunk, so memory stays flat no matter how many rows the
+query returns. The connection stays open until the stream is exhausted
+or closed (e.g. the client disconnects).
+
+Callers must check is_safe_query() first — this module executes as given.
+"""
+
+import io
+import os
+import csv
+import json
+from typing import Iterator, Optional
+from sqlalchemy import text
+from app.db import get_engine
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _encode_csv(columns: list[str], chunks: Iterator[list]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _encode_ndjson(columns: list[str], chunks: Iterator[list]) -> Iterator[str]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows
+        )
+
+
+def open_export(sql: str, fmt: str = "csv", database_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Executes sql now (so SQL errors surface before any bytes are sent) and
+    returns an iterator of encoded text chunks.
+    """
+    encode = {"csv": _encode_csv, "ndjson": _encode_ndjson}[fmt]
+
+    conn = get_engine(database_id).connect()
+    try:
+        result = conn.execution_options(stream_results=True).execute(text(sql))
+        columns = list(result.keys())
+    except Exception:
+        conn.close()
+        raise
+
+    def stream() -> Iterator[str]:
+        # Closing the stream releases the connection right away, whoever holds the encoder
+        try:
+            yield from encode(columns, result.partitions(EXPORT_CHUNK_ROWS))
+        finally:
+            result.close()
+            conn.close()
+
+    return stream()
@@ -7,13 +7,40 @@ Pipeline-specific nodes live in pipelines/<name>/nodes.py.
 Currently shared:
   - get_schema      (used by: query, deep_analysis, and any future pipeline)
   - is_safe_query   (used by: query, deep_analysis)
+
+get_schema doesn't copy the schema into the state: it stores schema_ref, a
+fingerprint of the cached schema, and nodes read it back with schema_for().
 """
 
+import os
+import re
 import json
-from app.db import engine
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+from app.db import get_engine, resolve_database_id, on_engine_evicted
 from sqlalchemy import inspect
 from pydantic_models.agentState import AgentState
 
+SCHEMA_CACHE_SECONDS = int(os.getenv("SCHEMA_CACHE_SECONDS", "300"))
+
+SCHEMA_REFS_MAX = int(os.getenv("SCHEMA_REFS_MAX", "64"))
+
+# database_id → {"schema", "json", "ref", "loaded_at"}; entries go when the engine is evicted
+_schema_cache: dict[str, dict] = {}
+# schema_ref → the same entry. Outlives reloads and evictions (bounded LRU)
+# so states already holding a ref can still resolve it
+_schema_refs: OrderedDict[str, dict] = OrderedDict()
+_schema_lock = threading.Lock()
+# database_id → lock held while that database is introspected, so a slow
+# database only holds up loads of its own schema
+_load_locks: dict[str, threading.Lock] = {}
+
+# Bookkeeping tables that are not part of the data model (see shared/rollups.py)
+HIDDEN_TABLES = {"rollup_state"}
+
 BLOCKED_KEYWORDS = [
     "DROP", "DELETE", "ALTER", "UPDATE", "INSERT", "CREATE",
     "TRUNCATE", "EXEC", "GRANT", "REVOKE", "MERGE", "CALL",
@@ -21,42 +48,154 @@ BLOCKED_KEYWORDS = [
 ]
 
 
+# Whole words only — created_at, updated_at or is_deleted are fine.
+# REPLACE alone is also the replace() string function; REPLACE INTO writes.
+_BLOCKED = re.compile(r"\b(?:" + "|".join(BLOCKED_KEYWORDS) + r")\b|\bREPLACE\s+INTO\b")
+# Innermost parenthesised group — collapsed repeatedly to leave the top level
+_PARENS = re.compile(r"\([^()]*\)")
+_STATEMENT = re.compile(r"\b(SELECT|VALUES|INSERT|REPLACE|UPDATE|DELETE)\b")
+# String literals, quoted identifiers and comments can't hide or fake a keyword
+_LITERAL_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.S)
+
+
 def is_safe_query(query: str) -> bool:
-    """Returns True only if the query is a pure SELECT with no dangerous keywords."""
-    query_upper = query.upper().strip()
-    if not query_upper.startswith("SELECT"):
+    """
+    Returns True only if the query is a single pure SELECT (or WITH … SELECT)
+    with no dangerous keywords. A trailing semicolon is allowed.
+    """
+    masked = _LITERAL_OR_COMMENT.sub(" ", query).upper().strip().rstrip(";").strip()
+    if not masked.startswith(("SELECT", "WITH")):
         return False
-    return not any(kw in query_upper for kw in BLOCKED_KEYWORDS)
+    if ";" in masked:
+        return False
+    if _BLOCKED.search(masked):
+        return False
+    if masked.startswith("WITH"):
+        # The statement after the CTE list must itself be a SELECT
+        top_level = masked
+        while True:
+            collapsed = _PARENS.sub(" ", top_level)
+            if collapsed == top_level:
+                break
+            top_level = collapsed
+        statement = _STATEMENT.search(top_level)
+        return statement is not None and statement.group(1) == "SELECT"
+    return True
+
+
+def _inspect_schema(database_id: Optional[str] = None) -> dict:
+    """Every table, every column, every foreign key — read from the database."""
+    inspector = inspect(get_engine(database_id))
+    tables = [t for t in inspector.get_table_names() if t not in HIDDEN_TABLES]
+    schema = {}
+
+    for table in tables:
+        columns = inspector.get_columns(table)
+        foreign_keys = inspector.get_foreign_keys(table)
+        schema[table] = {
+            "columns": [
+                {"name": col["name"], "type": str(col["type"])}
+                for col in columns
+            ],
+            "foreign_keys": [
+                {
+                    "column": fk["constrained_columns"],
+                    "references": f"{fk['referred_table']}.{fk['referred_columns']}"
+                }
+                for fk in foreign_keys
+            ]
+        }
+    return schema
+
+
+def _cached_entry(database_id: str) -> Optional[dict]:
+    entry = _schema_cache.get(database_id)
+    if entry is None or time.time() - entry["loaded_at"] > SCHEMA_CACHE_SECONDS:
+        return None
+    return entry
+
+
+def _load_entry(database_id: Optional[str] = None) -> dict:
+    database_id = resolve_database_id(database_id)
+    with _schema_lock:
+        entry = _cached_entry(database_id)
+        if entry is not None:
+            return entry
+        load_lock = _load_locks.setdefault(database_id, threading.Lock())
+
+    with load_lock:
+        with _schema_lock:
+            entry = _cached_entry(database_id)   # loaded while we waited
+        if entry is not None:
+            return entry
+
+        schema = _inspect_schema(database_id)
+        schema_json = json.dumps(schema, indent=2)
+        entry = {
+            "schema": schema,
+            "json": schema_json,
+            "ref": hashlib.sha256(schema_json.encode()).hexdigest()[:16],
+            "loaded_at": time.time(),
+        }
+        with _schema_lock:
+            _schema_cache[database_id] = entry
+            _schema_refs[entry["ref"]] = entry
+            _schema_refs.move_to_end(entry["ref"])
+            while len(_schema_refs) > SCHEMA_REFS_MAX:
+                _schema_refs.popitem(last=False)
+        return entry
+
+
+def load_schema(database_id: Optional[str] = None) -> tuple[dict, str]:
+    """
+    Returns (schema dict, schema JSON string) of one database, cached for
+    SCHEMA_CACHE_SECONDS. Introspection costs several queries per table —
+    the schema rarely changes, so every pipeline run shares one read.
+    Call clear_schema_cache() after DDL.
+    """
+    entry = _load_entry(database_id)
+    return entry["schema"], entry["json"]
+
+
+def load_schema_ref(database_id: Optional[str] = None) -> str:
+    """The fingerprint of one database's (cached) schema — what states carry."""
+    return _load_entry(database_id)["ref"]
+
+
+def schema_for(state) -> tuple[dict, str]:
+    """
+    (schema dict, schema JSON string) that state.schema_ref points to.
+    A ref this process doesn't know — e.g. a deep-analysis checkpoint from
+    before a restart — falls back to the state's database's current schema.
+    """
+    with _schema_lock:
+        entry = _schema_refs.get(state.schema_ref) if state.schema_ref else None
+    if entry is None:
+        return load_schema(state.database_id)
+    return entry["schema"], entry["json"]
+
+
+def clear_schema_cache(database_id: Optional[str] = None) -> None:
+    """Forgets one database's schema, or every database's (None)."""
+    with _schema_lock:
+        if database_id is None:
+            _schema_cache.clear()
+            _load_locks.clear()
+        else:
+            _schema_cache.pop(resolve_database_id(database_id), None)
+            _load_locks.pop(resolve_database_id(database_id), None)
+
+
+on_engine_evicted(clear_schema_cache)
 
 
 def get_schema(state: AgentState) -> AgentState:
     """
-    Inspects the database and stores the full schema in state.db_schema.
-    Every table, every column, every foreign key — as a JSON string.
+    Loads the database schema (every table, every column, every foreign
+    key) into the shared cache and stores its fingerprint in state.schema_ref.
     """
     try:
-        inspector = inspect(engine)
-        tables = inspector.get_table_names()
-        schema = {}
-
-        for table in tables:
-            columns = inspector.get_columns(table)
-            foreign_keys = inspector.get_foreign_keys(table)
-            schema[table] = {
-                "columns": [
-                    {"name": col["name"], "type": str(col["type"])}
-                    for col in columns
-                ],
-                "foreign_keys": [
-                    {
-                        "column": fk["constrained_columns"],
-                        "references": f"{fk['referred_table']}.{fk['referred_columns']}"
-                    }
-                    for fk in foreign_keys
-                ]
-            }
-
-        state.db_schema = json.dumps(schema, indent=2)
+        state.schema_ref = load_schema_ref(state.database_id)
         state.error = None
 
     except Exception as e:
@@ -65,33 +204,14 @@ def get_schema(state: AgentState) -> AgentState:
     return state
 
 
-def get_schema_dict() -> dict:
+def get_schema_dict(database_id: Optional[str] = None) -> dict:
     """
     Helper that returns the raw schema as a Python dict.
     Used by database_tools.py for the describe_data tool
     without needing to create a dummy AgentState.
     """
     try:
-        inspector = inspect(engine)
-        tables = inspector.get_table_names()
-        schema = {}
-
-        for table in tables:
-            columns = inspector.get_columns(table)
-            foreign_keys = inspector.get_foreign_keys(table)
-            schema[table] = {
-                "columns": [
-                    {"name": col["name"], "type": str(col["type"])}
-                    for col in columns
-                ],
-                "foreign_keys": [
-                    {
-                        "column": fk["constrained_columns"],
-                        "references": f"{fk['referred_table']}.{fk['referred_columns']}"
-                    }
-                    for fk in foreign_keys
-                ]
-            }
+        schema, _ = load_schema(database_id)
         return {"success": True, "schema": schema}
     except Exception as e:
-        return {"success": False, "error": str(e), "schema": None}
\ No newline at end of file
+        return {"success": False, "error": str(e), "schema": None}
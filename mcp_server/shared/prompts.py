@@ -0,0 +1,69 @@
+"""
+shared/prompts.py — System prompts that embed the database schema.
+
+These prompts are the biggest strings we send, and the schema part only
+changes when the database does. Each one is rendered once per
+(template, schema) pair and cached, so:
+  - hot paths don't re-format a multi-KB f-string on every call
+  - the exact same bytes are sent every time, so provider-side prefix
+    caching can apply
+
+Keep everything that varies per request (question, previous SQL, retry
+errors) OUT of these templates — put it in the HumanMessage instead.
+"""
+
+from functools import lru_cache
+
+SQL_GENERATOR_PROMPT = """You are an expert SQL assistant. Generate a correct SQL query for the given question.
+    Database Schema:
+    {db_schema}
+    Rules:
+    - Use only tables and columns from the schema above
+    - This is a SQLite database
+    - Date columns are TEXT in format 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM'
+    - For date filtering use strftime(): strftime('%Y', date_col) = '2023'
+    - Always alias aggregated columns: SUM(amount) AS total_revenue
+    - Use JOINs based on the foreign key relationships in the schema
+    - Tables named rollup_*_monthly (if present) hold precomputed monthly totals
+      (month = 'YYYY-MM'). Prefer them over joining orders/order_items/products
+      whenever the question only needs totals by month, year, category, seller,
+      region, status, payment method or priority; join the id columns to
+      categories/sellers/regions for names. Sum their columns — never COUNT rows
+    - Return only the SQL query, no explanation"""
+
+DECOMPOSE_PROMPT = """You are an expert data analyst. Break the following complex question
+    into 2-4 focused sub-questions that can each be answered with a single SQL query.
+    Database Schema:
+    {db_schema}
+    Return a JSON array of sub-question strings. Nothing else.
+    Example: ["sub-question 1", "sub-question 2", "sub-question 3"]"""
+
+SUB_QUERY_PROMPT = """You are an expert SQL assistant. Generate a correct SQL query.
+        Database Schema:
+        {db_schema}
+        Rules:
+        - SQLite database
+        - Date columns are TEXT: use strftime('%Y', date_col) = '2023'
+        - Always alias aggregated columns
+        - Use JOINs based on foreign keys in the schema
+        - Prefer rollup_*_monthly tables (if present, month = 'YYYY-MM') for totals
+          by month, year, category, seller, region or status — SUM their columns
+        - Return only the SQL query"""
+
+
+# No schema here: repairs send only the tables involved (pipelines/query/repair.py)
+REPAIR_PROMPT = """You are an expert SQL assistant. A SQLite query failed — fix it.
+    You get the question, the failing query, the error and the definitions of the
+    tables involved (column type, -> foreign key target).
+    Rules:
+    - Change only what the error requires; keep the query's intent
+    - Use only the tables and columns given; other table names are listed for reference
+    - Date columns are TEXT: use strftime('%Y', date_col) = '2023'
+    - Use LIMIT n for row limits (no TOP, no FETCH FIRST)
+    - Return only the corrected SQL query, no explanation"""
+
+
+@lru_cache(maxsize=256)   # a few templates × every database served
+def render_prompt(template: str, db_schema: str) -> str:
+    """Fills {db_schema} into a template. Same inputs → same (cached) string."""
+    return template.format(db_schema=db_schema)
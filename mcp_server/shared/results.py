@@ -0,0 +1,47 @@
+"""
+shared/results.py — Short-lived handles to query results.
+
+A successful query_database answer registers its SQL — and the database it
+ran on — here and hands the caller a result_id. Clients use that id to pull
+the full rows later (e.g. POST /export) without re-sending — or even
+seeing — the SQL.
+
+Bounded LRU: the oldest handles are dropped past RESULT_STORE_MAX.
+"""
+
+import os
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Optional
+from app.db import resolve_database_id
+
+RESULT_STORE_MAX = int(os.getenv("RESULT_STORE_MAX", "1000"))
+
+
+class ResultStore:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, sql: str, database_id: Optional[str] = None) -> str:
+        result_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[result_id] = {"sql": sql, "database_id": resolve_database_id(database_id)}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result_id
+
+    def get(self, result_id: str) -> Optional[dict]:
+        """{"sql", "database_id"} for a result_id, or None if unknown/expired."""
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(result_id)
+            return dict(entry)
+
+
+result_store = ResultStore(RESULT_STORE_MAX)
+
@@ -0,0 +1,209 @@
+"""
+shared/rollups.py — Precomputed monthly summary tables.
+
+Most questions are revenue / orders / refunds / tickets by month, category,
+region or seller. Generated SQL answers them by re-joining orders,
+order_items, products, users… on every call. The rollup_* tables hold
+those aggregates per month, so the same question is a scan of a few
+hundred summary rows instead.
+
+The rollups are ordinary tables in the main database, so they show up in
+the schema the LLM sees; SQL_GENERATOR_PROMPT tells it to prefer them.
+
+Maintenance is incremental. rollup_state keeps, per rollup, the highest
+source id already aggregated (the high-water mark). A refresh recomputes
+only:
+  - the months that contain source rows above the high-water mark
+  - the latest ROLLUP_RECENT_MONTHS months already in the rollup, which
+    picks up late changes to recent rows (e.g. an order being cancelled)
+Older months are left as they are; build_rollups(full=True) rebuilds
+everything. Run scripts/build_rollups.py after each data load.
+"""
+
+import os
+import time
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy import text
+from app.db import get_engine
+
+load_dotenv()
+
+ROLLUP_RECENT_MONTHS = int(os.getenv("ROLLUP_RECENT_MONTHS", "2"))
+
+# Bookkeeping table — hidden from the schema the LLM sees
+ROLLUP_STATE_TABLE = "rollup_state"
+
+# name → source table (its id is the high-water mark), the source's month
+# expression, DDL, and the aggregate SELECT. {where} restricts the months.
+# Only additive measures: sums and counts that can be re-added across rows.
+ROLLUPS = {
+    "rollup_sales_monthly": {
+        "source": "order_items",
+        "month": "(SELECT strftime('%Y-%m', o.order_date) FROM orders o WHERE o.id = s.order_id)",
+        "ddl": """
+            CREATE TABLE IF NOT EXISTS rollup_sales_monthly (
+                month        TEXT NOT NULL,     -- 'YYYY-MM' of orders.order_date
+                category_id  INTEGER,
+                seller_id    INTEGER,
+                region_id    INTEGER,           -- the buyer's region
+                order_status TEXT,
+                order_lines  INTEGER NOT NULL,
+                units        INTEGER NOT NULL,
+                revenue      REAL NOT NULL,     -- SUM(quantity * unit_price)
+                cost         REAL NOT NULL      -- SUM(quantity * products.cost)
+            )""",
+        "select": """
+            SELECT strftime('%Y-%m', o.order_date), p.category_id, p.seller_id,
+                   u.region_id, o.status, COUNT(*), SUM(oi.quantity),
+                   SUM(oi.quantity * oi.unit_price), SUM(oi.quantity * p.cost)
+            FROM order_items oi
+            JOIN orders o   ON o.id = oi.order_id
+            JOIN products p ON p.id = oi.product_id
+            JOIN users u    ON u.id = o.user_id
+            {where}
+            GROUP BY 1, 2, 3, 4, 5""",
+        "date_column": "o.order_date",
+    },
+    "rollup_orders_monthly": {
+        "source": "orders",
+        "month": "strftime('%Y-%m', s.order_date)",
+        "ddl": """
+            CREATE TABLE IF NOT EXISTS rollup_orders_monthly (
+                month           TEXT NOT NULL,  -- 'YYYY-MM' of orders.order_date
+                region_id       INTEGER,        -- the buyer's region
+                status          TEXT,
+                orders          INTEGER NOT NULL,
+                promo_orders    INTEGER NOT NULL,
+                order_value     REAL NOT NULL   -- SUM of the orders' item totals
+            )""",
+        "select": """
+            SELECT strftime('%Y-%m', o.order_date), u.region_id, o.status,
+                   COUNT(*), COUNT(o.promotion_id),
+                   COALESCE(SUM((SELECT SUM(oi.quantity * oi.unit_price)
+                                 FROM order_items oi WHERE oi.order_id = o.id)), 0)
+            FROM orders o
+            JOIN users u ON u.id = o.user_id
+            {where}
+            GROUP BY 1, 2, 3""",
+        "date_column": "o.order_date",
+    },
+    "rollup_refunds_monthly": {
+        "source": "refunds",
+        "month": "strftime('%Y-%m', s.created_at)",
+        "ddl": """
+            CREATE TABLE IF NOT EXISTS rollup_refunds_monthly (
+                month          TEXT NOT NULL,   -- 'YYYY-MM' of refunds.created_at
+                region_id      INTEGER,         -- the buyer's region
+                payment_method TEXT,
+                refunds        INTEGER NOT NULL,
+                refund_amount  REAL NOT NULL
+            )""",
+        "select": """
+            SELECT strftime('%Y-%m', r.created_at), u.region_id, pay.method,
+                   COUNT(*), SUM(r.amount)
+            FROM refunds r
+            JOIN payments pay ON pay.id = r.payment_id
+            JOIN orders o     ON o.id = pay.order_id
+            JOIN users u      ON u.id = o.user_id
+            {where}
+            GROUP BY 1, 2, 3""",
+        "date_column": "r.created_at",
+    },
+    "rollup_tickets_monthly": {
+        "source": "support_tickets",
+        "month": "strftime('%Y-%m', s.created_at)",
+        "ddl": """
+            CREATE TABLE IF NOT EXISTS rollup_tickets_monthly (
+                month                  TEXT NOT NULL,  -- 'YYYY-MM' of support_tickets.created_at
+                region_id              INTEGER,        -- the customer's region
+                status                 TEXT,
+                priority               TEXT,
+                tickets                INTEGER NOT NULL,
+                resolved_tickets       INTEGER NOT NULL,
+                total_resolution_hours REAL NOT NULL   -- / resolved_tickets = average
+            )""",
+        "select": """
+            SELECT strftime('%Y-%m', t.created_at), u.region_id, t.status, t.priority,
+                   COUNT(*), COUNT(t.resolved_at),
+                   COALESCE(SUM((julianday(t.resolved_at) - julianday(t.created_at)) * 24), 0)
+            FROM support_tickets t
+            JOIN users u ON u.id = t.user_id
+            {where}
+            GROUP BY 1, 2, 3, 4""",
+        "date_column": "t.created_at",
+    },
+}
+
+
+def _ensure_tables(conn) -> None:
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {ROLLUP_STATE_TABLE} ("
+        " rollup          TEXT PRIMARY KEY,"
+        " high_water_mark INTEGER,"
+        " refreshed_at    REAL NOT NULL,"
+        " months_rebuilt  INTEGER NOT NULL)"
+    ))
+    for spec in ROLLUPS.values():
+        conn.execute(text(spec["ddl"]))
+
+
+def _months_to_rebuild(conn, name: str, spec: dict, high_water_mark: int) -> list[str]:
+    """Months touched by new source rows + the latest ROLLUP_RECENT_MONTHS already rolled up."""
+    new = conn.execute(text(
+        f"SELECT DISTINCT {spec['month']} FROM {spec['source']} s WHERE s.id > :hwm"
+    ), {"hwm": high_water_mark}).scalars().all()
+    recent = conn.execute(text(
+        f"SELECT DISTINCT month FROM {name} ORDER BY month DESC LIMIT :n"
+    ), {"n": ROLLUP_RECENT_MONTHS}).scalars().all()
+    return sorted({m for m in new + recent if m is not None})
+
+
+def refresh_rollup(conn, name: str, full: bool = False) -> int:
+    """
+    Brings one rollup up to date inside the caller's transaction.
+    Returns the number of months recomputed (-1 for a full rebuild).
+    """
+    spec = ROLLUPS[name]
+    state = conn.execute(text(
+        f"SELECT high_water_mark FROM {ROLLUP_STATE_TABLE} WHERE rollup = :name"
+    ), {"name": name}).fetchone()
+    max_id = conn.execute(text(f"SELECT MAX(id) FROM {spec['source']}")).scalar() or 0
+
+    if full or state is None or state[0] is None:
+        conn.execute(text(f"DELETE FROM {name}"))
+        conn.execute(text(f"INSERT INTO {name} " + spec["select"].format(where="")))
+        months_rebuilt = -1
+    else:
+        months = _months_to_rebuild(conn, name, spec, state[0])
+        if months:
+            params = {f"m{i}": m for i, m in enumerate(months)}
+            placeholders = ", ".join(f":{key}" for key in params)
+            conn.execute(text(f"DELETE FROM {name} WHERE month IN ({placeholders})"), params)
+            where = f"WHERE strftime('%Y-%m', {spec['date_column']}) IN ({placeholders})"
+            conn.execute(text(f"INSERT INTO {name} " + spec["select"].format(where=where)), params)
+        months_rebuilt = len(months)
+
+    conn.execute(text(
+        f"INSERT OR REPLACE INTO {ROLLUP_STATE_TABLE}"
+        " (rollup, high_water_mark, refreshed_at, months_rebuilt)"
+        " VALUES (:name, :hwm, :now, :months)"
+    ), {"name": name, "hwm": max_id, "now": time.time(), "months": months_rebuilt})
+    return months_rebuilt
+
+
+def build_rollups(full: bool = False, database_id: Optional[str] = None, engine=None) -> dict[str, int]:
+    """
+    Creates missing rollup tables and refreshes every rollup of one database
+    in one transaction. Returns {rollup: months recomputed (-1 = full rebuild)}.
+    """
+    from mcp_server.shared.nodes import clear_schema_cache
+
+    engine = engine or get_engine(database_id)
+    with engine.begin() as conn:
+        _ensure_tables(conn)
+        summary = {name: refresh_rollup(conn, name, full=full) for name in ROLLUPS}
+
+    # New tables must reach the prompts on the next request
+    clear_schema_cache(database_id)
+    return summary
@@ -6,50 +6,190 @@ One function per MCP tool. Each function:
   2. Packages the result into a clean dict
 
 No logic here. No SQL here. No LLM calls here.
+
+Graphs are imported (and so compiled, along with LangGraph itself) on
+first use rather than at import time — see get_query_graph().
 """
 
-from mcp_server.pipelines.query.graph import graph as query_graph
-from mcp_server.pipelines.deep_analysis.graph import graph as deep_analysis_graph
+import logging
 from mcp_server.shared.nodes import get_schema_dict
+from mcp_server.shared.results import result_store
+from mcp_server.shared.answers import answer_store
+from mcp_server.pipelines.batch.runner import iter_batch_results
+from mcp_server.pipelines.reshape.frame import Frame
+from mcp_server.pipelines.reshape.nodes import (
+    parse_operations,
+    apply_operations,
+    render_result,
+)
+from app.deadline import current_deadline
 from pydantic_models.agentState import AgentState
 from pydantic_models.analysisState import AnalysisState
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+def get_query_graph():
+    from mcp_server.pipelines.query.graph import graph
+    return graph
+
+def get_deep_analysis_graph():
+    from mcp_server.pipelines.deep_analysis.graph import graph
+    return graph
+
+def run_query_database(
+    question: str,
+    previous_sql: str | None = None,
+    prepared_state: AgentState | None = None,
+    database_id: str | None = None,
+) -> dict:
+    """
+    database_id picks the database (app/db.py); None is the default one.
 
-def run_query_database(question: str) -> dict:
-    initial_state = AgentState(question=question)
+    prepared_state: a state with schema_ref and sql_query already set
+    (speculative generation) — the graph starts at execute_query.
+
+    Standalone questions (no previous_sql) are answered from the answer
+    store when it has a current entry, and saved to it on success.
+
+    The current request deadline (app/deadline.py), if any, is copied into
+    the state; timed_out=True means the answer is partial (e.g. rows
+    without an explanation).
+    """
+    use_store = answer_store is not None and previous_sql is None
+    if use_store:
+        try:
+            stored = answer_store.lookup(question, database_id)
+        except Exception:
+            stored = None
+        if stored is not None:
+            return {
+                "success": True,
+                "error": None,
+                "sql_query": stored["sql_query"],
+                "explanation": stored["explanation"],
+                "result": stored["result"],
+                "columns": stored["columns"],
+                "rows": stored["rows"],
+                "result_id": result_store.register(stored["sql_query"], database_id),
+                "attempts": 0,
+                "timed_out": False,
+            }
+
+    initial_state = prepared_state or AgentState(
+        question=question, previous_sql=previous_sql, database_id=database_id
+    )
+    deadline = current_deadline()
+    if deadline is not None:
+        initial_state.deadline = deadline.at
 
     try:
-        raw = query_graph.invoke(initial_state)
-        final = AgentState(**raw)
+        # The final state values as they are — nodes built them, no re-validation
+        final = get_query_graph().invoke(initial_state)
     except Exception as e:
         return {"success": False, "error": str(e),
-                "sql_query": None, "explanation": None, "attempts": 0}
+                "sql_query": None, "explanation": None, "result": None,
+                "columns": None, "rows": None, "result_id": None, "attempts": 0,
+                "timed_out": False}
+
+    error = final.get("error")
+    success = error is None
+    sql_query = final.get("sql_query")
+    timed_out = final.get("timed_out", False)
+
+    if use_store and success and sql_query and not timed_out:
+        try:
+            answer_store.save(question, sql_query, final.get("natural_language_output"),
+                              final.get("result"), final.get("columns"), final.get("rows"),
+                              database_id)
+        except Exception as e:
+            logger.warning("answer store: save failed: %s", e)
 
     return {
-        "success": final.error is None,
-        "error": final.error,
-        "sql_query": final.sql_query,
-        "explanation": final.natural_language_output,
-        "attempts": final.attempts,
+        "success": success,
+        "error": error,
+        "sql_query": sql_query,
+        "explanation": final.get("natural_language_output"),
+        "result": final.get("result"),
+        "columns": final.get("columns"),
+        "rows": final.get("rows"),
+        # Handle for pulling the full result later (POST /export)
+        "result_id": (
+            result_store.register(sql_query, database_id)
+            if success and sql_query else None
+        ),
+        "attempts": final.get("attempts", 0),
+        "timed_out": timed_out,
     }
 
-def run_deep_analysis(question: str) -> dict:
-    initial_state = AnalysisState(question=question)
+def run_deep_analysis(
+    question: str,
+    database_id: str | None = None,
+    analysis_id: str | None = None,
+    refine: bool = False,
+) -> dict:
+    """
+    analysis_id: an earlier analysis to continue (needs checkpointing, see
+    pipelines/deep_analysis/checkpoints.py). The same question retries it
+    from its first failed step; with refine=True a different question
+    re-synthesizes its results. The returned analysis_id continues this one.
+    """
+    from mcp_server.pipelines.deep_analysis.checkpoints import run_analysis
+
+    deadline = current_deadline()
+    initial_state = AnalysisState(
+        question=question,
+        database_id=database_id,
+        deadline=deadline.at if deadline else None,
+    )
 
     try:
-        raw = deep_analysis_graph.invoke(initial_state)
-        final = AnalysisState(**raw)
+        final, analysis_id = run_analysis(
+            get_deep_analysis_graph(), initial_state, analysis_id, refine=refine
+        )
     except Exception as e:
-        return {"success": False, "error": str(e),
-                "insights": None, "chart_data": None, "queries": []}
+        return {"success": False, "error": str(e), "analysis_id": analysis_id,
+                "insights": None, "chart_data": None, "queries": [], "timed_out": False}
 
     return {
-        "success": final.error is None,
-        "error": final.error,
-        "sub_questions": final.sub_questions,
-        "queries": final.queries,
-        "insights": final.insights,
-        "chart_data": final.chart_data,
+        "success": final.get("error") is None,
+        "error": final.get("error"),
+        "sub_questions": final.get("sub_questions", []),
+        "queries": final.get("queries", []),
+        "insights": final.get("insights"),
+        "chart_data": final.get("chart_data"),
+        "timed_out": final.get("timed_out", False),
+        "analysis_id": analysis_id,
     }
 
-def run_describe_data() -> dict:
-    return get_schema_dict()
\ No newline at end of file
+def run_describe_data(database_id: str | None = None) -> dict:
+    return get_schema_dict(database_id)
+
+def run_batch(questions: list[str], database_id: str | None = None) -> Iterator[dict]:
+    """Yields one result per question, in completion order (see "index")."""
+    return iter_batch_results(questions, database_id=database_id)
+
+def run_reshape_result(question: str, frame: dict) -> dict:
+    """
+    Answers a follow-up from the previous result (a columnar frame dict) —
+    no LLM, no DB. "applicable" is False when the question needs the full
+    pipeline instead.
+    """
+    current = Frame(frame)
+    operations = parse_operations(question, current)
+    if not operations:
+        return {"success": False, "applicable": False, "text": None, "frame": None}
+
+    try:
+        reshaped, aggregate = apply_operations(current, operations)
+    except Exception as e:
+        return {"success": False, "applicable": False, "error": str(e), "text": None, "frame": None}
+
+    return {
+        "success": True,
+        "applicable": True,
+        "operations": operations,
+        "text": render_result(reshaped, aggregate),
+        # Aggregates leave the cached rows alone; row reshapes replace them
+        "frame": reshaped.columns if aggregate is None else None,
+    }
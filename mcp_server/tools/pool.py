@@ -0,0 +1,71 @@
+"""
+tools/pool.py — Shared worker pool for the MCP server's tool calls.
+
+The pipelines are blocking (LLM HTTP calls, SQL), so async tools hand them
+to one bounded thread pool instead of running them on the event loop:
+  - MCP_MAX_WORKERS caps how many tool calls run at once, server-wide
+  - MCP_PER_CLIENT_CONCURRENCY caps how many of those one client can hold,
+    so a client firing a burst of deep_analysis calls can't starve the rest
+    (its extra calls wait their turn; other clients' calls go straight in)
+
+Each call runs under its own Deadline (REQUEST_TIMEOUT_SECONDS, see
+app/deadline.py), which is cancelled if the client cancels the call.
+"""
+
+import os
+import asyncio
+import contextvars
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.deadline import Deadline, use_deadline, REQUEST_TIMEOUT_SECONDS
+
+load_dotenv()
+
+MCP_MAX_WORKERS = int(os.getenv("MCP_MAX_WORKERS", "8"))
+MCP_PER_CLIENT_CONCURRENCY = int(os.getenv("MCP_PER_CLIENT_CONCURRENCY", "2"))
+
+
+class ToolPool:
+    def __init__(self, max_workers: int, per_client: int):
+        self.per_client = per_client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcp-tool")
+        # One semaphore per client, dropped once no call of that client holds it
+        self._semaphores: weakref.WeakValueDictionary[str, asyncio.Semaphore] = (
+            weakref.WeakValueDictionary()
+        )
+
+    def _semaphore(self, client_key: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(client_key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_client)
+            self._semaphores[client_key] = semaphore
+        return semaphore
+
+    async def run(self, client_key: str, fn, *args):
+        """Runs fn(*args) on the pool within client_key's concurrency limit."""
+        semaphore = self._semaphore(client_key)
+        await semaphore.acquire()
+        deadline = Deadline(REQUEST_TIMEOUT_SECONDS)
+
+        def call():
+            with use_deadline(deadline):
+                return fn(*args)
+
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(context.run, call)
+        except BaseException:
+            semaphore.release()
+            raise
+        # The slot is freed when the thread is done, not when the caller stops
+        # waiting — a cancelled call keeps its thread busy until it notices
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(semaphore.release))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            deadline.cancel()   # stop the LLM calls / SQL still running in the thread
+            raise
+
+tool_pool = ToolPool(MCP_MAX_WORKERS, MCP_PER_CLIENT_CONCURRENCY)
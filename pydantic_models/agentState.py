@@ -1,18 +1,42 @@
+"""
+pydantic_models/agentState.py — State for the query pipeline.
+
+A slots dataclass rather than a pydantic model: LangGraph rebuilds the
+state at every node transition, and a dataclass is rebuilt without
+validating or copying its fields — the result rows are handed from node
+to node as the same list. Inputs are validated where they enter (the API
+and MCP tool models), not at every step.
+
+The schema is a reference into the schema cache (shared/nodes.py), not a
+copy of its JSON.
+
+SQLOutput / NaturalLanguageOutput stay pydantic — they are LLM output schemas.
+"""
+
+from dataclasses import dataclass
 from pydantic import BaseModel
 from typing import Optional
 
-class AgentState(BaseModel):
+@dataclass(slots=True)
+class AgentState:
     question: str
-    db_schema: Optional[str] = None
+    database_id: Optional[str] = None     # which database (app/db.py); None → default
+    previous_sql: Optional[str] = None   # last query in this conversation, for follow-ups
+    schema_ref: Optional[str] = None      # fingerprint of the cached schema (shared/nodes.schema_for)
     sql_query: Optional[str] = None
-    result: Optional[str] = None
+    result: Optional[str] = None          # str(rows), as shown to the LLM and returned
+    columns: Optional[list[str]] = None   # result column names, for the reshape pipeline
+    rows: Optional[list] = None           # raw result rows (tuples)
     natural_language_output: Optional[str] = None
     error: Optional[str] = None
     attempts: int = 0
+    repair: Optional[str] = None          # "<error class>:<method>" of the fix being tried (query/repair.py)
+    deadline: Optional[float] = None      # absolute time.time() budget (app/deadline.py)
+    timed_out: bool = False               # budget ran out — result may be partial
 
 class SQLOutput(BaseModel):
     sql_query: str
     explanation: str | None = None
     
 class NaturalLanguageOutput(BaseModel):
-    natural_language_output: str
\ No newline at end of file
+    natural_language_output: str
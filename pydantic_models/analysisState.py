@@ -3,25 +3,32 @@ pydantic_models/analysisState.py — State for the deep_analysis pipeline.
 
 Different from AgentState because this pipeline holds multiple
 queries and results, not just one.
+
+A slots dataclass, like AgentState: no validation or field copies at each
+node transition, and the schema is carried by reference. The sub-query
+results stay strings — they are prompt input for synthesize_insights and
+must survive in checkpoints (checkpoints.py) to resume an analysis.
 """
 
-from pydantic import BaseModel
+from dataclasses import dataclass, field
 from typing import Optional
 
 
-class AnalysisState(BaseModel):
+@dataclass(slots=True)
+class AnalysisState:
     # Input
     question: str
+    database_id: Optional[str] = None   # which database (app/db.py); None → default
 
-    # Set by get_schema node (shared)
-    db_schema: Optional[str] = None
+    # Set by get_schema node (shared) — see shared/nodes.schema_for
+    schema_ref: Optional[str] = None
 
     # Set by decompose_question node
-    sub_questions: list[str] = []
+    sub_questions: list[str] = field(default_factory=list)
 
     # Set by generate_and_execute_all node (parallel lists — index N matches)
-    queries: list[str] = []
-    results: list[str] = []
+    queries: list[str] = field(default_factory=list)
+    results: list[str] = field(default_factory=list)
 
     # Set by synthesize_insights node
     insights: Optional[str] = None
@@ -29,6 +36,10 @@ class AnalysisState(BaseModel):
     # Set by build_chart_data node (None if no chart is appropriate)
     chart_data: Optional[dict] = None
 
+    # Request budget (absolute time.time(), see app/deadline.py)
+    deadline: Optional[float] = None
+    timed_out: bool = False   # budget ran out — results/insights may be partial
+
     # Error tracking
     error: Optional[str] = None
     
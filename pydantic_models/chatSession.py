@@ -0,0 +1,37 @@
+"""
+pydantic_models/chatSession.py — Server-side conversation state for /chat.
+
+One ChatSession per conversation. Lets clients send a session_id instead
+of re-uploading the whole history on every request, and keeps the last
+SQL and result around so follow-up questions can build on them.
+"""
+
+from pydantic import BaseModel
+from typing import Optional
+
+
+class ChatSession(BaseModel):
+    session_id: str
+
+    # Database the conversation is about (app/db.py) — fixed for its lifetime
+    database_id: Optional[str] = None
+
+    # Recent turns, oldest first: [{"role": "user" | "assistant", "content": str}]
+    history: list[dict] = []
+
+    # Rolling summary of turns that were compacted out of history
+    summary: Optional[str] = None
+
+    # Context from the last tool call (None until a data tool has run)
+    last_tool: Optional[str] = None
+    last_sql: Optional[str] = None
+    last_result: Optional[str] = None
+
+    # Checkpointed deep analysis asked last — asking it again resumes it
+    last_analysis_id: Optional[str] = None
+
+    # Last result set as {column: [values]} — reshaped locally by follow-ups
+    last_frame: Optional[dict[str, list]] = None
+
+    # Unix timestamp of the last save — drives TTL eviction
+    updated_at: float = 0.0
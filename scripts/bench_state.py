@@ -0,0 +1,196 @@
+"""
+scripts/bench_state.py — Per-transition cost of the query pipeline state.
+
+Compares the old state (a pydantic model carrying the schema JSON, the
+result string and the rows) with the current one (a slots dataclass with
+a schema reference, handing the same result objects from node to node) on:
+
+  rebuild  — building the state from its values, which LangGraph does
+             before every node
+  graph    — a run through a LangGraph graph shaped like the query
+             pipeline (get_schema → sql_generator → execute_query →
+             explain_results), nodes only setting what the real ones set,
+             plus the end-of-run handling in run_query_database
+
+No database and no LLM: a synthetic schema and result set of the given
+size, the result text built once up front — the nodes do next to no work,
+so a run's time is the cost of its transitions. Also reports the peak
+memory of a run.
+
+Usage:
+    python scripts/bench_state.py                        # 10,000 rows, 60 tables
+    python scripts/bench_state.py --rows 100000 --runs 20
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pydantic import BaseModel
+from langgraph.graph import StateGraph, END
+from pydantic_models.agentState import AgentState
+
+NODES = ["get_schema", "sql_generator", "execute_query", "explain_results"]
+
+
+class PydanticAgentState(BaseModel):
+    """AgentState as it was before: everything inline, validated at every step."""
+    question: str
+    database_id: Optional[str] = None
+    previous_sql: Optional[str] = None
+    db_schema: Optional[str] = None
+    sql_query: Optional[str] = None
+    result: Optional[str] = None
+    columns: Optional[list[str]] = None
+    rows: Optional[list] = None
+    natural_language_output: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    repair: Optional[str] = None
+    deadline: Optional[float] = None
+    timed_out: bool = False
+
+
+def make_workload(n_tables: int, n_rows: int) -> tuple[str, list[str], list[tuple]]:
+    schema = {
+        f"table_{t}": {
+            "columns": [{"name": f"column_{c}", "type": "VARCHAR(100)"} for c in range(12)],
+            "foreign_keys": [{"column": ["column_0"], "references": f"table_{t - 1}.['id']"}]
+                            if t else [],
+        }
+        for t in range(n_tables)
+    }
+    columns = ["id", "name", "region", "month", "orders", "revenue"]
+    rows = [(i, f"product {i}", f"region {i % 7}", f"2024-{i % 12 + 1:02d}", i % 40, i * 1.25)
+            for i in range(n_rows)]
+    return json.dumps(schema, indent=2), columns, rows
+
+
+def before_nodes(schema_json: str, columns: list[str], rows: list[tuple], text: str):
+    def get_schema(state):
+        state.db_schema = schema_json
+        return state
+
+    def sql_generator(state):
+        state.sql_query = "SELECT * FROM table_0"
+        return state
+
+    def execute_query(state):
+        state.result = text
+        state.columns = columns
+        state.rows = rows
+        return state
+
+    def explain_results(state):
+        state.natural_language_output = f"{len(state.result)} characters of results"
+        return state
+
+    def finish(values: dict):
+        final = PydanticAgentState(**values)
+        return final.result, final.columns, final.rows
+
+    return PydanticAgentState, [get_schema, sql_generator, execute_query, explain_results], finish
+
+
+def after_nodes(schema_ref: str, columns: list[str], rows: list[tuple], text: str):
+    def get_schema(state):
+        state.schema_ref = schema_ref
+        return state
+
+    def sql_generator(state):
+        state.sql_query = "SELECT * FROM table_0"
+        return state
+
+    def execute_query(state):
+        state.result = text
+        state.columns = columns
+        state.rows = rows
+        return state
+
+    def explain_results(state):
+        state.natural_language_output = f"{len(state.result)} characters of results"
+        return state
+
+    def finish(values: dict):
+        return values["result"], values["columns"], values["rows"]
+
+    return AgentState, [get_schema, sql_generator, execute_query, explain_results], finish
+
+
+def runner(schema, functions, finish):
+    builder = StateGraph(schema)
+    for name, function in zip(NODES, functions):
+        builder.add_node(name, function)
+    builder.set_entry_point(NODES[0])
+    for a, b in zip(NODES, NODES[1:]):
+        builder.add_edge(a, b)
+    builder.add_edge(NODES[-1], END)
+    graph = builder.compile()
+
+    return lambda: finish(graph.invoke(schema(question="q")))
+
+
+def time_per_call(function, runs: int, repeat: int = 5) -> float:
+    """Seconds per call: the best of `repeat` batches of `runs` calls, as timeit does."""
+    function()   # warm-up
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(runs):
+            function()
+        best = min(best, (time.perf_counter() - start) / runs)
+    return best
+
+
+def peak_per_call(function) -> int:
+    """Peak bytes allocated during the call, above what was live before it."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--tables", type=int, default=60)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    schema_json, columns, rows = make_workload(args.tables, args.rows)
+    print(f"schema {len(schema_json) / 1024:.0f} KB, {len(rows):,} rows × {len(columns)} columns\n")
+
+    text = str(rows)
+    full = {"question": "q", "db_schema": schema_json, "sql_query": "SELECT 1",
+            "result": text, "columns": columns, "rows": rows}
+    lean = {"question": "q", "schema_ref": "0123456789abcdef", "sql_query": "SELECT 1",
+            "result": text, "columns": columns, "rows": rows}
+    rebuild = {
+        "before": lambda: PydanticAgentState(**full),
+        "after": lambda: AgentState(**lean),
+    }
+    runs = {
+        "before": runner(*before_nodes(schema_json, columns, rows, text)),
+        "after": runner(*after_nodes("0123456789abcdef", columns, rows, text)),
+    }
+    assert runs["before"]() == runs["after"]()
+
+    print(f"{'':<8}{'rebuild':>12}{'graph run':>13}{'per transition':>17}{'peak / run':>13}")
+    for variant in ("before", "after"):
+        rebuild_s = time_per_call(rebuild[variant], args.runs * 10)
+        graph_s = time_per_call(runs[variant], args.runs)
+        peak = peak_per_call(runs[variant])
+        print(f"{variant:<8}{rebuild_s * 1e6:>9.1f} µs{graph_s * 1e3:>10.2f} ms"
+              f"{graph_s / len(NODES) * 1e3:>14.3f} ms{peak / 1024:>10.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
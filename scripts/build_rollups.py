@@ -0,0 +1,37 @@
+"""
+scripts/build_rollups.py — Creates / refreshes the rollup_* summary tables.
+
+Incremental by default: only months with new source rows (plus the most
+recent ROLLUP_RECENT_MONTHS) are recomputed. Run it after each data load.
+
+Usage:
+    python scripts/build_rollups.py           # incremental refresh
+    python scripts/build_rollups.py --full    # rebuild every month
+    python scripts/build_rollups.py --database acme   # a database from DATABASES
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mcp_server.shared.rollups import build_rollups
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    full = "--full" in args
+    database_id = args[args.index("--database") + 1] if "--database" in args else None
+    started = time.perf_counter()
+    summary = build_rollups(full=full, database_id=database_id)
+    elapsed = time.perf_counter() - started
+
+    for name, months in summary.items():
+        detail = "full rebuild" if months < 0 else f"{months} month(s) recomputed"
+        print(f"{name:<26} {detail}")
+    print(f"done in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+scripts/import_times.py — Measures cold import time per module.
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+so numbers are true cold-start costs (nothing shared between runs).
+
+Usage:
+    python scripts/import_times.py                 # default module list
+    python scripts/import_times.py app.main mcp_server.server
+"""
+
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = [
+    "app.db",
+    "app.llm",
+    "app.sessions",
+    "app.mcp_client",
+    "app.main",
+    "mcp_server.tools.database_tools",
+    "mcp_server.server",
+    "mcp_server.pipelines.query.graph",
+    "mcp_server.pipelines.deep_analysis.graph",
+    "langchain_groq",
+    "langgraph.graph",
+]
+
+
+def import_time_ms(module: str) -> float:
+    """Cumulative import time of `module` in a fresh interpreter, in ms."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    # Lines look like: "import time:   self [us] | cumulative | name"
+    for line in reversed(completed.stderr.splitlines()):
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)$", line)
+        if match and match.group(2) == module:
+            return int(match.group(1)) / 1000
+    raise RuntimeError(f"No importtime line for {module}")
+
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] or DEFAULT_MODULES
+    print(f"{'module':<45} {'cold import (ms)':>16}")
+    for module in modules:
+        try:
+            print(f"{module:<45} {import_time_ms(module):>16.1f}")
+        except RuntimeError as e:
+            print(f"{module:<45} {'failed':>16}  ({e})")
@@ -0,0 +1,38 @@
+"""
+scripts/refresh_answers.py — Refreshes stale entries in the answer store.
+
+Checks the most-asked stored answers and, for each whose tables changed
+since it was stored, re-executes its SQL and re-explains the rows. Run it
+from cron after data loads so dashboard questions are answered instantly.
+
+Usage:
+    python scripts/refresh_answers.py            # top 50 by hits, all databases
+    python scripts/refresh_answers.py 200
+    python scripts/refresh_answers.py 200 --database acme
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mcp_server.shared.answers import answer_store, ANSWER_STORE_PATH
+
+
+def main() -> None:
+    if answer_store is None:
+        sys.exit("ANSWER_STORE_PATH is not set — nothing to refresh.")
+
+    args = sys.argv[1:]
+    database_id = None
+    if "--database" in args:
+        i = args.index("--database")
+        database_id = args[i + 1]
+        del args[i:i + 2]
+    limit = int(args[0]) if args else 50
+    refreshed = answer_store.refresh_stale(limit, database_id=database_id)
+    print(f"{ANSWER_STORE_PATH}: refreshed {refreshed} stale answer(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from sqlalchemy import create_engine, text
+
+
+def test_tables_read_ignores_strings_and_unknown_names():
+    from mcp_server.shared.answers import tables_read
+
+    sql = ("WITH recent AS (SELECT * FROM orders WHERE status = 'customers') "
+           "SELECT p.name FROM recent r JOIN Products p ON p.id = r.product_id")
+    assert tables_read(sql, ["orders", "products", "customers"]) == ["orders", "products"]
+
+
+def test_entry_goes_stale_only_when_its_tables_change(tmp_path, monkeypatch):
+    from mcp_server.shared import answers, nodes
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'data.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, amount REAL)"))
+        conn.execute(text("CREATE TABLE tickets (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO orders (amount) VALUES (10), (20)"))
+
+    monkeypatch.setattr(answers, "get_engine", lambda database_id=None: engine)
+    monkeypatch.setattr(nodes, "load_schema", lambda database_id=None: ({"orders": {}, "tickets": {}}, "{}"))
+
+    store = answers.AnswerStore(str(tmp_path / "answers.db"))
+    store.save("Total sales?", "SELECT SUM(amount) AS total FROM orders",
+               "Sales were 30.", "[(30.0,)]", ["total"], [[30.0]])
+
+    entry = store.get("total sales")
+    assert entry["tables"] == ["orders"]
+    assert not store.is_stale(entry)
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO tickets DEFAULT VALUES"))
+    assert not store.is_stale(entry)
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO orders (amount) VALUES (5)"))
+    assert store.is_stale(entry)
+
+
+def test_answers_reading_views_or_without_rowid_tables_are_not_stored(tmp_path, monkeypatch):
+    from mcp_server.shared import answers, nodes
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'data.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, amount REAL)"))
+        conn.execute(text("CREATE VIEW big_orders AS SELECT * FROM orders WHERE amount > 100"))
+        conn.execute(text("CREATE TABLE rates (code TEXT PRIMARY KEY, rate REAL) WITHOUT ROWID"))
+
+    monkeypatch.setattr(answers, "get_engine", lambda database_id=None: engine)
+    monkeypatch.setattr(nodes, "load_schema",
+                        lambda database_id=None: ({"orders": {}, "rates": {}}, "{}"))
+
+    store = answers.AnswerStore(str(tmp_path / "answers.db"))
+    store.save("Big orders?", "SELECT COUNT(*) FROM big_orders", "None.", "[(0,)]", ["n"], [[0]])
+    store.save("Rates?", "SELECT code, rate FROM rates", "None.", "[]", ["code", "rate"], [])
+    store.save("Orders?", "SELECT COUNT(*) FROM orders", "None.", "[(0,)]", ["n"], [[0]])
+
+    assert not store.has("Big orders?") and not store.has("Rates?")
+    assert store.has("Orders?")
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_shared_executor_runs_identical_sql_once(monkeypatch):
+    from mcp_server.pipelines.batch.nodes import SharedExecutor
+
+    calls = []
+
+    def fake_execute(sql):
+        calls.append(sql)
+        return "[(1,)]", ["n"], [(1,)]
+
+    executor = SharedExecutor()
+    monkeypatch.setattr(executor, "_execute", fake_execute)
+
+    statements = ["SELECT 1", "SELECT  1;", "select 2"] * 4
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(executor.run, statements))
+
+    assert len(calls) == 2
+    assert executor.deduplicated == len(statements) - 2
+    assert all(rows == [(1,)] for _, _, rows in results)
+
+
+def test_classify_batch_falls_back_on_length_mismatch(monkeypatch):
+    from mcp_server.pipelines.batch import nodes
+
+    class ShortAnswerLLM:
+        def invoke(self, messages):
+            return nodes.IntentBatch(tools=["deep_analysis"])
+
+    monkeypatch.setattr(nodes, "get_structured_llm", lambda model, tier="large": ShortAnswerLLM())
+    assert nodes.classify_batch(["a", "b"]) == ["query_database", "query_database"]
+
+
+def test_closing_the_batch_stream_cancels_pending_questions(monkeypatch):
+    import time
+    from mcp_server.pipelines.batch import runner
+
+    answered = []
+
+    def slow_answer(index, question, tool, schema_state, executor):
+        time.sleep(0.05)
+        answered.append(index)
+        return {"index": index, "question": question, "tool": tool, "success": True}
+
+    monkeypatch.setattr(runner, "classify_batch", lambda questions: ["query_database"] * len(questions))
+    monkeypatch.setattr(runner, "get_schema", lambda state: state)
+    monkeypatch.setattr(runner, "_answer", slow_answer)
+
+    results = runner.iter_batch_results([f"q{i}?" for i in range(10)], max_workers=1)
+    next(results)
+    results.close()
+    time.sleep(0.2)
+    assert len(answered) <= 2
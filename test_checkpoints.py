@@ -0,0 +1,121 @@
+from langgraph.graph import StateGraph, END
+from pydantic_models.analysisState import AnalysisState
+
+
+def build_graph(saver, calls, fail):
+    def node(name, update):
+        def run(state):
+            calls.append(name)
+            if name in fail:
+                state.error = f"{name} failed"
+                return state
+            update(state)
+            return state
+        return run
+
+    steps = [
+        ("get_schema", lambda s: setattr(s, "schema_ref", "s1")),
+        ("decompose_question", lambda s: setattr(s, "sub_questions", ["a?", "b?"])),
+        ("generate_and_execute_all", lambda s: (setattr(s, "queries", ["SELECT 1", "SELECT 2"]),
+                                                setattr(s, "results", ["[(1,)]", "[(2,)]"]))),
+        ("synthesize_insights", lambda s: setattr(s, "insights", f"about {s.question}")),
+        ("build_chart_data", lambda s: None),
+    ]
+    builder = StateGraph(AnalysisState)
+    for name, update in steps:
+        builder.add_node(name, node(name, update))
+    builder.set_entry_point("get_schema")
+    for (a, _), (b, _) in zip(steps, steps[1:]):
+        builder.add_edge(a, b)
+    builder.add_edge("build_chart_data", END)
+    return builder.compile(checkpointer=saver)
+
+
+def test_retry_and_refine_rerun_only_the_last_steps(tmp_path, monkeypatch):
+    from mcp_server.pipelines.deep_analysis import checkpoints
+
+    store = checkpoints.AnalysisCheckpoints(str(tmp_path / "checkpoints.db"))
+    monkeypatch.setattr(checkpoints, "analysis_checkpoints", store)
+    calls, fail = [], {"synthesize_insights"}
+    graph = build_graph(store.saver, calls, fail)
+
+    raw, analysis_id = checkpoints.run_analysis(graph, AnalysisState(question="Why?"))
+    assert raw.get("insights") is None and len(calls) == 5
+
+    fail.clear()
+    calls.clear()
+    raw, same_id = checkpoints.run_analysis(graph, AnalysisState(question="why"), analysis_id)
+    assert same_id == analysis_id
+    assert raw["insights"] == "about Why?" and raw.get("error") is None
+    assert calls == ["synthesize_insights", "build_chart_data"]
+
+    calls.clear()
+    raw, _ = checkpoints.run_analysis(graph, AnalysisState(question="And books?"),
+                                      analysis_id, refine=True)
+    assert raw["insights"] == "about And books?" and raw["results"] == ["[(1,)]", "[(2,)]"]
+    assert calls == ["synthesize_insights", "build_chart_data"]
+
+
+def test_oldest_analyses_are_pruned(tmp_path, monkeypatch):
+    from mcp_server.pipelines.deep_analysis import checkpoints
+
+    monkeypatch.setattr(checkpoints, "DEEP_ANALYSIS_CHECKPOINT_MAX_THREADS", 2)
+    store = checkpoints.AnalysisCheckpoints(str(tmp_path / "checkpoints.db"))
+    ids = [store.start(f"question {i}", None) for i in range(3)]
+
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2]) is not None
+    assert store.stats["pruned"] == 1
+
+
+def test_retry_reruns_only_the_failed_sub_query(tmp_path, monkeypatch):
+    import sqlite3
+    from collections import OrderedDict
+    from types import SimpleNamespace
+    from app import db
+    from mcp_server.shared.nodes import get_schema, clear_schema_cache
+    from mcp_server.pipelines.deep_analysis import checkpoints, nodes
+
+    path = tmp_path / "acme.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE invoices (id INTEGER PRIMARY KEY, total REAL)")
+        conn.execute("INSERT INTO invoices (total) VALUES (10.0)")
+    monkeypatch.setattr(db, "DATABASES", {"acme": f"sqlite:///{path}"})
+    monkeypatch.setattr(db, "DATABASE_URL_TEMPLATE", None)
+    monkeypatch.setattr(db, "_engines", OrderedDict())
+    clear_schema_cache()
+
+    sql = {"Count?": "SELECT COUNT(*) FROM invoices", "Total?": "SELECT SUM(totl) FROM invoices"}
+    asked = []
+
+    class FakeLLM:
+        def invoke(self, messages, **kwargs):
+            asked.append(messages[-1].content)
+            return SimpleNamespace(sql_query=sql[messages[-1].content])
+
+    monkeypatch.setattr(nodes, "get_structured_llm", lambda schema, tier: FakeLLM())
+
+    store = checkpoints.AnalysisCheckpoints(str(tmp_path / "checkpoints.db"))
+    monkeypatch.setattr(checkpoints, "analysis_checkpoints", store)
+    builder = StateGraph(AnalysisState)
+    builder.add_node("get_schema", get_schema)
+    builder.add_node("decompose_question",
+                     lambda s: setattr(s, "sub_questions", ["Count?", "Total?"]) or s)
+    builder.add_node("generate_and_execute_all", nodes.generate_and_execute_all)
+    builder.add_node("synthesize_insights", lambda s: setattr(s, "insights", "done") or s)
+    builder.set_entry_point("get_schema")
+    builder.add_edge("get_schema", "decompose_question")
+    builder.add_edge("decompose_question", "generate_and_execute_all")
+    builder.add_edge("generate_and_execute_all", "synthesize_insights")
+    builder.add_edge("synthesize_insights", END)
+    graph = builder.compile(checkpointer=store.saver)
+
+    raw, analysis_id = checkpoints.run_analysis(graph, AnalysisState(question="Q", database_id="acme"))
+    assert raw["results"][0] == "[(1,)]" and raw["results"][1].startswith("ERROR")
+
+    sql["Total?"] = "SELECT SUM(total) FROM invoices"
+    asked.clear()
+    raw, _ = checkpoints.run_analysis(graph, AnalysisState(question="Q", database_id="acme"),
+                                      analysis_id)
+    assert asked == ["Total?"]
+    assert raw["results"] == ["[(1,)]", "[(10.0,)]"]
@@ -0,0 +1,102 @@
+import sqlite3
+from collections import OrderedDict
+
+import pytest
+
+
+def make_databases(tmp_path, monkeypatch, engine_max):
+    from app import db
+
+    urls = {}
+    for name, table in (("acme", "invoices"), ("globex", "shipments")):
+        path = tmp_path / f"{name}.db"
+        with sqlite3.connect(path) as conn:
+            conn.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY)")
+        urls[name] = f"sqlite:///{path}"
+
+    monkeypatch.setattr(db, "DATABASES", urls)
+    monkeypatch.setattr(db, "DATABASE_URL_TEMPLATE", None)
+    monkeypatch.setattr(db, "ENGINE_MAX", engine_max)
+    monkeypatch.setattr(db, "_engines", OrderedDict())
+
+
+def test_each_database_has_its_own_schema(tmp_path, monkeypatch):
+    from app.db import UnknownDatabase
+    from mcp_server.shared.nodes import load_schema, clear_schema_cache
+
+    make_databases(tmp_path, monkeypatch, engine_max=4)
+    clear_schema_cache()
+
+    assert list(load_schema("acme")[0]) == ["invoices"]
+    assert list(load_schema("globex")[0]) == ["shipments"]
+    with pytest.raises(UnknownDatabase):
+        load_schema("initech")
+
+
+def test_evicted_engine_is_disposed_and_its_schema_forgotten(tmp_path, monkeypatch):
+    from app.db import get_engine
+    from mcp_server.shared import nodes
+
+    make_databases(tmp_path, monkeypatch, engine_max=1)
+    nodes.clear_schema_cache()
+
+    acme = get_engine("acme")
+    nodes.load_schema("acme")
+    assert "acme" in nodes._schema_cache
+
+    get_engine("globex")
+    assert "acme" not in nodes._schema_cache
+    assert acme.pool.checkedin() == 0
+    assert get_engine("acme") is not acme
+
+
+def test_template_ids_need_an_existing_sqlite_file(tmp_path, monkeypatch):
+    from app import db
+
+    (tmp_path / "acme.db").touch()
+    monkeypatch.setattr(db, "DATABASES", {})
+    monkeypatch.setattr(db, "DATABASE_URL_TEMPLATE", f"sqlite:///{tmp_path}/{{database_id}}.db")
+
+    assert db.database_url("acme") == f"sqlite:///{tmp_path}/acme.db"
+    with pytest.raises(db.UnknownDatabase):
+        db.get_engine("random-id")
+    assert not (tmp_path / "random-id.db").exists()
+
+
+def test_a_slow_schema_load_does_not_hold_up_other_databases(tmp_path, monkeypatch):
+    import threading
+    from mcp_server.shared import nodes
+
+    make_databases(tmp_path, monkeypatch, engine_max=4)
+    nodes.clear_schema_cache()
+    inspect_schema = nodes._inspect_schema
+    acme_started, release_acme = threading.Event(), threading.Event()
+
+    def slow_for_acme(database_id=None):
+        if database_id == "acme":
+            acme_started.set()
+            release_acme.wait(5)
+        return inspect_schema(database_id)
+
+    monkeypatch.setattr(nodes, "_inspect_schema", slow_for_acme)
+    acme = threading.Thread(target=nodes.load_schema, args=("acme",))
+    acme.start()
+    acme_started.wait(5)
+
+    assert list(nodes.load_schema("globex")[0]) == ["shipments"]   # not blocked by acme
+    release_acme.set()
+    acme.join(5)
+    assert list(nodes.load_schema("acme")[0]) == ["invoices"]
+
+
+def test_unset_database_url_is_a_config_error(monkeypatch):
+    from fastapi import HTTPException
+    from app import db
+    from app.main import check_database
+
+    monkeypatch.setattr(db, "DB_URL", None)
+    with pytest.raises(db.DatabaseNotConfigured):
+        db.database_url()
+    with pytest.raises(HTTPException) as raised:
+        check_database(None)
+    assert raised.value.status_code == 503
@@ -1,7 +1,7 @@
-from app.db import engine
+from app.db import get_engine
 from sqlalchemy import text
 
-with engine.connect() as conn:
+with get_engine().connect() as conn:
     result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table';"))
     tables = result.fetchall()
 
@@ -0,0 +1,32 @@
+import time
+import pytest
+from sqlalchemy import create_engine, text
+
+SLOW_SQL = """
+    WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000)
+    SELECT COUNT(*) FROM n
+"""
+
+
+def test_interrupt_sql_stops_a_running_statement():
+    from app.deadline import Deadline, use_deadline, interrupt_sql
+
+    engine = create_engine("sqlite://")
+    started = time.perf_counter()
+    with use_deadline(Deadline(0.2)), engine.connect() as conn:
+        with pytest.raises(Exception, match="interrupted"):
+            with interrupt_sql(conn):
+                conn.execute(text(SLOW_SQL)).fetchall()
+    assert time.perf_counter() - started < 5
+
+
+def test_query_pipeline_skips_retries_and_llm_after_deadline():
+    from mcp_server.pipelines.query.nodes import route_after_execution, sql_generator
+    from pydantic_models.agentState import AgentState
+
+    state = AgentState(question="q", error="SQL execution error", attempts=1,
+                       deadline=time.time() - 1)
+    assert route_after_execution(state) == "finish"
+
+    state = sql_generator(AgentState(question="q", deadline=time.time() - 1))
+    assert state.timed_out and state.error.startswith("Deadline exceeded")
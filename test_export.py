@@ -0,0 +1,99 @@
+import json
+import asyncio
+import sqlite3
+from collections import OrderedDict
+
+
+def make_database(tmp_path, monkeypatch, rows=5):
+    from app import db
+
+    path = tmp_path / "acme.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE invoices (id INTEGER PRIMARY KEY, customer TEXT, total REAL)")
+        conn.executemany("INSERT INTO invoices (customer, total) VALUES (?, ?)",
+                         [(f"customer {i}", i * 1.5) for i in range(rows)])
+
+    monkeypatch.setattr(db, "DATABASES", {"acme": f"sqlite:///{path}"})
+    monkeypatch.setattr(db, "DATABASE_URL_TEMPLATE", None)
+    monkeypatch.setattr(db, "_engines", OrderedDict())
+    return db.get_engine("acme")
+
+
+def test_export_streams_csv_and_ndjson_in_chunks(tmp_path, monkeypatch):
+    from mcp_server.shared import export
+
+    make_database(tmp_path, monkeypatch)
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 2)
+    sql = "SELECT id, customer, total FROM invoices ORDER BY id"
+
+    csv_chunks = list(export.open_export(sql, "csv", "acme"))
+    assert len(csv_chunks) == 3
+    assert csv_chunks[0] == "id,customer,total\r\n1,customer 0,0.0\r\n2,customer 1,1.5\r\n"
+    assert "".join(csv_chunks).count("\r\n") == 6
+
+    ndjson_chunks = list(export.open_export(sql, "ndjson", "acme"))
+    assert [chunk.count("\n") for chunk in ndjson_chunks] == [2, 2, 1]
+    lines = "".join(ndjson_chunks).splitlines()
+    assert json.loads(lines[-1]) == {"id": 5, "customer": "customer 4", "total": 6.0}
+
+
+def test_export_endpoint_rejects_unsafe_failing_and_unknown_requests(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from mcp_server.shared.results import result_store
+
+    make_database(tmp_path, monkeypatch)
+    client = TestClient(app)
+
+    ok = client.post("/export", json={"sql": "SELECT id FROM invoices", "database_id": "acme"})
+    assert ok.status_code == 200 and ok.text.splitlines() == ["id", "1", "2", "3", "4", "5"]
+    result_id = result_store.register("SELECT customer FROM invoices WHERE id = 1", "acme")
+    by_id = client.post("/export", json={"result_id": result_id, "format": "ndjson"})
+    assert by_id.status_code == 200 and by_id.json() == {"customer": "customer 0"}
+
+    def status(body):
+        return client.post("/export", json=body).status_code
+
+    assert status({"sql": "DELETE FROM invoices", "database_id": "acme"}) == 400
+    assert status({"sql": "SELECT missing FROM invoices", "database_id": "acme"}) == 400
+    assert status({}) == 400
+    assert status({"sql": "SELECT 1", "database_id": "globex"}) == 404
+    assert status({"result_id": "unknown"}) == 404
+
+
+def test_client_disconnect_closes_the_export_connection(tmp_path, monkeypatch):
+    from app.main import app
+    from mcp_server.shared import export
+
+    engine = make_database(tmp_path, monkeypatch, rows=50)
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 5)
+    body = json.dumps({"sql": "SELECT * FROM invoices", "database_id": "acme"}).encode()
+    sent = []
+
+    async def scenario():
+        first_chunk = asyncio.Event()
+        requested = []
+
+        async def receive():
+            if not requested:
+                requested.append(True)
+                return {"type": "http.request", "body": body, "more_body": False}
+            await first_chunk.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message.get("body"):
+                first_chunk.set()
+                await asyncio.sleep(0.05)   # a slow client: the disconnect arrives mid-stream
+
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+                 "method": "POST", "scheme": "http", "path": "/export", "raw_path": b"/export",
+                 "query_string": b"", "root_path": "", "server": ("test", 80),
+                 "client": ("test", 1234), "headers": [(b"content-type", b"application/json")]}
+        await app(scope, receive, send)
+        return engine.pool.checkedout()   # as soon as the response is done, not at loop shutdown
+
+    assert asyncio.run(scenario()) == 0
+    bodies = [m for m in sent if m["type"] == "http.response.body"]
+    assert 0 < len(bodies) < 11                     # stopped before all 10 chunks went out
@@ -0,0 +1,56 @@
+from pydantic import BaseModel
+
+
+class Answer(BaseModel):
+    value: int
+
+
+class FakeModel:
+    """Local stand-in for a chat client: records calls, returns a canned answer."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+
+    def with_structured_output(self, output_model):
+        return self
+
+    def invoke(self, messages):
+        self.calls += 1
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+
+def test_fast_tier_escalates_to_large_on_invalid_output():
+    from pydantic import ValidationError
+    from app import llm
+
+    try:
+        Answer(value="not a number")
+    except ValidationError as e:
+        invalid = e
+
+    fast, large = FakeModel(invalid), FakeModel(Answer(value=42))
+    llm.use_models(fast=fast, large=large)
+    try:
+        assert llm.get_structured_llm(Answer, tier="fast").invoke([]).value == 42
+        assert (fast.calls, large.calls) == (1, 1)
+        assert llm.get_structured_llm(Answer, tier="large").invoke([]).value == 42
+        assert fast.calls == 1
+    finally:
+        llm.use_models()
+
+
+def test_timeouts_are_not_escalated():
+    import pytest
+    from app import llm
+
+    fast, large = FakeModel(TimeoutError("slow")), FakeModel(Answer(value=1))
+    llm.use_models(fast=fast, large=large)
+    try:
+        with pytest.raises(TimeoutError):
+            llm.get_structured_llm(Answer, tier="fast").invoke([])
+        assert large.calls == 0
+    finally:
+        llm.use_models()
@@ -0,0 +1,72 @@
+from sqlalchemy import create_engine, text
+
+JOINED = (
+    "FROM orders o JOIN order_items oi ON oi.order_id = o.id "
+    "JOIN products p ON p.id = oi.product_id"
+)
+
+QUERIES = [
+    f"SELECT p.name AS product, SUM(oi.quantity * oi.unit_price) AS revenue {JOINED} "
+    "GROUP BY p.name ORDER BY revenue DESC",
+    f"SELECT strftime('%Y', o.order_date) AS year, COUNT(DISTINCT o.id) AS orders {JOINED} "
+    "WHERE o.status = 'DELIVERED' GROUP BY year ORDER BY year",
+    f"SELECT SUM(oi.quantity) AS units {JOINED};",
+    f"SELECT COUNT(*) AS lines {JOINED} WHERE o.status = 'DELIVERED'",
+]
+
+
+def _engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, status TEXT, order_date TEXT)"))
+        conn.execute(text("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text(
+            "CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INTEGER, "
+            "product_id INTEGER, quantity INTEGER, unit_price REAL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO orders VALUES (1, 'DELIVERED', '2023-01-05'), "
+            "(2, 'CANCELLED', '2023-02-10'), (3, 'DELIVERED', '2024-03-01')"
+        ))
+        conn.execute(text("INSERT INTO products VALUES (1, 'Lamp'), (2, 'Desk')"))
+        conn.execute(text(
+            "INSERT INTO order_items VALUES (1, 1, 1, 2, 10.0), (2, 1, 2, 1, 120.0), "
+            "(3, 2, 1, 1, 10.0), (4, 3, 2, 3, 110.0)"
+        ))
+    return engine
+
+
+def test_plan_merges_groups_queries_with_the_same_base():
+    from mcp_server.pipelines.deep_analysis.optimizer import plan_merges
+
+    queries = QUERIES + [
+        "SELECT status, COUNT(*) AS n FROM orders GROUP BY status",
+        "SELECT * FROM orders",
+        f"SELECT p.name AS product {JOINED} ORDER BY p.id",   # ORDER BY on a non-output column
+    ]
+    # Same FROM, but only the same WHERE shares a base
+    assert plan_merges(queries) == [[0, 2], [1, 3]]
+
+
+def test_plan_merges_keeps_literal_case_apart():
+    from mcp_server.pipelines.deep_analysis.optimizer import plan_merges, execute_merged
+
+    delivered = f"SELECT COUNT(*) AS lines {JOINED} WHERE o.status = 'DELIVERED'"
+    queries = [delivered, delivered.replace("'DELIVERED'", "'delivered'"),
+               delivered.replace("WHERE", "where").replace("  ", " ")]
+    assert plan_merges(queries) == [[0, 2]]
+
+    with _engine().connect() as conn:
+        assert [tuple(r) for r in conn.execute(text(queries[1]))] == [(0,)]
+        assert execute_merged(conn, [queries[0], queries[2]]) == [[(3,)], [(3,)]]
+
+
+def test_merged_statement_matches_individual_results():
+    from mcp_server.pipelines.deep_analysis.optimizer import execute_merged
+
+    with _engine().connect() as conn:
+        only_counts = [QUERIES[3], QUERIES[3].replace("COUNT(*)", "COUNT(*) * 2")]
+        for group in ([QUERIES[0], QUERIES[2]], [QUERIES[1], QUERIES[3]], only_counts):
+            merged = execute_merged(conn, group)
+            for sql, rows in zip(group, merged):
+                assert rows == [tuple(r) for r in conn.execute(text(sql))]
@@ -0,0 +1,79 @@
+import time
+import asyncio
+import threading
+
+
+def test_tool_pool_limits_each_client_separately():
+    from mcp_server.tools.pool import ToolPool
+
+    pool = ToolPool(max_workers=8, per_client=2)
+    running = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+    lock = threading.Lock()
+
+    def work(client):
+        with lock:
+            running[client] += 1
+            peak[client] = max(peak[client], running[client])
+        time.sleep(0.05)
+        with lock:
+            running[client] -= 1
+        return client
+
+    async def scenario():
+        calls = [pool.run(c, work, c) for c in "aaaaab"]
+        return await asyncio.gather(*calls)
+
+    assert asyncio.run(scenario()) == list("aaaaab")
+    assert peak == {"a": 2, "b": 1}
+
+
+def test_a_cancelled_call_holds_its_slot_until_its_thread_is_done():
+    from mcp_server.tools.pool import ToolPool
+
+    pool = ToolPool(max_workers=8, per_client=1)
+    release = threading.Event()
+    order = []
+
+    def slow():
+        release.wait(5)
+        order.append("slow")
+
+    def fast():
+        order.append("fast")
+
+    async def scenario():
+        first = asyncio.create_task(pool.run("a", slow))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        second = asyncio.create_task(pool.run("a", fast))
+        await asyncio.sleep(0.05)
+        assert order == []          # the cancelled call's thread still holds the slot
+        release.set()
+        await second
+
+    asyncio.run(scenario())
+    assert order == ["slow", "fast"]
+
+
+def test_client_key_tells_anonymous_callers_apart():
+    import pytest
+    from types import SimpleNamespace
+    from fastmcp.exceptions import ToolError
+    from mcp_server.server import client_key
+
+    def context(client_id=None, headers=None, host=None, in_request=True):
+        request = None
+        if headers is not None or host is not None:
+            request = SimpleNamespace(headers=headers or {},
+                                      client=SimpleNamespace(host=host) if host else None)
+        return SimpleNamespace(client_id=client_id,
+                               request_context=SimpleNamespace(request=request) if in_request else None)
+
+    assert client_key(context("desktop", {"mcp-session-id": "s1"})) == "client:desktop"
+    assert client_key(context(headers={"mcp-session-id": "s1"}, host="10.0.0.1")) == "session:s1"
+    # Stateless HTTP: keyed by address, so two callers don't share a bucket
+    assert client_key(context(host="10.0.0.1")) != client_key(context(host="10.0.0.2"))
+    assert client_key(context()) == "stdio"
+    with pytest.raises(ToolError):
+        client_key(context(in_request=False))
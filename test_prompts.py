@@ -0,0 +1,16 @@
+import json
+
+
+def test_render_prompt_is_cached_and_byte_stable():
+    from mcp_server.shared.prompts import render_prompt, SQL_GENERATOR_PROMPT
+
+    schema = {"orders": {"columns": [{"name": "id", "type": "INTEGER"}]}}
+    render_prompt.cache_clear()
+
+    first = render_prompt(SQL_GENERATOR_PROMPT, json.dumps(schema, indent=2))
+    # An equal schema string built again (e.g. after a schema cache reload) hits the cache
+    second = render_prompt(SQL_GENERATOR_PROMPT, json.dumps(schema, indent=2))
+
+    assert second is first and '"orders"' in first
+    assert render_prompt.cache_info().hits == 1 and render_prompt.cache_info().misses == 1
+    assert render_prompt(SQL_GENERATOR_PROMPT, json.dumps({"tickets": {}})) != first
@@ -0,0 +1,35 @@
+def test_is_safe_query_matches_whole_keywords_only():
+    from mcp_server.shared.nodes import is_safe_query
+
+    assert is_safe_query("SELECT created_at, updated_at, is_deleted FROM orders;")
+    assert is_safe_query("SELECT 'drop table x' AS note")
+    assert not is_safe_query("SELECT 1; DROP TABLE orders")
+    assert not is_safe_query("DELETE FROM orders")
+    assert is_safe_query("WITH c AS (SELECT 1 AS id) SELECT replace(name, 'a', 'b') FROM c")
+    assert is_safe_query("WITH a(x) AS (SELECT 1), b AS MATERIALIZED (SELECT x FROM a) SELECT * FROM b")
+    assert not is_safe_query("WITH c AS (SELECT 1 AS id) REPLACE INTO t SELECT id FROM c")
+    assert not is_safe_query("WITH c AS (SELECT 1 AS id) replace\ninto t SELECT id FROM c")
+
+
+def test_deterministic_fixes_need_no_llm():
+    from mcp_server.pipelines.query.repair import classify_error, deterministic_fix
+
+    schema = {
+        "products": {"columns": [{"name": "id"}, {"name": "name"}], "foreign_keys": []},
+        "categories": {"columns": [{"name": "id"}, {"name": "name"}], "foreign_keys": []},
+    }
+
+    sql = "SELECT TOP 5 name FROM products ORDER BY id DESC;"
+    error = 'SQL execution error: near "5": syntax error'
+    assert classify_error(error, sql) == "limit"
+    assert deterministic_fix("limit", sql, error, schema) == \
+        "SELECT name FROM products ORDER BY id DESC LIMIT 5"
+
+    sql = "SELECT id, c.name FROM products p JOIN categories c ON p.id = c.id WHERE id > 1"
+    error = "SQL execution error: ambiguous column name: id"
+    assert classify_error(error, sql) == "ambiguous_column"
+    assert deterministic_fix("ambiguous_column", sql, error, schema) == \
+        "SELECT p.id, c.name FROM products p JOIN categories c ON p.id = c.id WHERE p.id > 1"
+
+    assert deterministic_fix("no_such_column", "SELECT nme FROM products",
+                             "no such column: nme", schema) == "SELECT nme FROM products"
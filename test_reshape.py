@@ -0,0 +1,65 @@
+def _frame():
+    from mcp_server.pipelines.reshape.frame import Frame
+
+    return Frame.from_rows(
+        ["category", "total_revenue", "order_count"],
+        [("Books", 100.0, 3), ("Phones", 900.5, 7), ("Toys", None, 1), ("Laptops", 500.0, 4)],
+    )
+
+
+def test_parse_operations_understands_follow_ups():
+    from mcp_server.pipelines.reshape.nodes import parse_operations
+
+    frame = _frame()
+    assert parse_operations("sort that by revenue", frame) == [
+        {"op": "sort", "column": "total_revenue", "descending": True}
+    ]
+    assert parse_operations("just the top 3", frame) == [
+        {"op": "limit", "n": 3, "from_end": False}
+    ]
+    assert parse_operations("what's the average revenue of those", frame) == [
+        {"op": "aggregate", "function": "avg", "column": "total_revenue"}
+    ]
+
+
+def test_parse_operations_rejects_new_questions():
+    from mcp_server.pipelines.reshape.nodes import parse_operations
+
+    frame = _frame()
+    assert parse_operations("and for 2024?", frame) is None
+    assert parse_operations("top 3 customers in 2024", frame) is None
+    assert parse_operations("how many orders", frame) is None
+    # Two numeric columns: "the average" could be either — the LLM path decides
+    assert parse_operations("what's the average of those", frame) is None
+
+
+def test_apply_operations_sorts_filters_and_limits():
+    from mcp_server.pipelines.reshape.nodes import parse_operations, apply_operations
+
+    frame = _frame()
+    operations = parse_operations("only those with revenue above 200, top 1 by revenue", frame)
+    reshaped, aggregate = apply_operations(frame, operations)
+
+    assert aggregate is None
+    assert reshaped.to_rows() == [("Phones", 900.5, 7)]
+
+    bottom, _ = apply_operations(frame, parse_operations("bottom 2 by revenue", frame))
+    assert bottom.to_rows() == [("Books", 100.0, 3), ("Laptops", 500.0, 4)]
+
+
+def test_sort_puts_missing_values_last():
+    frame = _frame().sort("total_revenue", descending=False)
+    assert frame.columns["category"] == ["Books", "Laptops", "Phones", "Toys"]
+
+
+def test_reshaped_reply_reports_no_sql():
+    import asyncio
+    from app.mcp_client import run_agent
+    from pydantic_models.chatSession import ChatSession
+
+    session = ChatSession(session_id="s", last_sql="SELECT category, total_revenue FROM sales",
+                          last_frame=_frame().columns)
+    reply = asyncio.run(run_agent("sort that by revenue", session=session))
+
+    assert reply["tool_used"] == "reshape_result" and reply["sql_query"] is None
+    assert session.last_sql == "SELECT category, total_revenue FROM sales"
@@ -0,0 +1,45 @@
+import sqlite3
+from pathlib import Path
+from sqlalchemy import create_engine, text
+
+DATABASE_DIR = Path(__file__).resolve().parent / "database"
+
+
+def make_engine(tmp_path):
+    path = tmp_path / "shop.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript((DATABASE_DIR / "schema.sql").read_text())
+        conn.executescript((DATABASE_DIR / "seed.sql").read_text())
+    return create_engine(f"sqlite:///{path}")
+
+
+def revenue_by_month(conn, sql):
+    return {month: round(total, 2) for month, total in conn.execute(text(sql))}
+
+
+def test_incremental_refresh_matches_source_tables(tmp_path):
+    from mcp_server.shared.rollups import build_rollups
+
+    engine = make_engine(tmp_path)
+    assert set(build_rollups(engine=engine).values()) == {-1}
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO orders (id, user_id, status, order_date) "
+            "VALUES (9001, 1, 'CONFIRMED', '2031-07-04 12:00')"
+        ))
+        conn.execute(text(
+            "INSERT INTO order_items (order_id, product_id, quantity, unit_price) "
+            "VALUES (9001, 1, 3, 10.0)"
+        ))
+    summary = build_rollups(engine=engine)
+    assert summary["rollup_sales_monthly"] >= 1
+
+    with engine.connect() as conn:
+        rolled_up = revenue_by_month(conn,
+            "SELECT month, SUM(revenue) FROM rollup_sales_monthly GROUP BY month")
+        direct = revenue_by_month(conn,
+            "SELECT strftime('%Y-%m', o.order_date), SUM(oi.quantity * oi.unit_price) "
+            "FROM order_items oi JOIN orders o ON o.id = oi.order_id GROUP BY 1")
+    assert rolled_up == direct
+    assert rolled_up["2031-07"] == 30.0
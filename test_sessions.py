@@ -0,0 +1,83 @@
+import time
+
+
+def test_session_store_lru_and_ttl():
+    from app.sessions import SessionStore
+
+    store = SessionStore(max_sessions=2, ttl_seconds=60)
+    a = store.get_or_create("a")
+    store.get_or_create("b")
+    store.get_or_create("c")          # evicts "a" (least recently used)
+
+    assert store.get("a") is None
+    assert store.get("c") is not None
+
+    b = store.get("b")
+    b.updated_at = time.time() - 120  # past the TTL
+    assert store.get("b") is None
+    assert a.session_id == "a"
+
+
+def test_session_store_persists_to_sqlite(tmp_path):
+    from app.sessions import SessionStore, record_turn
+
+    db_path = str(tmp_path / "sessions.db")
+    store = SessionStore(max_sessions=10, ttl_seconds=60, db_path=db_path)
+    session = store.get_or_create(seed_history=[{"role": "user", "content": "hi"}])
+    record_turn(session, "total sales in 2023?", "$18,432")
+    session.last_sql = "SELECT 1"
+    store.save(session)
+
+    reopened = SessionStore(max_sessions=10, ttl_seconds=60, db_path=db_path)
+    loaded = reopened.get(session.session_id)
+    assert loaded is not None
+    assert len(loaded.history) == 3
+    assert loaded.last_sql == "SELECT 1"
+
+
+def test_compact_history_keeps_recent_turns(monkeypatch):
+    import asyncio
+    from app import sessions
+    from pydantic_models.chatSession import ChatSession
+
+    class FailingLLM:
+        async def ainvoke(self, messages):
+            raise RuntimeError("offline")
+
+    monkeypatch.setattr(sessions, "get_llm", lambda tier="large": FailingLLM())
+    session = ChatSession(session_id="s")
+    for i in range(10):
+        sessions.record_turn(session, f"q{i}", f"a{i}")
+
+    asyncio.run(sessions.compact_history(session))
+
+    assert len(session.history) == sessions.KEEP_RECENT_MESSAGES
+    assert session.history[-1]["content"] == "a9"
+    assert "q0" in session.summary
+
+
+def test_turns_of_one_session_run_one_at_a_time(tmp_path):
+    import asyncio
+    from app.sessions import SessionStore, record_turn
+
+    store = SessionStore(max_sessions=10, ttl_seconds=60, db_path=str(tmp_path / "sessions.db"))
+
+    async def turn(message):
+        async with store.turn_lock("s"):
+            session = store.get_or_create("s")
+            history = list(session.history)    # what the agent sees
+            await asyncio.sleep(0.01)          # the agent runs
+            session.history = history
+            record_turn(session, message, f"re: {message}")
+            session.last_sql = f"SELECT '{message}'"
+            store.save(session)
+
+    async def scenario():
+        await asyncio.gather(turn("first"), turn("second"))
+
+    asyncio.run(scenario())
+    reopened = SessionStore(max_sessions=10, ttl_seconds=60, db_path=str(tmp_path / "sessions.db"))
+    session = reopened.get("s")
+    assert [m["content"] for m in session.history] == ["first", "re: first", "second", "re: second"]
+    assert session.last_sql == "SELECT 'second'"
+    assert store.turn_lock("s") is not store.turn_lock("t")
@@ -0,0 +1,38 @@
+import asyncio
+
+
+def test_resolve_hands_over_prepared_state_or_cancels(monkeypatch):
+    from app import speculation
+    from pydantic_models.agentState import AgentState
+
+    async def fake_prepare(question, previous_sql, database_id):
+        await asyncio.sleep(0.01)
+        return AgentState(question=question, schema_ref="s1", sql_query="SELECT 1")
+
+    monkeypatch.setattr(speculation, "SPECULATIVE_SQL", True)
+    monkeypatch.setattr(speculation, "_prepare", fake_prepare)
+
+    async def scenario():
+        hit = await speculation.resolve(await speculation.start_speculation("q"), "query_database")
+        miss = await speculation.start_speculation("q")
+        await speculation.resolve(miss, "none")
+        await asyncio.sleep(0)
+        return hit, miss
+
+    before = speculation.speculation_stats()
+    hit, miss = asyncio.run(scenario())
+    after = speculation.speculation_stats()
+
+    assert hit.sql_query == "SELECT 1"
+    assert miss.cancelled()
+    assert after["hits"] == before["hits"] + 1
+    assert after["cancelled"] == before["cancelled"] + 1
+    assert after["wasted_calls"] == before["wasted_calls"] + 1
+
+
+def test_query_graph_starts_at_execute_query_when_prepared():
+    from mcp_server.pipelines.query.nodes import route_entry
+    from pydantic_models.agentState import AgentState
+
+    assert route_entry(AgentState(question="q")) == "fresh"
+    assert route_entry(AgentState(question="q", schema_ref="s1", sql_query="SELECT 1")) == "prepared"
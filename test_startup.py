@@ -0,0 +1,26 @@
+import os
+import sys
+import subprocess
+
+
+def test_importing_the_app_loads_no_llm_client_or_graph():
+    # A fresh interpreter: other tests have already imported these
+    code = ("import sys, app.main; "
+            "print(sorted(m for m in ('langchain_groq', 'langgraph') if m in sys.modules))")
+    env = {**os.environ, "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "x")}
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         check=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert out.stdout.strip() == "[]"
+
+
+def test_warm_up_records_a_failing_step_instead_of_raising(monkeypatch):
+    from app import startup, llm
+
+    def broken_llm(tier="large"):
+        raise RuntimeError("no credentials")
+
+    monkeypatch.setattr(llm, "get_llm", broken_llm)
+    timings = startup.warm_up(ping_llm=False)
+
+    assert timings["llm_clients"] == -1.0
+    assert timings["query_graph"] >= 0 and timings["deep_analysis_graph"] >= 0
@@ -0,0 +1,81 @@
+import sqlite3
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from langgraph.graph import StateGraph, END
+
+
+def make_database(tmp_path, monkeypatch):
+    from app import db
+
+    path = tmp_path / "acme.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE invoices (id INTEGER PRIMARY KEY, total REAL)")
+        conn.executemany("INSERT INTO invoices (total) VALUES (?)", [(10.0,), (32.5,)])
+
+    monkeypatch.setattr(db, "DATABASES", {"acme": f"sqlite:///{path}"})
+    monkeypatch.setattr(db, "DATABASE_URL_TEMPLATE", None)
+    monkeypatch.setattr(db, "_engines", OrderedDict())
+
+
+def test_state_carries_a_schema_reference(tmp_path, monkeypatch):
+    from mcp_server.shared import nodes
+    from pydantic_models.agentState import AgentState
+
+    make_database(tmp_path, monkeypatch)
+    nodes.clear_schema_cache()
+
+    state = nodes.get_schema(AgentState(question="q", database_id="acme"))
+    assert state.error is None and len(state.schema_ref) == 16
+    schema, schema_json = nodes.schema_for(state)
+    assert list(schema) == ["invoices"] and '"invoices"' in schema_json
+
+    # The ref outlives the cache entry; an unknown ref reloads the database's schema
+    nodes.clear_schema_cache()
+    assert nodes.schema_for(state)[0] is schema
+    assert list(nodes.schema_for(AgentState(question="q", database_id="acme",
+                                            schema_ref="unknown"))[0]) == ["invoices"]
+
+
+def test_rows_reach_the_caller_without_being_copied(tmp_path, monkeypatch):
+    from mcp_server.shared import nodes
+    from mcp_server.pipelines.query import nodes as query_nodes
+    from mcp_server.tools import database_tools
+    from pydantic_models.agentState import AgentState
+
+    make_database(tmp_path, monkeypatch)
+    nodes.clear_schema_cache()
+    prompts, produced = [], []
+
+    class FakeLLM:
+        def invoke(self, messages, **kwargs):
+            prompts.append(messages[-1].content)
+            return SimpleNamespace(content="Two invoices.")
+
+    def execute_query(state):
+        state = query_nodes.execute_query(state)
+        produced.append(state.rows)
+        return state
+
+    monkeypatch.setattr(query_nodes, "get_llm", lambda tier: FakeLLM())
+    monkeypatch.setattr(database_tools, "answer_store", None)
+
+    def prepared():
+        return AgentState(question="Invoice totals?", database_id="acme",
+                          schema_ref=nodes.load_schema_ref("acme"),
+                          sql_query="SELECT id, total FROM invoices ORDER BY id")
+
+    result = database_tools.run_query_database("Invoice totals?", prepared_state=prepared(),
+                                               database_id="acme")
+    assert result["success"] and result["explanation"] == "Two invoices."
+    assert result["columns"] == ["id", "total"] and result["rows"] == [(1, 10.0), (2, 32.5)]
+    assert result["result"] == "[(1, 10.0), (2, 32.5)]" and result["result"] in prompts[0]
+
+    # The list execute_query built is the one that comes out: no transition copied it
+    builder = StateGraph(AgentState)
+    builder.add_node("execute_query", execute_query)
+    builder.add_node("explain_results", query_nodes.explain_results)
+    builder.set_entry_point("execute_query")
+    builder.add_edge("execute_query", "explain_results")
+    builder.add_edge("explain_results", END)
+    assert builder.compile().invoke(prepared())["rows"] is produced[0]